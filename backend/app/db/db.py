@@ -1,5 +1,5 @@
 # app/db/db.py
-from sqlalchemy import create_engine, Column, String, Integer, Table, TIMESTAMP, ARRAY
+from sqlalchemy import create_engine, text, Column, String, Integer, Table, TIMESTAMP, ARRAY, UniqueConstraint
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from datetime import datetime
@@ -35,14 +35,34 @@ class Document(Base):
 
 class ImageRecord(Base):
     __tablename__ = "images"
+    # Image files are content-addressed: one file can sit on many pages and documents.
+    __table_args__ = (
+        UniqueConstraint("source_pdf", "page_number", "filename", name="uq_images_source_page_file"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     book_id = Column(String, index=True)
     source_pdf = Column(String)
     page_number = Column(Integer)
     xref = Column(Integer)
-    filename = Column(String, unique=True)
+    filename = Column(String, index=True)
     caption = Column(String)
+    thumbnail = Column(String, nullable=True)  # object names of the rendered derivatives
+    preview = Column(String, nullable=True)
+
+
+def ensure_image_columns() -> None:
+    # create_all does not alter existing tables; migrate them in place.
+    statements = [
+        "ALTER TABLE images DROP CONSTRAINT IF EXISTS images_filename_key",
+        "ALTER TABLE images ADD COLUMN IF NOT EXISTS thumbnail VARCHAR",
+        "ALTER TABLE images ADD COLUMN IF NOT EXISTS preview VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_images_filename ON images (filename)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_images_source_page_file ON images (source_pdf, page_number, filename)",
+    ]
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
 
 
 def get_db():
@@ -0,0 +1,16 @@
+# app/db/models/upload_orm.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String
+from app.db.base import Base
+
+class UploadORM(Base):
+    __tablename__ = "uploads"
+
+    # sha256 of the file content; one stored object per distinct content
+    content_hash = Column(String(64), primary_key=True)
+    filename = Column(String, unique=True, nullable=False)  # object name in the uploads bucket
+    original_name = Column(String, nullable=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,10 +1,11 @@
 from fastapi import FastAPI
 
 from app.db.base import Base
-from app.db.db import engine
+from app.db.db import engine, ensure_image_columns
 from app.routers import agent, extract, health, process, query, upload, summary, files
 
 Base.metadata.create_all(bind=engine)
+ensure_image_columns()
 
 app = FastAPI(
     title="My API",
@@ -4,11 +4,11 @@ import json
 import re
 from typing import Any, Dict
 
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 
 from app.models.research_tree import ResearchNode, ResearchTree
 
-_LLM = ChatOpenAI(model="gpt-4o", temperature=0)
+_LLM = ScheduledChatOpenAI(model="gpt-4o", temperature=0)
 
 _FORBIDDEN = [
     r"\\write18",
@@ -27,6 +27,20 @@ def list_files(limit: int = 200):
 @router.get("/files/info/{filename}")
 def get_file_info(filename: str):
     es = Elasticsearch("http://elasticsearch:9200")
+    # Document-level attributes live in pdf_documents; older ingests only have them on chunks.
+    try:
+        record = es.get(index="pdf_documents", id=filename)
+    except Exception:
+        record = None
+    if record is not None and record.get("found"):
+        source = record.get("_source", {}) or {}
+        return {
+            "filename": filename,
+            "language": source.get("language"),
+            "language_name": source.get("language_name"),
+            "section_patterns": source.get("section_patterns") or [],
+        }
+
     try:
         response = es.search(
             index="pdf_chunks",
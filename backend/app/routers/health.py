@@ -1,7 +1,15 @@
 from fastapi import APIRouter
 
+from app.utils.openai_scheduler import get_scheduler
+
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@router.get("/health/openai")
+def openai_scheduler_status():
+    """Per-model queue depth, wait times and 429 counts of the OpenAI scheduler."""
+    return get_scheduler().snapshot()
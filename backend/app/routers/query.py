@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app.utils.context_window import expand_scored_hits
 from app.utils.vectorstore import get_vectorstore
 
 router = APIRouter()
@@ -16,8 +17,8 @@ class QueryRequest(BaseModel):
 @router.post("/query/")
 async def query(request: QueryRequest):
     try:
-        text_results = vectorstore.similarity_search_with_score(
-            query=request.query, k=request.top_k
+        text_results = expand_scored_hits(
+            vectorstore.similarity_search_with_score(query=request.query, k=request.top_k)
         )
         caption_results = caption_store.similarity_search_with_score(
             query=request.query, k=request.top_k
@@ -55,9 +55,11 @@ def summarize(req: SummaryRequest):
         text = (src.get("text") or "").strip()
         if not text:
             continue
-        pages = src.get("pages") or []
+        # Compact indices keep chunk attributes under `metadata` only.
+        meta = src.get("metadata") or {}
+        pages = src.get("pages", meta.get("pages")) or []
         page = pages[0] if isinstance(pages, list) and pages else None
-        chunk_index = src.get("chunk_index")
+        chunk_index = src.get("chunk_index", meta.get("chunk_index"))
         chunks.append((page, chunk_index, text))
         if req.max_chunks and len(chunks) >= req.max_chunks:
             break
@@ -1,6 +1,11 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from app.db.db import SessionLocal
+from app.db.models.upload_orm import UploadORM
 from app.utils.minio_client import get_minio_client
+from minio.error import S3Error
 from pydantic import BaseModel
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import hashlib
 import uuid
 import io
 import requests
@@ -11,28 +16,116 @@ router = APIRouter()
 minio_client = get_minio_client()
 
 BUCKET_NAME = "uploads"
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+def _find_existing_upload(content_hash: str) -> str | None:
+    """Returns the stored object name for this content, if it is still in MinIO."""
+    db = SessionLocal()
+    try:
+        existing = db.get(UploadORM, content_hash)
+        if existing is None:
+            return None
+        try:
+            minio_client.stat_object(BUCKET_NAME, existing.filename)
+        except S3Error as exc:
+            if exc.code != "NoSuchKey":
+                raise
+            # Object was removed from the bucket; forget the stale mapping.
+            db.delete(existing)
+            db.commit()
+            return None
+        return existing.filename
+    finally:
+        db.close()
+
+
+def _register_upload(
+    content_hash: str,
+    filename: str,
+    original_name: str | None,
+    size: int,
+    content_type: str | None,
+) -> str:
+    """
+    Records the content -> object mapping. If a concurrent upload of the same content
+    won the race, the freshly written object is removed and the existing name returned.
+    """
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(UploadORM.__table__).values(
+            content_hash=content_hash,
+            filename=filename,
+            original_name=original_name,
+            size=size,
+            content_type=content_type,
+        )
+        stmt = stmt.on_conflict_do_nothing(index_elements=["content_hash"])
+        inserted = db.execute(stmt).rowcount
+        db.commit()
+        if inserted:
+            return filename
+        winner = db.get(UploadORM, content_hash).filename
+    finally:
+        db.close()
+
+    minio_client.remove_object(BUCKET_NAME, filename)
+    return winner
+
+
+def _put_deduplicated(
+    stream,
+    size: int,
+    content_hash: str,
+    basename: str,
+    content_type: str | None,
+) -> tuple[str, bool]:
+    """Stores the content unless it is already known. Returns (object name, duplicate)."""
+    existing = _find_existing_upload(content_hash)
+    if existing:
+        return existing, True
+
+    unique_filename = f"{uuid.uuid4()}_{basename}"
+    minio_client.put_object(
+        bucket_name=BUCKET_NAME,
+        object_name=unique_filename,
+        data=stream,
+        length=size,
+        content_type=content_type or "application/octet-stream",
+        metadata={"sha256": content_hash},
+    )
+    stored = _register_upload(content_hash, unique_filename, basename, size, content_type)
+    return stored, stored != unique_filename
+
 
 @router.post("/upload/")
 async def upload_file(file: UploadFile = File(...)):
     try:
-        # Generate a unique file name
-        unique_filename = f"{uuid.uuid4()}_{file.filename}"
-        content = await file.read()
-
-        # Wrap bytes in a stream
-        stream = io.BytesIO(content)        
-
-        minio_client.put_object(
-            bucket_name=BUCKET_NAME,
-            object_name=unique_filename,
-            data=stream,
-            length=len(content),
-            content_type=file.content_type,
+        # Hash while streaming; the spooled upload is then rewound and streamed to MinIO.
+        hasher = hashlib.sha256()
+        size = 0
+        while True:
+            block = await file.read(UPLOAD_READ_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            size += len(block)
+        await file.seek(0)
+        content_hash = hasher.hexdigest()
+
+        stored_filename, duplicate = _put_deduplicated(
+            file.file,
+            size,
+            content_hash,
+            file.filename,
+            file.content_type,
         )
 
         return {
-            "filename": unique_filename,
-            "link": f"/minio/uploads/{unique_filename}"
+            "filename": stored_filename,
+            "link": f"/minio/uploads/{stored_filename}",
+            "content_hash": content_hash,
+            "duplicate": duplicate,
         }
 
     except Exception as e:
@@ -61,20 +154,22 @@ def upload_url(payload: UploadUrlRequest):
         if not basename.lower().endswith((".html", ".htm")):
             basename = f"{basename}.html"
 
-        unique_filename = f"{uuid.uuid4()}_{basename}"
+        content_hash = hashlib.sha256(content).hexdigest()
         stream = io.BytesIO(content)
 
-        minio_client.put_object(
-            bucket_name=BUCKET_NAME,
-            object_name=unique_filename,
-            data=stream,
-            length=len(content),
-            content_type="text/html",
+        stored_filename, duplicate = _put_deduplicated(
+            stream,
+            len(content),
+            content_hash,
+            basename,
+            "text/html",
         )
 
         return {
-            "filename": unique_filename,
+            "filename": stored_filename,
             "source_url": payload.url,
+            "content_hash": content_hash,
+            "duplicate": duplicate,
         }
     except HTTPException:
         raise
@@ -9,6 +9,8 @@ class ImageMetadata(BaseModel):
     xref: int
     filename: str
     caption: Optional[str] = ""
+    thumbnail: Optional[str] = None
+    preview: Optional[str] = None
     embedding: Optional[List[float]] = None  # Optional for later use
 
     class Config:
@@ -1,11 +1,11 @@
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 from app.models.outline_model import Outline
 from app.models.research_tree import ResearchTree
 
 def generate_outline_from_tree(tree: ResearchTree) -> Outline:
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    llm = ScheduledChatOpenAI(model="gpt-4o", temperature=0)
     parser = PydanticOutputParser(pydantic_object=Outline)
 
     # Collect all chunk texts from the hydrated tree (post-refactor safe)
@@ -1,9 +1,11 @@
 from typing import List
+from app.utils.context_window import expand_hits
 from app.utils.vectorstore import get_vectorstore
 
 def search_chunks(query: str, top_k: int = 100, return_docs: bool = False) -> List[str]:
     vs = get_vectorstore()
-    results = vs.similarity_search(query, k=top_k)
+    # Small chunks come back with their neighbours as context.
+    results = expand_hits(vs.similarity_search(query, k=top_k))
 
     if return_docs:
         return results  # Return full Document objects
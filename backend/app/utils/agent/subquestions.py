@@ -3,7 +3,7 @@ from typing import List
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -18,7 +18,7 @@ def generate_subquestions_from_chunks(
     user_query: str,
     model_name: str = "gpt-4o",
 ) -> List[str]:
-    llm = ChatOpenAI(model=model_name, temperature=0)
+    llm = ScheduledChatOpenAI(model=model_name, temperature=0)
 
     # Limit chunk length to avoid context overflow
     context = "\n\n".join(chunks[:20])
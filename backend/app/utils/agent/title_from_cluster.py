@@ -1,8 +1,8 @@
 # app/utils/agent/title_from_cluster.py
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 from langchain_core.prompts import PromptTemplate
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm = ScheduledChatOpenAI(model="gpt-4o-mini", temperature=0)
 
 _PROMPT = PromptTemplate.from_template(
 """
@@ -1,9 +1,9 @@
 # app/utils/agent/topics.py
 import numpy as np
-from langchain_openai import OpenAIEmbeddings
+from app.utils.embedding_cache import get_cached_embeddings
 
 def embed_texts(texts: list[str]) -> np.ndarray:
-    emb = OpenAIEmbeddings(model="text-embedding-3-small")
+    emb = get_cached_embeddings()
     vecs = emb.embed_documents(texts)  # returns List[List[float]]
     return np.array(vecs, dtype=np.float32)
 
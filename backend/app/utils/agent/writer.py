@@ -1,11 +1,11 @@
 from textwrap import dedent
 
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 
 from app.db.db import SessionLocal
 from app.models.research_tree import ResearchNode, ResearchTree
 from app.utils.agent.repo import get_node_chunks, get_node_questions, mark_questions_consumed
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+llm = ScheduledChatOpenAI(model="gpt-4o", temperature=0)
 
 
 def write_section(node: ResearchNode) -> ResearchNode:
@@ -95,7 +95,7 @@ def write_conclusion(node: ResearchNode) -> str:
 
 
 def write_executive_summary(tree: ResearchTree) -> str:
-    llm_local = ChatOpenAI(model="gpt-4o", temperature=0)
+    llm_local = ScheduledChatOpenAI(model="gpt-4o", temperature=0)
     sections = []
     for n in tree.root_node.subnodes:
         if n.content:
@@ -118,7 +118,7 @@ def write_executive_summary(tree: ResearchTree) -> str:
 
 
 def write_overall_conclusion(tree: ResearchTree) -> str:
-    llm_local = ChatOpenAI(model="gpt-4o", temperature=0)
+    llm_local = ScheduledChatOpenAI(model="gpt-4o", temperature=0)
     bullets = []
     for n in tree.root_node.subnodes:
         if n.summary:
@@ -0,0 +1,110 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from elasticsearch import Elasticsearch
+from langchain_core.documents import Document
+
+# Chunks indexed with CHUNK_MODE=small_to_big link to their neighbours in the same
+# section. Hits are widened by this many neighbours on each side; 0 disables it.
+CONTEXT_WINDOW_CHUNKS = int(os.getenv("CONTEXT_WINDOW_CHUNKS", "1"))
+
+
+def _fetch(es: Elasticsearch, index: str, ids: List[str]) -> Dict[str, dict]:
+    if not ids:
+        return {}
+    response = es.mget(index=index, ids=ids, source_excludes=["vector"])
+    found = {}
+    for doc in response.get("docs", []):
+        if doc.get("found"):
+            src = doc.get("_source", {}) or {}
+            found[doc["_id"]] = {"text": src.get("text") or "", "metadata": src.get("metadata") or {}}
+    return found
+
+
+def _stitch(pieces: List[dict]) -> str:
+    """Joins adjacent chunks, dropping the overlap each shares with the one before."""
+    text = pieces[0]["text"]
+    previous_end = pieces[0]["metadata"].get("end_offset")
+    for piece in pieces[1:]:
+        start = piece["metadata"].get("start_offset")
+        if previous_end is not None and start is not None and start < previous_end:
+            text += piece["text"][previous_end - start:]
+        else:
+            text += "\n" + piece["text"]
+        previous_end = piece["metadata"].get("end_offset")
+    return text
+
+
+def _expand(
+    docs: List[Document], index: str, window: int, es: Optional[Elasticsearch]
+) -> List[Optional[Document]]:
+    linked = [doc for doc in docs if (doc.metadata or {}).get("prev_id") or (doc.metadata or {}).get("next_id")]
+    if window <= 0 or not linked:
+        return list(docs)
+    es = es or Elasticsearch("http://elasticsearch:9200")
+
+    known: Dict[str, dict] = {}
+    before = {id(doc): [] for doc in linked}
+    after = {id(doc): [] for doc in linked}
+    edges = {id(doc): (doc.metadata.get("prev_id"), doc.metadata.get("next_id")) for doc in linked}
+    for _ in range(window):
+        wanted = {ref for pair in edges.values() for ref in pair if ref and ref not in known}
+        known.update(_fetch(es, index, sorted(wanted)))
+        for key, (prev_id, next_id) in edges.items():
+            prev_piece, next_piece = known.get(prev_id), known.get(next_id)
+            if prev_piece:
+                before[key].insert(0, prev_piece)
+            if next_piece:
+                after[key].append(next_piece)
+            edges[key] = (
+                prev_piece["metadata"].get("prev_id") if prev_piece else None,
+                next_piece["metadata"].get("next_id") if next_piece else None,
+            )
+
+    expanded = []
+    covered = set()
+    for doc in docs:
+        if id(doc) not in edges:
+            expanded.append(doc)
+            continue
+        if doc.metadata.get("id") in covered:
+            expanded.append(None)
+            continue
+        hit = {"text": doc.page_content, "metadata": doc.metadata}
+        pieces = before[id(doc)] + [hit] + after[id(doc)]
+        covered.update(piece["metadata"].get("id") for piece in pieces)
+        pages = sorted({page for piece in pieces for page in (piece["metadata"].get("pages") or [])})
+        metadata = {
+            **doc.metadata,
+            "hit_text": doc.page_content,
+            "pages": pages,
+            "context_chunk_indices": [piece["metadata"].get("chunk_index") for piece in pieces],
+        }
+        expanded.append(Document(page_content=_stitch(pieces), metadata=metadata))
+    return expanded
+
+
+def expand_hits(
+    docs: List[Document],
+    index: str = "pdf_chunks",
+    window: int = CONTEXT_WINDOW_CHUNKS,
+    es: Optional[Elasticsearch] = None,
+) -> List[Document]:
+    """
+    Replaces each linked hit by the hit plus up to `window` neighbours on either side,
+    fetched by id one ring at a time. Hits without neighbour links are returned as is,
+    and hits already inside a better-ranked window are dropped. The matched chunk's
+    own text stays available as metadata["hit_text"].
+    """
+    return [doc for doc in _expand(docs, index, window, es) if doc is not None]
+
+
+def expand_scored_hits(
+    results: List[Tuple[Document, float]],
+    index: str = "pdf_chunks",
+    window: int = CONTEXT_WINDOW_CHUNKS,
+    es: Optional[Elasticsearch] = None,
+) -> List[Tuple[Document, float]]:
+    """expand_hits for (document, score) pairs; each window keeps its hit's score."""
+    expanded = _expand([doc for doc, _score in results], index, window, es)
+    return [(doc, score) for doc, (_hit, score) in zip(expanded, results) if doc is not None]
@@ -0,0 +1,241 @@
+# Generated from pdf_worker/app/utils/embedding_cache.py by pdf_worker/sync_shared.py; do not edit.
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from app.utils.openai_scheduler import Priority, ScheduledEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# Shared by backend and pdf_worker through the `embedding_cache` volume.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024**3)))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+# Shared by ingestion and query embedding; both services must use the same values.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Shortened output size (e.g. 256 or 512); unset keeps the model's native size.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+NATIVE_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+
+
+def embedding_dimensions(model: str = EMBEDDING_MODEL, dimensions: Optional[int] = EMBEDDING_DIMENSIONS) -> int:
+    return dimensions or NATIVE_DIMENSIONS.get(model, 1536)
+
+# SQLite caps bound parameters per statement; stay well below the limit.
+_SQL_BATCH = 500
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def digest_key(model: str, dimensions: Optional[int], digest: str) -> str:
+    return f"{model}:{dimensions or 'native'}:{digest}"
+
+
+def cache_key(model: str, dimensions: Optional[int], text: str) -> str:
+    return digest_key(model, dimensions, text_digest(text))
+
+
+class EmbeddingCache:
+    """
+    Size-bounded on-disk vector store keyed by (model, dimensions, sha256(text)).
+    Vectors are stored as float32 blobs; least recently used entries are evicted
+    once the stored bytes exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO stats (name, value) VALUES ('bytes', 0)")
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(unique), _SQL_BATCH):
+                part = unique[i : i + _SQL_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    hit = [key for key, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit))})",
+                        [now, *hit],
+                    )
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = 0
+                for key, blob, size, used in rows:
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                        (key, blob, size, used),
+                    )
+                    if cur.rowcount:
+                        added += size
+                self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'bytes'", (added,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._evict()
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            freed = 0
+            cursor = self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_used")
+            victims = []
+            for key, size in cursor:
+                if total - freed <= target:
+                    break
+                victims.append(key)
+                freed += size
+            for i in range(0, len(victims), _SQL_BATCH):
+                part = victims[i : i + _SQL_BATCH]
+                self._conn.execute(
+                    f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                )
+            self._conn.execute("UPDATE stats SET value = value - ? WHERE name = 'bytes'", (freed,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info("Evicted %s cached embeddings (%s bytes)", len(victims), freed)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that only sends uncached texts to the underlying model."""
+
+    def __init__(self, underlying: Embeddings, model: str, dimensions: Optional[int] = None,
+                 cache: Optional[EmbeddingCache] = None):
+        self.underlying = underlying
+        self.model = model
+        self.dimensions = dimensions
+        self.cache = cache
+
+    def _lookup(self, texts: List[str]) -> Dict[str, List[float]]:
+        if self.cache is None:
+            return {}
+        try:
+            return self.cache.get_many([cache_key(self.model, self.dimensions, t) for t in texts])
+        except Exception as exc:
+            logger.warning("Embedding cache read failed: %s", exc)
+            return {}
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        if self.cache is None:
+            return
+        try:
+            self.cache.put_many(items)
+        except Exception as exc:
+            logger.warning("Embedding cache write failed: %s", exc)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model, self.dimensions, t) for t in texts]
+        cached = self._lookup(texts)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        if texts:
+            logger.debug("Embedding cache: %s/%s hits", len(texts) - len(missing), len(texts))
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = cache_key(self.model, self.dimensions, text)
+        cached = self._lookup([text])
+        if key in cached:
+            return cached[key]
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _cache, _cache_failed
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            try:
+                _cache = EmbeddingCache()
+            except Exception as exc:
+                _cache_failed = True
+                logger.warning("Embedding cache unavailable at %s: %s", EMBEDDING_CACHE_PATH, exc)
+        return _cache
+
+
+def get_cached_embeddings(
+    model: str = EMBEDDING_MODEL,
+    dimensions: Optional[int] = EMBEDDING_DIMENSIONS,
+    priority: Priority = Priority.INTERACTIVE,
+) -> CachedEmbeddings:
+    # Cache misses go through the rate-limit scheduler, which also owns 429 retries.
+    kwargs = {"model": model, "openai_api_key": os.getenv("OPENAI_API_KEY"), "max_retries": 0}
+    if dimensions:
+        kwargs["dimensions"] = dimensions
+    return CachedEmbeddings(
+        ScheduledEmbeddings(OpenAIEmbeddings(**kwargs), model=model, priority=priority),
+        model=model,
+        dimensions=dimensions,
+        cache=get_embedding_cache(),
+    )
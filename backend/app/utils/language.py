@@ -1,12 +1,78 @@
 import json
 import logging
+import math
 import os
-from typing import Dict
+import re
+from collections import Counter
+from typing import Dict, List
 
-from langchain_openai import ChatOpenAI
+from app.utils.language_profiles import LANGUAGE_NAMES, LANGUAGE_SAMPLES
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 
 logger = logging.getLogger(__name__)
 
+# Below this local confidence the LLM is asked instead.
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MIN_CONFIDENCE", "0.9"))
+# Texts shorter than this carry too few n-grams to classify locally.
+LANGUAGE_MIN_CHARS = 20
+# Only the start of long texts is scored; a few hundred n-grams settle the language.
+LANGUAGE_MAX_CHARS = 1000
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def _features(text: str) -> List[str]:
+    """Character 1-3 grams of each word (padded with spaces) plus the words themselves."""
+    features = []
+    for word in _WORD.findall(text.lower()):
+        padded = f" {word} "
+        features.append(f"w:{word}")
+        for n in (1, 2, 3):
+            features.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+    return features
+
+
+def _build_profiles() -> Dict[str, Dict[str, float]]:
+    counts = {code: Counter(_features(sample)) for code, sample in LANGUAGE_SAMPLES.items()}
+    vocabulary = set().union(*counts.values())
+    profiles = {}
+    for code, counter in counts.items():
+        total = sum(counter.values()) + len(vocabulary)
+        profile = {feature: math.log((counter[feature] + 1) / total) for feature in vocabulary}
+        profile[None] = math.log(1 / total)
+        profiles[code] = profile
+    return profiles
+
+
+_PROFILES = _build_profiles()
+_KNOWN_WORDS = {feature for feature in _PROFILES["en"] if feature and feature.startswith("w:")}
+# Share of words that must occur in the reference samples; below it the text is
+# probably in a language without a profile and confidence is scaled down.
+_MIN_WORD_COVERAGE = 0.3
+
+
+def identify_language(text: str) -> Dict[str, object]:
+    """
+    Local naive-Bayes identification over character n-gram profiles of the
+    languages in LANGUAGE_SAMPLES. Returns the same shape as `detect_language`.
+    """
+    sample = (text or "")[:LANGUAGE_MAX_CHARS]
+    features = _features(sample)
+    if len(sample.strip()) < LANGUAGE_MIN_CHARS or not features:
+        return {"code": "und", "name": "Unknown", "confidence": 0.0}
+
+    scores = {}
+    for code, profile in _PROFILES.items():
+        unseen = profile[None]
+        scores[code] = sum(profile.get(feature, unseen) for feature in features)
+    best = max(scores, key=scores.get)
+    norm = sum(math.exp(score - scores[best]) for score in scores.values())
+
+    words = [feature for feature in features if feature.startswith("w:")]
+    coverage = sum(word in _KNOWN_WORDS for word in words) / len(words) if words else 0.0
+    confidence = min(1.0, coverage / _MIN_WORD_COVERAGE) / norm
+    return {"code": best, "name": LANGUAGE_NAMES[best], "confidence": confidence}
+
 
 def _parse_json(content: str) -> Dict[str, object]:
     start = content.find("{")
@@ -23,12 +89,17 @@ def detect_language(text: str, *, model: str = "gpt-4o-mini") -> Dict[str, objec
     if not text or not text.strip():
         return {"code": "und", "name": "Unknown", "confidence": 0.0}
 
+    local = identify_language(text)
+    if local["confidence"] >= LANGUAGE_MIN_CONFIDENCE:
+        return local
+    logger.info("Local language identification unsure (%s, %.2f); asking %s", local["code"], local["confidence"], model)
+
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         logger.warning("OPENAI_API_KEY not set; language detection skipped.")
         return {"code": "und", "name": "Unknown", "confidence": 0.0}
 
-    llm = ChatOpenAI(model=model, temperature=0, max_tokens=80)
+    llm = ScheduledChatOpenAI(model=model, temperature=0, max_tokens=80)
     prompt = (
         "Detect the language of the following text. Return JSON with keys "
         "`code` (ISO 639-1), `name` (English language name), and `confidence` (0-1). "
@@ -44,3 +115,4 @@ def detect_language(text: str, *, model: str = "gpt-4o-mini") -> Dict[str, objec
     if not isinstance(confidence, (int, float)):
         confidence = 0.0
     return {"code": code, "name": name, "confidence": float(confidence)}
+
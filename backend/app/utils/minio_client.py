@@ -1,10 +1,36 @@
 import os
+import threading
+from typing import Optional
+
+import urllib3
 from minio import Minio
 
+# Connections kept open by the shared client.
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "16"))
+
+_client: Optional[Minio] = None
+_client_lock = threading.Lock()
+
 
 def get_minio_client() -> Minio:
-    endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
-    access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-    secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
-    secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
-    return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+    """Shared client for this process; its urllib3 pool is reused by every router."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
+            access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+            secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
+            secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
+            http_client = urllib3.PoolManager(
+                maxsize=MINIO_POOL_SIZE,
+                timeout=urllib3.Timeout(connect=30, read=300),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            )
+            _client = Minio(
+                endpoint,
+                access_key=access_key,
+                secret_key=secret_key,
+                secure=secure,
+                http_client=http_client,
+            )
+        return _client
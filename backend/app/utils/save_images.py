@@ -1,15 +1,24 @@
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
 from app.db.db import ImageRecord
 from app.schemas import ImageMetadata
 
 def save_image_metadata_list(db, metadata_list: list[ImageMetadata]):
+    # Image objects are content-addressed, so the same file can come back from
+    # several pages or documents; keep one record per page it appears on.
+    rows = {}
     for meta in metadata_list:
-        record = ImageRecord(
-            book_id=meta.book_id,
-            source_pdf=meta.source_pdf,
-            page_number=meta.page_number,
-            xref=meta.xref,
-            filename=meta.filename,
-            caption=meta.caption,
-        )
-        db.add(record)
+        rows.setdefault((meta.source_pdf, meta.page_number, meta.filename), {
+            "book_id": meta.book_id,
+            "source_pdf": meta.source_pdf,
+            "page_number": meta.page_number,
+            "xref": meta.xref,
+            "filename": meta.filename,
+            "caption": meta.caption,
+            "thumbnail": meta.thumbnail,
+            "preview": meta.preview,
+        })
+    if rows:
+        stmt = pg_insert(ImageRecord.__table__).values(list(rows.values()))
+        db.execute(stmt.on_conflict_do_nothing(index_elements=["source_pdf", "page_number", "filename"]))
     db.commit()
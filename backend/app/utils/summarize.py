@@ -1,7 +1,7 @@
 import logging
 from typing import Iterable, List
 
-from langchain_openai import ChatOpenAI
+from app.utils.openai_scheduler import ScheduledChatOpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +40,7 @@ def summarize_texts(
     if not texts:
         return ""
 
-    llm = ChatOpenAI(model=model, temperature=0)
+    llm = ScheduledChatOpenAI(model=model, temperature=0)
     batches = _batch_texts(texts, max_chars=max_chars)
     language_line = (
         f"Respond in {language_name}.\n\n" if language_name and language_name != "Unknown" else ""
@@ -1,15 +1,83 @@
-from langchain_openai import OpenAIEmbeddings
+import os
+
 from langchain_elasticsearch import ElasticsearchStore
 from elasticsearch import Elasticsearch
-import os
+from app.utils.embedding_cache import get_cached_embeddings
+
+# kNN candidates are re-ranked against the stored float vectors; oversample x k are
+# rescored. Keeps recall on quantized (int8/int4/bbq) indices. 0 disables it.
+ES_RESCORE_OVERSAMPLE = float(os.getenv("ES_RESCORE_OVERSAMPLE", "3.0"))
+# Chunks repeated across documents (same dup_group from ingestion) are returned once;
+# searches fetch this many times k so collapsing still leaves k results.
+DUPLICATE_OVERFETCH = int(os.getenv("DUPLICATE_OVERFETCH", "2"))
+
+
+def _with_rescore(query_body: dict, _query: str) -> dict:
+    knn = query_body.get("knn")
+    if isinstance(knn, dict):
+        if ES_RESCORE_OVERSAMPLE > 0:
+            knn["rescore_vector"] = {"oversample": ES_RESCORE_OVERSAMPLE}
+        # Over-fetched searches may ask for more than the default candidates.
+        if knn.get("k") and knn.get("num_candidates", 0) < knn["k"]:
+            knn["num_candidates"] = knn["k"]
+    return query_body
+
+
+def _duplicate_key(doc):
+    metadata = doc.metadata or {}
+    return metadata.get("dup_group") or metadata.get("chunk_hash")
+
+
+def collapse_duplicates(results, k, key=_duplicate_key):
+    """Keeps the best-ranked result of each duplicate group, up to k results."""
+    seen = set()
+    kept = []
+    for result in results:
+        group = key(result)
+        if group is not None:
+            if group in seen:
+                continue
+            seen.add(group)
+        kept.append(result)
+        if len(kept) == k:
+            break
+    return kept
+
+
+class RescoringElasticsearchStore(ElasticsearchStore):
+    """
+    ElasticsearchStore whose kNN searches rescore with full-precision vectors and
+    return each duplicate group once.
+    """
+
+    def similarity_search(self, query, k=4, fetch_k=50, filter=None, *, custom_query=None, **kwargs):
+        fetch = k * max(DUPLICATE_OVERFETCH, 1)
+        results = super().similarity_search(
+            query,
+            k=fetch,
+            fetch_k=max(fetch_k, fetch),
+            filter=filter,
+            custom_query=custom_query or _with_rescore,
+            **kwargs,
+        )
+        return collapse_duplicates(results, k)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, *, custom_query=None, **kwargs):
+        results = super().similarity_search_with_score(
+            query,
+            k=k * max(DUPLICATE_OVERFETCH, 1),
+            filter=filter,
+            custom_query=custom_query or _with_rescore,
+            **kwargs,
+        )
+        return collapse_duplicates(results, k, key=lambda result: _duplicate_key(result[0]))
+
 
 def get_vectorstore(index_name="pdf_chunks"):
     es = Elasticsearch("http://elasticsearch:9200")  # or use ENV
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-    return ElasticsearchStore(
+    # Model and dimensions come from EMBEDDING_MODEL / EMBEDDING_DIMENSIONS, as at ingestion.
+    embeddings = get_cached_embeddings()
+    return RescoringElasticsearchStore(
         es_connection=es,
         index_name=index_name,
         embedding=embeddings,
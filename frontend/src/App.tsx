@@ -22,6 +22,17 @@ type QueryResponse = {
   captions: QueryItem[];
 };
 
+type IngestJob = {
+  job_id: string;
+  status: "queued" | "running" | "failed" | "done";
+  stage?: string | null;
+  percent?: number;
+  stats?: Record<string, any>;
+  error?: string | null;
+};
+
+const JOB_POLL_INTERVAL_MS = 2000;
+
 function setStatus(next: Status, setter: (value: Status) => void) {
   setter(next);
 }
@@ -134,6 +145,39 @@ export default function App() {
     setStatus({ message: "Ready to upload.", tone: "ok" }, setUploadStatus);
   };
 
+  const runIngestion = async (uploadedName: string) => {
+    const processRes = await fetch(
+      `/pdfworker/process/full/${encodeURIComponent(uploadedName)}`,
+      { method: "POST" }
+    );
+
+    if (!processRes.ok) {
+      throw new Error(await processRes.text());
+    }
+
+    const { job_id: jobId } = (await processRes.json()) as { job_id: string };
+
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const jobRes = await fetch(`/pdfworker/jobs/${encodeURIComponent(jobId)}`);
+      if (!jobRes.ok) {
+        throw new Error(await jobRes.text());
+      }
+      const job = (await jobRes.json()) as IngestJob;
+      if (job.status === "done") {
+        return job.stats ?? {};
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error ?? "Indexing failed");
+      }
+      const stage = job.stage ?? job.status;
+      setStatus(
+        { message: `Indexing... ${stage} (${job.percent ?? 0}%)`, tone: "idle" },
+        setUploadStatus
+      );
+    }
+  };
+
   const handleUpload = async () => {
     if (!file) {
       setStatus({ message: "Select a PDF first.", tone: "warn" }, setUploadStatus);
@@ -162,16 +206,7 @@ export default function App() {
 
       setStatus({ message: "Upload complete. Indexing...", tone: "ok" }, setUploadStatus);
 
-      const processRes = await fetch(
-        `/pdfworker/process/full/${encodeURIComponent(uploadedName)}`,
-        { method: "POST" }
-      );
-
-      if (!processRes.ok) {
-        throw new Error(await processRes.text());
-      }
-
-      const processData = await processRes.json();
+      const processData = await runIngestion(uploadedName);
       const pages = processData.pages ?? "?";
       const chunks = processData.chunks_indexed ?? "?";
       const captions = processData.captions_indexed ?? "?";
@@ -275,16 +310,7 @@ export default function App() {
 
       setStatus({ message: "Upload complete. Indexing...", tone: "ok" }, setUploadStatus);
 
-      const processRes = await fetch(
-        `/pdfworker/process/full/${encodeURIComponent(uploadedName)}`,
-        { method: "POST" }
-      );
-
-      if (!processRes.ok) {
-        throw new Error(await processRes.text());
-      }
-
-      const processData = await processRes.json();
+      const processData = await runIngestion(uploadedName);
       const pages = processData.pages ?? "?";
       const chunks = processData.chunks_indexed ?? "?";
       const captions = processData.captions_indexed ?? "?";
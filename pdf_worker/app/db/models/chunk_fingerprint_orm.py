@@ -0,0 +1,25 @@
+# app/db/models/chunk_fingerprint_orm.py
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+
+from app.db.base import Base
+
+
+class ChunkFingerprintORM(Base):
+    __tablename__ = "chunk_fingerprints"
+
+    chunk_hash = Column(String(32), primary_key=True)  # es.chunk_hash of size and text
+    # 64-bit SimHash stored as signed; NULL for chunks too short to compare loosely.
+    simhash = Column(BigInteger, nullable=True)
+    # 16-bit bands of the SimHash: fingerprints within 3 bits share at least one.
+    band0 = Column(Integer, index=True, nullable=True)
+    band1 = Column(Integer, index=True, nullable=True)
+    band2 = Column(Integer, index=True, nullable=True)
+    band3 = Column(Integer, index=True, nullable=True)
+    chunk_size = Column(Integer, nullable=False)
+    text_digest = Column(String(64), nullable=False)  # sha256 of the text, as in the embedding cache
+    dup_group = Column(String(32), index=True, nullable=False)  # chunk_hash of the first chunk seen
+    filename = Column(String, index=True, nullable=False)  # where the chunk was first seen
+    chunk_index = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,16 @@
+# app/db/models/document_metadata_orm.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import Base
+
+
+class DocumentMetadataORM(Base):
+    __tablename__ = "document_metadata_cache"
+
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the PDF bytes
+    payload = Column(JSONB, nullable=False)  # DocumentMetadata fields
+    sources = Column(JSONB, nullable=True)  # field -> "pdf" | "xmp" | "text" | "llm"
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,15 @@
+# app/db/models/document_version_orm.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String
+
+from app.db.base import Base
+
+
+class DocumentVersionORM(Base):
+    __tablename__ = "document_versions"
+
+    filename = Column(String, primary_key=True)  # object name of the new upload
+    previous = Column(String, index=True, nullable=False)  # object name of the version it replaces
+    linked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    retired_at = Column(DateTime, nullable=True)  # set once the previous version left the indices
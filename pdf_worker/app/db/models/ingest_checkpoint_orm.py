@@ -0,0 +1,23 @@
+# app/db/models/ingest_checkpoint_orm.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import Base
+
+
+class IngestCheckpointORM(Base):
+    __tablename__ = "ingest_checkpoints"
+
+    document_id = Column(String, primary_key=True)  # source filename in the uploads bucket
+    stage = Column(String, primary_key=True)  # e.g. "cleaned_pages" | "language" | "chunks"
+    payload = Column(JSONB, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class IngestEmbeddedChunkORM(Base):
+    __tablename__ = "ingest_embedded_chunks"
+
+    document_id = Column(String, primary_key=True)
+    chunk_id = Column(String, primary_key=True)  # ES doc id of the indexed chunk
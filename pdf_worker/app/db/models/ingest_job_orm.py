@@ -0,0 +1,38 @@
+# app/db/models/ingest_job_orm.py
+import enum
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import Column, DateTime, Enum, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+from app.db.base import Base
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FAILED = "failed"
+    DONE = "done"
+
+
+class IngestJobORM(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    filename = Column(String, index=True, nullable=False)
+    content_hash = Column(String(64), index=True, nullable=True)  # sha256 set by the backend upload
+    status = Column(Enum(JobStatus), index=True, nullable=False, default=JobStatus.QUEUED)
+    stage = Column(String, nullable=True)
+    percent = Column(Integer, nullable=False, default=0)
+    stats = Column(JSONB, nullable=True)  # the dict returned by process_pdf / process_html
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    worker_id = Column(String, nullable=True)  # replica/thread holding the lease
+    lease_expires_at = Column(DateTime, index=True, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
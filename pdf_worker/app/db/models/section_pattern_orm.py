@@ -0,0 +1,17 @@
+# app/db/models/section_pattern_orm.py
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.base import Base
+
+
+class SectionPatternORM(Base):
+    __tablename__ = "section_pattern_cache"
+
+    fingerprint = Column(String(64), primary_key=True)  # source/publisher fingerprint, see structure.py
+    patterns = Column(JSONB, nullable=False)
+    confidence = Column(Float, nullable=True)  # None when the patterns came from the LLM
+    documents = Column(Integer, nullable=False, default=1)  # documents that used these patterns
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,19 +1,30 @@
-import fitz  # PyMuPDF
+import json
 import logging
 import time
 from fastapi import FastAPI, HTTPException
-from typing import List
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Optional
 
+from app.db.db import init_db
 from app.models import DocumentMetadata, ImageMetadata, TextChunkEmbedding
 from app.utils.cleaning.clean_text_pipeline import clean_document_text
-from app.utils.embedding import embed_chunks
+from app.utils.embedding import embed_chunks, encoding
 from app.utils.es import ensure_all_indices, save_chunks_to_es
 from app.utils.image_extraction import process_images_and_captions
+from app.utils.jobs import (
+    TERMINAL_STATUSES,
+    enqueue_job,
+    get_job,
+    queue_metrics,
+    shutdown_jobs,
+    start_workers,
+)
 from app.utils.language import detect_language_from_pages
-from app.utils.html_pipeline import process_html
-from app.utils.metadata import get_doc_info
-from app.utils.minio_utils import download_from_minio
-from app.utils.pdf_pipeline import process_pdf
+from app.utils.metadata import IncompleteMetadataError, get_doc_info, load_cached_metadata
+from app.utils.minio_utils import download_from_minio, get_object_sha256
+from app.utils.openai_scheduler import get_scheduler
+from app.utils.parallel import shutdown_process_pool
+from app.utils.pdf_document import parse_pdf
 from app.utils.pdf_reader import read_pdf_from_minio
 from app.utils.structure import detect_section_patterns_from_pages
 from app.utils.text_chunker import chunk_text
@@ -30,11 +41,21 @@ def _startup():
         try:
             ensure_all_indices()
             logger.info("Elasticsearch indices ready.")
-            return
+            break
         except Exception as exc:
             logger.warning("Elasticsearch not ready (attempt %s/%s): %s", attempt, max_attempts, exc)
             time.sleep(2)
-    raise RuntimeError("Elasticsearch not reachable after startup retries")
+    else:
+        raise RuntimeError("Elasticsearch not reachable after startup retries")
+
+    init_db()
+    start_workers()
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    shutdown_jobs()
+    shutdown_process_pool()
 
 
 @app.post("/extract/{filename}")
@@ -54,8 +75,15 @@ def extract_pdf(filename: str):
 @app.post("/metadata/{filename}", response_model=DocumentMetadata)
 def extract_metadata(filename: str):
     try:
+        # Known content is answered from the metadata cache without downloading the PDF.
+        content_hash = get_object_sha256(filename)
+        cached = load_cached_metadata(content_hash) if content_hash else None
+        if cached is not None:
+            return cached
         local_path = download_from_minio(filename)
-        return get_doc_info(local_path)
+        return get_doc_info(local_path, content_hash=content_hash)
+    except IncompleteMetadataError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "missing": e.missing})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -64,9 +92,11 @@ def extract_metadata(filename: str):
 def extract_images(filename: str):
     try:
         local_path = download_from_minio(filename)
-        with fitz.open(local_path) as doc:
-            page_range = list(range(len(doc)))
-        return process_images_and_captions(local_path, page_range, book_id=filename.split("_")[0])
+        document = parse_pdf(local_path)
+        page_range = list(range(document.page_count))
+        return process_images_and_captions(
+            local_path, page_range, book_id=filename.split("_")[0], document=document
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -114,30 +144,110 @@ def process_clean_embed_chunks(filename: str):
             chunk_sizes=[800, 1600],
             language_code=language_info.get("code"),
             section_patterns=section_patterns,
+            encoding=encoding,
         )
         embedded = embed_chunks(chunks)
 
         save_chunks_to_es(filename, embedded)
 
-        return embedded
+        return embedded.to_models()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/process/full/{filename}")
-def full_pdf_pipeline(filename: str):
+@app.post("/process/full/{filename}", status_code=202)
+def full_pdf_pipeline(filename: str, force: bool = False, previous: Optional[str] = None):
     try:
-        local_path = download_from_minio(filename)
-        book_id = filename.split("_")[0]
-        if filename.lower().endswith((".html", ".htm")):
-            stats = process_html(local_path, book_id, filename) or {}
-        else:
-            stats = process_pdf(local_path, book_id, filename) or {}
-        return {"status": "success", "filename": filename, **stats}
+        job = enqueue_job(filename, force=force, previous=previous)
+        return {
+            "status": job["status"],
+            "filename": filename,
+            "job_id": job["job_id"],
+            "duplicate": job["duplicate"],
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/jobs/metrics")
+def jobs_metrics():
+    return queue_metrics()
+
+
+@app.get("/metrics/openai")
+def openai_metrics():
+    return get_scheduler().snapshot()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    metrics = queue_metrics()
+    lines = [
+        "# TYPE pdf_worker_jobs gauge",
+        *(
+            f'pdf_worker_jobs{{status="{status}"}} {metrics[status]}'
+            for status in ("queued", "running", "failed", "done")
+        ),
+        "# TYPE pdf_worker_jobs_expired_leases gauge",
+        f"pdf_worker_jobs_expired_leases {metrics['expired_leases']}",
+        "# TYPE pdf_worker_jobs_active_workers gauge",
+        f"pdf_worker_jobs_active_workers {metrics['active_workers']}",
+        "# TYPE pdf_worker_jobs_oldest_queued_age_seconds gauge",
+        f"pdf_worker_jobs_oldest_queued_age_seconds {metrics['oldest_queued_age_seconds']}",
+    ]
+    openai = get_scheduler().snapshot()
+    if openai:
+        lines.append("# TYPE pdf_worker_openai_queued gauge")
+        for m in openai:
+            lines.extend(
+                f'pdf_worker_openai_queued{{model="{m["model"]}",priority="{p}"}} {n}'
+                for p, n in m["queued"].items()
+            )
+        lines.append("# TYPE pdf_worker_openai_rate_limited_total counter")
+        lines.extend(f'pdf_worker_openai_rate_limited_total{{model="{m["model"]}"}} {m["rate_limited"]}' for m in openai)
+        lines.append("# TYPE pdf_worker_openai_wait_seconds_avg gauge")
+        lines.extend(f'pdf_worker_openai_wait_seconds_avg{{model="{m["model"]}"}} {m["wait_seconds_avg"]}' for m in openai)
+    return "\n".join(lines) + "\n"
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    try:
+        job = get_job(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job id")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str, interval: float = 1.0):
+    try:
+        job = get_job(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job id")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def _stream():
+        last = None
+        current = job
+        while current is not None:
+            snapshot = (current["status"], current["stage"], current["percent"])
+            if snapshot != last:
+                last = snapshot
+                yield f"data: {json.dumps(current)}\n\n"
+            if current["status"] in {s.value for s in TERMINAL_STATUSES}:
+                return
+            time.sleep(max(interval, 0.2))
+            current = get_job(job_id)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
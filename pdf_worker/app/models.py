@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field
 from enum import Enum
-from typing import Optional, List
-from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, List, Sequence, Tuple
+from dataclasses import dataclass, field
+
+import numpy as np
 
 
 # --- Enum Definitions ---
@@ -45,6 +47,8 @@ class DocumentMetadata(BaseModel):
     isbn: Optional[str] = Field(None, description="The ISBN number, if available")
     doi: Optional[str] = Field(None, description="The DOI, if available")
     publisher: Optional[str] = Field(None, description="The publisher of the book, if available")
+    numac: Optional[str] = Field(None, description="Belgian Official Gazette NUMAC identifier, if available")
+    eli: Optional[str] = Field(None, description="European Legislation Identifier path, if available")
 
 
 
@@ -57,6 +61,9 @@ class ImageMetadata(BaseModel):
     filename: str
     caption: str = ""
     embedding: List = None
+    # Derivative object names, stored next to `filename` (rendered screenshots only).
+    thumbnail: Optional[str] = None
+    preview: Optional[str] = None
 
 
 
@@ -66,3 +73,130 @@ class TextChunkEmbedding(BaseModel):
     text: str
     pages: List[int]
     embedding: List[float]
+    language: Optional[str] = None
+    dup_group: Optional[str] = None  # chunk_hash of the corpus chunk this one near-duplicates
+    # Position in the normalized document text and the neighbour links of CHUNK_MODE=small_to_big.
+    start: Optional[int] = None
+    end: Optional[int] = None
+    section_index: Optional[int] = None
+    prev_index: Optional[int] = None
+    next_index: Optional[int] = None
+
+
+# --- Embedded chunks (internal, columnar) ---
+# Optional per-chunk attributes carried next to the vectors, as in TextChunkEmbedding.
+CHUNK_COLUMNS = ("language", "dup_group", "start", "end", "section_index", "prev_index", "next_index")
+
+
+@dataclass
+class EmbeddedChunkBatch:
+    """
+    A batch of embedded chunks: one float32 row of `vectors` per chunk plus one
+    array or list per attribute. Bulk writes serialize the rows as they are;
+    TextChunkEmbedding is only built for HTTP responses (to_models).
+    """
+    vectors: np.ndarray  # (n, dims) float32; rows of the wrong size are NaN
+    chunk_size: np.ndarray  # (n,) int32
+    chunk_index: np.ndarray  # (n,) int32
+    text: List[str]
+    pages: List[List[int]]
+    columns: Dict[str, list] = field(default_factory=dict)
+
+    @classmethod
+    def from_chunks(
+        cls, chunks: Sequence[dict], vectors: Sequence[Sequence[float]], dims: Optional[int] = None
+    ) -> "EmbeddedChunkBatch":
+        if dims is None:
+            dims = len(vectors[0]) if len(vectors) else 0
+        if all(vec is not None and len(vec) == dims for vec in vectors):
+            matrix = np.asarray(vectors, dtype=np.float32).reshape(len(chunks), dims)
+        else:
+            matrix = np.full((len(chunks), dims), np.nan, dtype=np.float32)
+            for row, vec in enumerate(vectors):
+                if vec is not None and len(vec) == dims:
+                    matrix[row] = vec
+        return cls(
+            vectors=matrix,
+            chunk_size=np.fromiter((c["chunk_size"] for c in chunks), dtype=np.int32, count=len(chunks)),
+            chunk_index=np.fromiter((c["chunk_index"] for c in chunks), dtype=np.int32, count=len(chunks)),
+            text=[c["text"] for c in chunks],
+            pages=[c["pages"] for c in chunks],
+            columns={name: [c.get(name) for c in chunks] for name in CHUNK_COLUMNS},
+        )
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def row(self, i: int) -> dict:
+        """Attributes of chunk `i` as in a chunker dict, without its vector."""
+        chunk = {
+            "chunk_size": int(self.chunk_size[i]),
+            "chunk_index": int(self.chunk_index[i]),
+            "text": self.text[i],
+            "pages": self.pages[i],
+        }
+        chunk.update({name: values[i] for name, values in self.columns.items()})
+        return chunk
+
+    def rows(self) -> Iterator[dict]:
+        return (self.row(i) for i in range(len(self)))
+
+    def valid_rows(self, dims: int) -> np.ndarray:
+        """Mask of the rows holding a complete `dims`-sized vector."""
+        if self.vectors.ndim != 2 or self.vectors.shape[1] != dims:
+            return np.zeros(len(self), dtype=bool)
+        return np.isfinite(self.vectors).all(axis=1)
+
+    def to_models(self) -> List[TextChunkEmbedding]:
+        return [
+            TextChunkEmbedding(**self.row(i), embedding=self.vectors[i].tolist()) for i in range(len(self))
+        ]
+
+
+# --- Parsed document (internal, shared by the pipeline stages) ---
+@dataclass
+class ParsedPage:
+    index: int
+    rect: Tuple[float, float, float, float]
+    lines: List[str]
+    blocks: List[tuple]
+    layout: dict
+    images: List[tuple] = field(default_factory=list)
+    image_boxes: List[Tuple[float, float, float, float]] = field(default_factory=list)
+
+    @property
+    def page_number(self) -> int:
+        return self.index + 1
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def image_xrefs(self) -> List[int]:
+        return [img[0] for img in self.images]
+
+
+@dataclass
+class ParsedDocument:
+    path: str
+    page_count: int
+    metadata: dict
+    pages: List[ParsedPage]
+    _by_index: dict = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        self._by_index = {p.index: p for p in self.pages}
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def page(self, index: int) -> Optional[ParsedPage]:
+        return self._by_index.get(index)
+
+    @property
+    def pages_lines(self) -> List[List[str]]:
+        return [p.lines for p in self.pages]
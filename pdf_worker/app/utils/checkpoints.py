@@ -0,0 +1,104 @@
+import logging
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Set, TypeVar
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.db import SessionLocal
+from app.db.models.ingest_checkpoint_orm import IngestCheckpointORM, IngestEmbeddedChunkORM
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+def load_checkpoint(document_id: str, stage: str, default=None):
+    db = SessionLocal()
+    try:
+        row = db.get(IngestCheckpointORM, (document_id, stage))
+        return row.payload if row is not None else default
+    finally:
+        db.close()
+
+
+def save_checkpoint(document_id: str, stage: str, payload) -> None:
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(IngestCheckpointORM.__table__).values(
+            document_id=document_id,
+            stage=stage,
+            payload=payload,
+            updated_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["document_id", "stage"],
+            set_={"payload": stmt.excluded.payload, "updated_at": stmt.excluded.updated_at},
+        )
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def checkpointed(
+    document_id: str,
+    stage: str,
+    compute: Callable[[], T],
+    *,
+    dump: Callable[[T], object] = lambda value: value,
+    load: Callable[[object], T] = lambda payload: payload,
+) -> T:
+    """Returns the stored output of `stage`, or computes and stores it."""
+    payload = load_checkpoint(document_id, stage, default=_MISSING)
+    if payload is not _MISSING:
+        logger.info("Resuming %s from checkpoint '%s'", document_id, stage)
+        return load(payload)
+    value = compute()
+    save_checkpoint(document_id, stage, dump(value))
+    return value
+
+
+def embedded_chunk_ids(document_id: str) -> Set[str]:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(IngestEmbeddedChunkORM.chunk_id)
+            .filter(IngestEmbeddedChunkORM.document_id == document_id)
+            .all()
+        )
+        return {chunk_id for (chunk_id,) in rows}
+    finally:
+        db.close()
+
+
+def mark_chunks_embedded(document_id: str, chunk_ids: Iterable[str]) -> None:
+    rows = [{"document_id": document_id, "chunk_id": cid} for cid in set(chunk_ids)]
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(IngestEmbeddedChunkORM.__table__).values(rows)
+        stmt = stmt.on_conflict_do_nothing(index_elements=["document_id", "chunk_id"])
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def clear_checkpoints(document_id: str, *, keep: Optional[Iterable[str]] = None) -> None:
+    """Drops the stored stage outputs once a document is fully ingested."""
+    keep = set(keep or [])
+    db = SessionLocal()
+    try:
+        query = db.query(IngestCheckpointORM).filter(IngestCheckpointORM.document_id == document_id)
+        if keep:
+            query = query.filter(IngestCheckpointORM.stage.notin_(keep))
+        query.delete(synchronize_session=False)
+        db.query(IngestEmbeddedChunkORM).filter(
+            IngestEmbeddedChunkORM.document_id == document_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -1,12 +1,14 @@
-import fitz
-from typing import List
+from typing import List, Optional
+from app.models import ParsedDocument
 from app.utils.cleaning.header_footer import collect_repeating_lines, remove_repeating_lines
 from app.utils.cleaning.page_numbers import detect_page_numbers, remove_page_numbers
+from app.utils.pdf_document import parse_pdf
 
-def clean_document_text(pdf_path: str) -> List[str]:
+def clean_document_text(pdf_path: str, *, document: Optional[ParsedDocument] = None) -> List[str]:
     """Returns cleaned text per page (as joined string per page)."""
-    with fitz.open(pdf_path) as doc:
-        pages_text = [page.get_text().splitlines() for page in doc]
+    if document is None:
+        document = parse_pdf(pdf_path)
+    pages_text = document.pages_lines
 
     # Step 1: Remove headers & footers
     header_set, footer_set = collect_repeating_lines(pages_text)
@@ -17,4 +19,4 @@ def clean_document_text(pdf_path: str) -> List[str]:
     fully_cleaned = remove_page_numbers([page.splitlines() for page in pages_no_headers], sequences)
 
     return fully_cleaned  # list of strings (one per page)
- 
+
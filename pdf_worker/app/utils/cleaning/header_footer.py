@@ -1,44 +1,114 @@
-from typing import List, Set, Tuple
+import os
+from typing import List, Optional, Set, Tuple
 
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Pages compared per cdist call in fuzzy mode (plus the lookahead pages after them).
+FUZZY_WINDOW_PAGES = 64
+# Above this many pages, candidates are learned from evenly spaced page windows only (0 = off).
+HEADER_FOOTER_SAMPLE_PAGES = int(os.getenv("HEADER_FOOTER_SAMPLE_PAGES", "0"))
 
 
 def normalize(line: str) -> str:
     return line.strip().lower()
 
 
+def _zone_lines(pages_text: List[List[str]], n: int) -> Tuple[List[List[str]], List[List[str]]]:
+    """Normalized non-empty top and bottom `n` lines of every page, computed once."""
+    tops, bottoms = [], []
+    for page in pages_text:
+        tops.append([norm for norm in map(normalize, page[:n]) if norm])
+        bottoms.append([norm for norm in map(normalize, page[-n:]) if norm])
+    return tops, bottoms
+
+
+def _sample_windows(page_count: int, lookahead: int, sample_pages: Optional[int]) -> List[int]:
+    """Indices of the pages whose lines are compared with the following `lookahead` pages."""
+    if not sample_pages or page_count <= sample_pages:
+        return list(range(page_count))
+    window = lookahead + 1
+    windows = max(1, sample_pages // window)
+    step = page_count / windows
+    starts = sorted({int(k * step) for k in range(windows)})
+    return sorted({s + k for s in starts for k in range(window) if s + k < page_count})
+
+
+def _exact_repeats(zones: List[List[str]], pages: List[int], lookahead: int) -> Set[str]:
+    sets = [set(zone) for zone in zones]
+    found: Set[str] = set()
+    for i in pages:
+        ahead = set().union(*sets[i + 1 : i + 1 + lookahead])
+        found |= sets[i] & ahead
+    return found
+
+
+def _fuzzy_repeats(zones: List[List[str]], pages: List[int], lookahead: int, threshold: int) -> Set[str]:
+    """
+    Lines of page i scoring >= threshold against a line of pages i+1..i+lookahead.
+    Pages are scored in windows with one cdist call each; the page-distance mask
+    keeps only the pairs the lookahead allows.
+    """
+    found: Set[str] = set()
+    for w in range(0, len(pages), FUZZY_WINDOW_PAGES):
+        query_pages = pages[w : w + FUZZY_WINDOW_PAGES]
+        choice_pages = sorted({j for i in query_pages for j in range(i + 1, i + 1 + lookahead) if j < len(zones)})
+        queries = [(i, line) for i in query_pages for line in zones[i]]
+        choices = [(j, line) for j in choice_pages for line in zones[j]]
+        if not queries or not choices:
+            continue
+
+        scores = process.cdist(
+            [line for _, line in queries],
+            [line for _, line in choices],
+            scorer=fuzz.ratio,
+            score_cutoff=threshold,
+            dtype=np.uint8,
+            workers=-1,
+        )
+        gap = np.array([j for j, _ in choices])[None, :] - np.array([i for i, _ in queries])[:, None]
+        hits = ((scores >= threshold) & (gap >= 1) & (gap <= lookahead)).any(axis=1)
+        found.update(queries[k][1] for k in np.flatnonzero(hits))
+    return found
+
+
+def _extend_fuzzy(zones: List[List[str]], candidates: Set[str], threshold: int) -> Set[str]:
+    """Adds every zone line that fuzzily matches a candidate learned from the sample."""
+    lines = sorted({line for zone in zones for line in zone} - candidates)
+    if not lines or not candidates:
+        return set(candidates)
+    scores = process.cdist(
+        lines, sorted(candidates), scorer=fuzz.ratio, score_cutoff=threshold, dtype=np.uint8, workers=-1
+    )
+    hits = (scores >= threshold).any(axis=1)
+    return set(candidates) | {lines[k] for k in np.flatnonzero(hits)}
+
+
 def collect_repeating_lines(
     pages_text: List[List[str]],
     n: int = 5,
     lookahead: int = 2,
     threshold: int = 100,
+    sample_pages: Optional[int] = HEADER_FOOTER_SAMPLE_PAGES,
 ) -> Tuple[Set[str], Set[str]]:
     """
     Scan pages and collect repeated header/footer lines.
     `threshold` is an exact match at 100, or set lower (e.g. 85) for fuzzy matches.
+    With `sample_pages`, longer documents are scanned in evenly spaced page windows;
+    in fuzzy mode the lines found there are then matched against every page.
     """
-    header_candidates = set()
-    footer_candidates = set()
-
-    for i, page in enumerate(pages_text):
-        top_lines = [normalize(line) for line in page[:n]]
-        bottom_lines = [normalize(line) for line in page[-n:]]
-
-        for j in range(1, lookahead + 1):
-            if i + j >= len(pages_text):
-                break
-
-            next_top = [normalize(line) for line in pages_text[i + j][:n]]
-            next_bottom = [normalize(line) for line in pages_text[i + j][-n:]]
-
-            for line in top_lines:
-                if line and any(fuzz.ratio(line, other) >= threshold for other in next_top):
-                    header_candidates.add(line)
-
-            for line in bottom_lines:
-                if line and any(fuzz.ratio(line, other) >= threshold for other in next_bottom):
-                    footer_candidates.add(line)
-
+    tops, bottoms = _zone_lines(pages_text, n)
+    pages = _sample_windows(len(pages_text), lookahead, sample_pages)
+    sampled = len(pages) < len(pages_text)
+
+    if threshold >= 100:
+        return _exact_repeats(tops, pages, lookahead), _exact_repeats(bottoms, pages, lookahead)
+
+    header_candidates = _fuzzy_repeats(tops, pages, lookahead, threshold)
+    footer_candidates = _fuzzy_repeats(bottoms, pages, lookahead, threshold)
+    if sampled:
+        header_candidates = _extend_fuzzy(tops, header_candidates, threshold)
+        footer_candidates = _extend_fuzzy(bottoms, footer_candidates, threshold)
     return header_candidates, footer_candidates
 
 
@@ -56,15 +126,15 @@ def remove_repeating_lines(
 
     for page in pages_text:
         cleaned = []
+        footer_start = len(page) - n
         for i, line in enumerate(page):
-            norm = normalize(line)
-            is_header_zone = i < n
-            is_footer_zone = i >= len(page) - n
-
-            if is_header_zone and norm in header_set:
-                continue
-            if is_footer_zone and norm in footer_set:
-                continue
+            # Only lines in the header/footer zones need normalizing.
+            if i < n or i >= footer_start:
+                norm = normalize(line)
+                if i < n and norm in header_set:
+                    continue
+                if i >= footer_start and norm in footer_set:
+                    continue
 
             cleaned.append(line)
 
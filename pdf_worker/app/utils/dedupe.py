@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.db import SessionLocal
+from app.db.models.chunk_fingerprint_orm import ChunkFingerprintORM
+from app.utils.embedding_cache import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    digest_key,
+    get_embedding_cache,
+    text_digest,
+)
+from app.utils.es import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUPLICATE_DETECTION = os.getenv("NEAR_DUPLICATE_DETECTION", "true").lower() == "true"
+# Largest SimHash distance (of 64 bits) still treated as the same passage. The four
+# 16-bit bands only guarantee candidates up to 3 bits.
+NEAR_DUPLICATE_MAX_DISTANCE = min(int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "3")), 3)
+# Chunks with fewer word shingles than this are only matched exactly.
+NEAR_DUPLICATE_MIN_SHINGLES = int(os.getenv("NEAR_DUPLICATE_MIN_SHINGLES", "16"))
+
+SHINGLE_WORDS = 3
+BANDS = 4
+_WORD = re.compile(r"\w+", re.UNICODE)
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def _shingles(text: str) -> List[str]:
+    words = _WORD.findall(text.lower())
+    return [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def simhash(shingles: List[str]) -> int:
+    """64-bit SimHash of word shingles: each bit is the majority vote of the shingle hashes."""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, None] >> _BITS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int(np.sum(np.left_shift(np.uint64(1), _BITS[votes > 0]), dtype=np.uint64))
+
+
+def _signed(value: int) -> int:
+    # Postgres BIGINT is signed.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value: int) -> Tuple[int, ...]:
+    return tuple((value >> (16 * i)) & 0xFFFF for i in range(BANDS))
+
+
+def _distance(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def _fingerprint(chunk: dict) -> dict:
+    text = chunk["text"]
+    shingles = _shingles(text)
+    value = simhash(shingles) if len(shingles) >= NEAR_DUPLICATE_MIN_SHINGLES else None
+    return {
+        "chunk_hash": chunk_hash(chunk["chunk_size"], text),
+        "chunk_size": int(chunk["chunk_size"]),
+        "text_digest": text_digest(text),
+        "simhash": value,
+    }
+
+
+# Stored fingerprints with the same chunk_hash as a new one, or sharing a band with it
+# and within NEAR_DUPLICATE_MAX_DISTANCE bits. Each band is its own index lookup.
+_CANDIDATES = text(
+    """
+    WITH new AS (
+        SELECT * FROM unnest(
+            CAST(:hashes AS varchar[]), CAST(:sizes AS integer[]), CAST(:simhashes AS bigint[]),
+            CAST(:band0 AS integer[]), CAST(:band1 AS integer[]),
+            CAST(:band2 AS integer[]), CAST(:band3 AS integer[])
+        ) AS n(chunk_hash, chunk_size, simhash, band0, band1, band2, band3)
+    ), candidates AS (
+        SELECT f.* FROM new n JOIN chunk_fingerprints f ON f.chunk_hash = n.chunk_hash
+    """
+    + "".join(
+        f"""
+        UNION
+        SELECT f.* FROM new n JOIN chunk_fingerprints f
+            ON f.band{i} = n.band{i} AND f.chunk_size = n.chunk_size
+            AND bit_count(CAST(f.simhash # n.simhash AS bit(64))) <= :max_distance
+        """
+        for i in range(BANDS)
+    )
+    + """
+    )
+    SELECT chunk_hash, chunk_size, text_digest, simhash, dup_group, filename
+    FROM candidates
+    WHERE filename <> :previous
+    ORDER BY created_at
+    """
+)
+
+
+def _known(fingerprints: List[dict], previous: Optional[str] = None) -> list:
+    """
+    Stored fingerprints equal to, or within NEAR_DUPLICATE_MAX_DISTANCE bits of, any
+    of `fingerprints`, oldest first. Those of `previous` are left out.
+    """
+    bands = [_bands(fp["simhash"]) if fp["simhash"] is not None else (None,) * BANDS for fp in fingerprints]
+    params = {
+        "hashes": [fp["chunk_hash"] for fp in fingerprints],
+        "sizes": [fp["chunk_size"] for fp in fingerprints],
+        "simhashes": [_signed(fp["simhash"]) if fp["simhash"] is not None else None for fp in fingerprints],
+        **{f"band{i}": [row[i] for row in bands] for i in range(BANDS)},
+        "max_distance": NEAR_DUPLICATE_MAX_DISTANCE,
+        "previous": previous or "",
+    }
+    db = SessionLocal()
+    try:
+        return list(db.execute(_CANDIDATES, params))
+    finally:
+        db.close()
+
+
+def _match(fp: dict, exact: Dict[str, dict], banded: Dict[Tuple[int, int], List[dict]]) -> Optional[dict]:
+    if fp["chunk_hash"] in exact:
+        return exact[fp["chunk_hash"]]
+    if fp["simhash"] is None:
+        return None
+    best, best_distance = None, NEAR_DUPLICATE_MAX_DISTANCE + 1
+    for i, band in enumerate(_bands(fp["simhash"])):
+        for other in banded.get((i, band), ()):
+            if other["chunk_size"] != fp["chunk_size"] or other["simhash"] is None:
+                continue
+            distance = _distance(fp["simhash"], other["simhash"])
+            if distance < best_distance:
+                best, best_distance = other, distance
+    return best
+
+
+def mark_duplicates(filename: str, chunks: List[dict], previous: Optional[str] = None) -> Dict[str, int]:
+    """
+    Finds chunks that repeat (or nearly repeat, by SimHash) a chunk already in the
+    corpus or earlier in `chunks`. Each chunk gets `dup_group`, the chunk_hash of the
+    first chunk of its group, which the search collapses on. Exact repeats without an
+    embedding take the vector of that first chunk from the embedding cache, so they
+    are not sent to the embedding model; near repeats differ in some word (an amount,
+    a date) and are embedded themselves. Fingerprints of `previous`, the version this
+    upload replaces, are ignored. New fingerprints are recorded for later uploads.
+    """
+    if not NEAR_DUPLICATE_DETECTION or not chunks:
+        return {"duplicates": 0, "reused": 0}
+
+    fingerprints = [_fingerprint(chunk) for chunk in chunks]
+    try:
+        stored = _known(fingerprints, previous)
+    except Exception as exc:
+        logger.warning("Could not read chunk fingerprints; skipping duplicate detection: %s", exc)
+        return {"duplicates": 0, "reused": 0}
+
+    exact: Dict[str, dict] = {}
+    banded: Dict[Tuple[int, int], List[dict]] = {}
+
+    def remember(entry: dict) -> None:
+        exact.setdefault(entry["chunk_hash"], entry)
+        if entry["simhash"] is not None:
+            for i, band in enumerate(_bands(entry["simhash"])):
+                banded.setdefault((i, band), []).append(entry)
+
+    for row in stored:
+        remember({
+            "chunk_hash": row.chunk_hash,
+            "chunk_size": row.chunk_size,
+            "text_digest": row.text_digest,
+            "simhash": row.simhash & 0xFFFFFFFFFFFFFFFF if row.simhash is not None else None,
+            "dup_group": row.dup_group,
+            "filename": row.filename,
+            "stored": True,
+        })
+
+    new_rows, canonical_digests = [], {}
+    duplicates = 0
+    for chunk, fp in zip(chunks, fingerprints):
+        match = _match(fp, exact, banded)
+        # A re-ingested document finds its own fingerprints; those are not duplicates.
+        own = (
+            match is not None
+            and match.get("stored")
+            and match["chunk_hash"] == fp["chunk_hash"]
+            and match["filename"] == filename
+        )
+        fp["dup_group"] = match["dup_group"] if match else fp["chunk_hash"]
+        fp["filename"] = filename
+        chunk["dup_group"] = fp["dup_group"]
+        if match and not own:
+            duplicates += 1
+            if chunk.get("embedding") is None and match["text_digest"] == fp["text_digest"]:
+                canonical_digests[id(chunk)] = match["text_digest"]
+        if fp["chunk_hash"] not in exact:
+            remember(fp)
+            value = fp["simhash"]
+            bands = _bands(value) if value is not None else (None,) * BANDS
+            new_rows.append({
+                "chunk_hash": fp["chunk_hash"],
+                "simhash": _signed(value) if value is not None else None,
+                **{f"band{i}": band for i, band in enumerate(bands)},
+                "chunk_size": fp["chunk_size"],
+                "text_digest": fp["text_digest"],
+                "dup_group": fp["dup_group"],
+                "filename": filename,
+                "chunk_index": int(chunk["chunk_index"]),
+            })
+
+    reused = 0
+    cache = get_embedding_cache() if canonical_digests else None
+    if cache is not None:
+        keys = {ref: digest_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, d) for ref, d in canonical_digests.items()}
+        cached = cache.get_many(list(set(keys.values())))
+        for chunk in chunks:
+            vector = cached.get(keys.get(id(chunk)))
+            if vector is not None:
+                chunk["embedding"] = vector
+                reused += 1
+
+    if new_rows:
+        db = SessionLocal()
+        try:
+            stmt = pg_insert(ChunkFingerprintORM.__table__).values(new_rows)
+            db.execute(stmt.on_conflict_do_nothing(index_elements=["chunk_hash"]))
+            db.commit()
+        except Exception as exc:
+            logger.warning("Could not record chunk fingerprints of %s: %s", filename, exc)
+        finally:
+            db.close()
+
+    logger.info(
+        "Duplicate detection for %s: %s of %s chunks repeat the corpus, %s vectors reused",
+        filename, duplicates, len(chunks), reused,
+    )
+    return {"duplicates": duplicates, "reused": reused}
@@ -1,24 +1,34 @@
 import logging
 import os
-from typing import Callable, List
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterator, List, Optional
 
 import tiktoken
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
 
-from app.models import TextChunkEmbedding
+from app.models import EmbeddedChunkBatch
+from app.utils.embedding_cache import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    embedding_dimensions,
+    get_cached_embeddings,
+)
+from app.utils.openai_scheduler import Priority
 
 
-MODEL = "text-embedding-3-small"
+MODEL = EMBEDDING_MODEL
 TARGET_BATCH_TOKENS = 250_000
+# Concurrent embedding requests, and finished batches that may wait for the ES writer.
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_WRITE_QUEUE_SIZE = int(os.getenv("EMBED_WRITE_QUEUE_SIZE", "2"))
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
-embedding_model = OpenAIEmbeddings(
-    model=MODEL,
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-)
+embedding_model = get_cached_embeddings(MODEL, EMBEDDING_DIMENSIONS, priority=Priority.BULK)
 
 # Initialize tokenizer for the embedding model
 encoding = tiktoken.encoding_for_model(MODEL)
@@ -28,19 +38,18 @@ def estimate_tokens(text: str) -> int:
     return len(encoding.encode(text))
 
 
-def embed_chunks_streaming(
-    chunks: List[dict],
-    save_fn: Callable[[List[TextChunkEmbedding]], None],
-) -> None:
-    logger.info("Embedding %s chunks in token-capped batches", len(chunks))
-
+def _token_capped_batches(chunks: List[dict]) -> Iterator[List[dict]]:
     current_batch: List[dict] = []
     current_tokens = 0
 
     for chunk in chunks:
-        chunk_tokens = estimate_tokens(chunk["text"])
-        if current_tokens + chunk_tokens > TARGET_BATCH_TOKENS:
-            _process_batch(current_batch, save_fn)
+        # The chunker records token counts; only chunks from elsewhere are encoded here.
+        # Chunks that already carry a vector cost nothing.
+        chunk_tokens = 0 if chunk.get("embedding") is not None else chunk.get("token_count")
+        if chunk_tokens is None:
+            chunk_tokens = estimate_tokens(chunk["text"])
+        if current_batch and current_tokens + chunk_tokens > TARGET_BATCH_TOKENS:
+            yield current_batch
             current_batch = []
             current_tokens = 0
 
@@ -48,52 +57,92 @@ def embed_chunks_streaming(
         current_tokens += chunk_tokens
 
     if current_batch:
-        _process_batch(current_batch, save_fn)
+        yield current_batch
+
 
+def embed_chunks_streaming(
+    chunks: List[dict],
+    save_fn: Callable[[EmbeddedChunkBatch], None],
+    progress: Optional[Callable[[int, int], None]] = None,
+    *,
+    max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+    write_queue_size: int = EMBED_WRITE_QUEUE_SIZE,
+) -> None:
+    """
+    Embeds token-capped batches with up to `max_in_flight` concurrent requests while a
+    writer thread saves finished batches (in order) through `save_fn`.
+    At most `max_in_flight + write_queue_size + 1` batches are held in memory; when the
+    writer falls behind, embedding waits for it.
+    `progress(done, total)` is called after each saved batch.
+    """
+    logger.info("Embedding %s chunks in token-capped batches", len(chunks))
+    total = len(chunks)
+    write_queue: "queue.Queue[Optional[EmbeddedChunkBatch]]" = queue.Queue(
+        maxsize=max(1, write_queue_size)
+    )
+    writer_errors: List[BaseException] = []
+
+    def _writer() -> None:
+        done = 0
+        while True:
+            results = write_queue.get()
+            if results is None:
+                return
+            if writer_errors:
+                continue  # keep draining so the producer never blocks on a dead writer
+            try:
+                save_fn(results)
+                done += len(results)
+                logger.info("Saved %s embedded chunks", len(results))
+                if progress is not None:
+                    progress(done, total)
+            except BaseException as exc:
+                logger.exception("Failed to save embedded batch: %s", exc)
+                writer_errors.append(exc)
+
+    writer = threading.Thread(target=_writer, name="embedding-writer", daemon=True)
+    writer.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="embed") as pool:
+            in_flight: Deque[Future] = deque()
+            try:
+                for batch in _token_capped_batches(chunks):
+                    if writer_errors:
+                        break
+                    in_flight.append(pool.submit(_embed_batch, batch))
+                    while len(in_flight) >= max_in_flight:
+                        write_queue.put(in_flight.popleft().result())
+                while in_flight and not writer_errors:
+                    write_queue.put(in_flight.popleft().result())
+            finally:
+                for future in in_flight:
+                    future.cancel()
+    finally:
+        write_queue.put(None)
+        writer.join()
+
+    if writer_errors:
+        raise writer_errors[0]
     logger.info("All chunks embedded and saved")
 
 
-def _process_batch(batch: List[dict], save_fn) -> None:
-    if not batch:
-        return
-    logger.info("Embedding batch of %s chunks", len(batch))
-    texts = [c["text"] for c in batch]
+def _embed_batch(batch: List[dict]) -> EmbeddedChunkBatch:
+    # Chunks carried over from a previous document version keep their vector.
+    missing = [c for c in batch if c.get("embedding") is None]
+    logger.info("Embedding batch of %s chunks (%s carried over)", len(missing), len(batch) - len(missing))
 
     try:
-        vectors = embedding_model.embed_documents(texts)
+        fresh = iter(embedding_model.embed_documents([c["text"] for c in missing]) if missing else [])
     except Exception as e:
         logger.exception("Failed to embed batch: %s", e)
         raise
-
-    results: List[TextChunkEmbedding] = []
-    for chunk, vector in zip(batch, vectors):
-        results.append(
-            TextChunkEmbedding(
-                chunk_size=chunk["chunk_size"],
-                chunk_index=chunk["chunk_index"],
-                text=chunk["text"],
-                pages=chunk["pages"],
-                embedding=vector,
-            )
-        )
-
-    save_fn(results)
-    logger.info("Saved %s embedded chunks", len(results))
+    vectors = [c["embedding"] if c.get("embedding") is not None else next(fresh) for c in batch]
+    return EmbeddedChunkBatch.from_chunks(batch, vectors, embedding_dimensions())
 
 
-def embed_chunks(chunks: List[dict]) -> List[TextChunkEmbedding]:
+def embed_chunks(chunks: List[dict]) -> EmbeddedChunkBatch:
     texts = [chunk["text"] for chunk in chunks]
     vectors = embedding_model.embed_documents(texts)
 
-    results: List[TextChunkEmbedding] = []
-    for chunk, vector in zip(chunks, vectors):
-        results.append(
-            TextChunkEmbedding(
-                chunk_size=chunk["chunk_size"],
-                chunk_index=chunk["chunk_index"],
-                text=chunk["text"],
-                pages=chunk["pages"],
-                embedding=vector,
-            )
-        )
-    return results
+    return EmbeddedChunkBatch.from_chunks(chunks, vectors, embedding_dimensions())
@@ -1,12 +1,96 @@
+import base64
+import hashlib
 import logging
-from typing import Iterable, Optional, List
-from elasticsearch import Elasticsearch, helpers
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-es = Elasticsearch("http://elasticsearch:9200")
+import numpy as np
+import orjson
+from elasticsearch import ApiError, Elasticsearch, helpers
+from elasticsearch.serializer import JsonSerializer, NdjsonSerializer
+
+from app.models import EmbeddedChunkBatch
+from app.utils.embedding_cache import EMBEDDING_MODEL, embedding_dimensions
+from app.utils.language_profiles import LANGUAGE_NAMES
+
+
+
+class OrjsonSerializer(JsonSerializer):
+    """
+    JSON through orjson. numpy arrays (the float32 rows of an EmbeddedChunkBatch)
+    are written natively instead of float by float; anything orjson rejects, such as
+    lone surrogates in extracted text, goes through the stock serializer.
+    """
+
+    def default(self, data):
+        # The stock numpy handling refers to aliases numpy 2 removed; convert here first.
+        if isinstance(data, (np.ndarray, np.generic)):
+            return data.tolist()
+        return super().default(data)
+
+    def json_dumps(self, data) -> bytes:
+        try:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY)
+        except orjson.JSONEncodeError:
+            return super().json_dumps(data)
+
+    def json_loads(self, data: bytes):
+        return orjson.loads(data)
+
+
+class OrjsonNdjsonSerializer(OrjsonSerializer, NdjsonSerializer):
+    mimetype = NdjsonSerializer.mimetype
+
+
+# Bulk helpers serialize each action with the application/json serializer.
+es = Elasticsearch(
+    "http://elasticsearch:9200",
+    serializers={
+        OrjsonSerializer.mimetype: OrjsonSerializer(),
+        OrjsonNdjsonSerializer.mimetype: OrjsonNdjsonSerializer(),
+    },
+)
 logger = logging.getLogger(__name__)
 
 PDF_CHUNKS = "pdf_chunks"
 CAPTIONS = "captions"
+PDF_DOCUMENTS = "pdf_documents"
+
+# pdf_chunks and captions are aliases over versioned indices ({name}_v{N}). While a
+# generation is rebuilt it is reachable as {name}_next and ingestion writes to both.
+VERSIONED_INDICES = (PDF_CHUNKS, CAPTIONS)
+# How long a worker trusts its view of the aliases before looking again.
+ALIAS_CACHE_SECONDS = 30
+
+# Layout of newly created chunk/caption indices. "compact" leaves the vector out of
+# _source, stores chunk attributes once under `metadata` (the top-level names become
+# field aliases), keeps document-level attributes in pdf_documents and uses short ids.
+# Existing indices keep the layout they were created with.
+ES_DOC_LAYOUT = os.getenv("ES_DOC_LAYOUT", "full")
+
+# Bulk requests are cut by size rather than action count; vectors make actions large.
+ES_BULK_MAX_BYTES = int(os.getenv("ES_BULK_MAX_BYTES", str(10 * 1024 * 1024)))
+ES_BULK_THREADS = int(os.getenv("ES_BULK_THREADS", "4"))
+# Relax refresh and replicas on the target indices while a document is ingested.
+ES_INGEST_MODE = os.getenv("ES_INGEST_MODE", "false").lower() == "true"
+
+# HNSW quantization of the vector field: int8_hnsw, int4_hnsw, bbq_hnsw (dims >= 64) or hnsw.
+# ES keeps the float vectors alongside, which queries rescore against (rescore_vector).
+ES_VECTOR_INDEX_TYPE = os.getenv("ES_VECTOR_INDEX_TYPE", "int8_hnsw")
+
+VECTOR_FIELD = {
+    "type": "dense_vector",
+    "dims": embedding_dimensions(),
+    "index": True,
+    "similarity": "cosine",
+    "index_options": {"type": ES_VECTOR_INDEX_TYPE, "m": 16, "ef_construction": 100},
+}
 
 PDF_CHUNKS_MAPPING = {
     "properties": {
@@ -20,15 +104,17 @@ PDF_CHUNKS_MAPPING = {
         "chunk_size": {"type": "integer"},
         "chunk_index": {"type": "integer"},
         "pages": {"type": "integer"},
+        "chunk_hash": {"type": "keyword"},
+        "dup_group": {"type": "keyword"},
+        "start_offset": {"type": "integer", "index": False},
+        "end_offset": {"type": "integer", "index": False},
+        "section_index": {"type": "integer"},
+        "prev_id": {"type": "keyword", "index": False},
+        "next_id": {"type": "keyword", "index": False},
+        "embedding": {"type": "keyword"},
         "text": {"type": "text"},
         "metadata": {"type": "object"},
-        "vector": {
-            "type": "dense_vector",
-            "dims": 1536,
-            "index": True,
-            "similarity": "cosine",
-            "index_options": {"type": "int8_hnsw", "m": 16, "ef_construction": 100},
-        },
+        "vector": VECTOR_FIELD,
     }
 }
 
@@ -43,35 +129,219 @@ CAPTIONS_MAPPING = {
         "section_patterns": {"type": "keyword"},
         "page_number": {"type": "integer"},
         "xref": {"type": "integer"},
+        "embedding": {"type": "keyword"},
         "text": {"type": "text"},
         "metadata": {"type": "object"},
-        "vector": {
-            "type": "dense_vector",
-            "dims": 1536,
-            "index": True,
-            "similarity": "cosine",
-            "index_options": {"type": "int8_hnsw", "m": 16, "ef_construction": 100},
-        },
+        "vector": VECTOR_FIELD,
+    }
+}
+
+# Per-document record: the attributes every chunk of a document shares.
+PDF_DOCUMENTS_MAPPING = {
+    "properties": {
+        "filename": {"type": "keyword"},
+        "book_id": {"type": "keyword"},
+        "source_pdf": {"type": "keyword"},
+        "language": {"type": "keyword"},
+        "language_name": {"type": "keyword"},
+        "section_patterns": {"type": "keyword"},
+        "layout": {"type": "keyword"},
+        "chunks": {"type": "integer"},
+        "captions": {"type": "integer"},
+        "indexed_at": {"type": "date"},
     }
 }
 
+CHUNK_METADATA_FIELDS = (
+    "id", "filename", "source_pdf", "language", "chunk_size", "chunk_index", "pages", "chunk_hash", "dup_group",
+    "start_offset", "end_offset", "section_index", "prev_id", "next_id", "embedding",
+)
+CAPTION_METADATA_FIELDS = ("id", "source_pdf", "filename", "page_number", "xref", "embedding")
+
+
+def _compact_mapping(mapping: dict, metadata_fields: Tuple[str, ...]) -> dict:
+    properties = mapping["properties"]
+    return {
+        "_meta": {"layout": "compact"},
+        "_source": {"excludes": ["vector"]},
+        "properties": {
+            "text": properties["text"],
+            "vector": properties["vector"],
+            "metadata": {"properties": {name: properties[name] for name in metadata_fields}},
+            # Keeps term queries and sorts on the top-level names working.
+            **{name: {"type": "alias", "path": f"metadata.{name}"} for name in metadata_fields},
+        },
+    }
+
+
+PDF_CHUNKS_COMPACT_MAPPING = _compact_mapping(PDF_CHUNKS_MAPPING, CHUNK_METADATA_FIELDS)
+CAPTIONS_COMPACT_MAPPING = _compact_mapping(CAPTIONS_MAPPING, CAPTION_METADATA_FIELDS)
+
+
+def embedding_version() -> str:
+    """Model and size of the vectors this process produces, e.g. text-embedding-3-small@512."""
+    return f"{EMBEDDING_MODEL}@{embedding_dimensions()}"
+
+
 def _mapping_for(index: str) -> dict:
-    return PDF_CHUNKS_MAPPING if index == PDF_CHUNKS else CAPTIONS_MAPPING
+    if index == PDF_DOCUMENTS:
+        return PDF_DOCUMENTS_MAPPING
+    compact = ES_DOC_LAYOUT == "compact"
+    if index == PDF_CHUNKS:
+        mapping = PDF_CHUNKS_COMPACT_MAPPING if compact else PDF_CHUNKS_MAPPING
+    else:
+        mapping = CAPTIONS_COMPACT_MAPPING if compact else CAPTIONS_MAPPING
+    # A generation only ever holds vectors of the embedding it was created for.
+    meta = {"layout": "full", **mapping.get("_meta", {}), "embedding": embedding_version()}
+    return {**mapping, "_meta": meta}
+
+
+# --- Indices and generations ---
+
+_ensured_indices = set()
+_index_info: Dict[str, dict] = {}
+_targets: Dict[str, Tuple[float, str, Optional[str]]] = {}
+_ensure_lock = threading.Lock()
+
+
+def generation_name(logical: str, version: int) -> str:
+    return f"{logical}_v{version}"
+
+
+def next_alias(logical: str) -> str:
+    return f"{logical}_next"
+
+
+def generations(logical: str) -> List[Tuple[int, str]]:
+    """(version, index) of every generation of `logical`, oldest first."""
+    pattern = re.compile(rf"^{re.escape(logical)}_v(\d+)$")
+    names = es.indices.get(index=f"{logical}_v*", allow_no_indices=True, ignore_unavailable=True)
+    found = [(int(m.group(1)), name) for name in names for m in [pattern.match(name)] if m]
+    return sorted(found)
+
+
+def alias_target(alias: str) -> Optional[str]:
+    """The write index behind `alias`, or None if there is no such alias."""
+    if not es.indices.exists_alias(name=alias):
+        return None
+    members = es.indices.get_alias(name=alias)
+    if len(members) == 1:
+        return next(iter(members))
+    for name, body in members.items():
+        if body["aliases"][alias].get("is_write_index"):
+            return name
+    return None
+
+
+def create_index(name: str, mapping: dict, **kwargs) -> None:
+    try:
+        es.indices.create(index=name, mappings=mapping, **kwargs)
+    except ApiError as exc:
+        # Another worker won the race.
+        if exc.error != "resource_already_exists_exception":
+            raise
+
+
+def resolve_index(logical: str, *, refresh: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    The concrete write index behind `logical` and the generation being rebuilt, if any.
+    Creates the first generation and its alias on an empty cluster. An index that
+    predates aliases keeps serving under its own name until the first rebuild.
+    """
+    cached = _targets.get(logical)
+    if cached and not refresh and time.monotonic() - cached[0] < ALIAS_CACHE_SECONDS:
+        return cached[1], cached[2]
+    with _ensure_lock:
+        current = alias_target(logical)
+        if current is None:
+            if es.indices.exists(index=logical):
+                current = logical
+            else:
+                current = generation_name(logical, 1)
+                create_index(current, _mapping_for(logical), aliases={logical: {"is_write_index": True}})
+                logger.info("Created %s behind alias %s", current, logical)
+        pending = alias_target(next_alias(logical))
+        _targets[logical] = (time.monotonic(), current, pending)
+        return current, pending
+
+
+def describe_index(name: str) -> dict:
+    """Layout, vector dims and embedding version of a concrete index (read once; they never change)."""
+    if name in _index_info:
+        return _index_info[name]
+    current = es.indices.get_mapping(index=name)
+    mapping = next(iter(current.values()))["mappings"]
+    meta = mapping.get("_meta", {})
+    info = {"layout": meta.get("layout", "full")}
+    if "vector" in mapping.get("properties", {}):
+        info["dims"] = _vector_dims_from_mapping(mapping)
+        # Indices from before versioning were all filled by text-embedding-3-small.
+        info["embedding"] = meta.get("embedding") or f"text-embedding-3-small@{info['dims']}"
+        if info["embedding"] != embedding_version():
+            logger.error(
+                "Index %s holds %s vectors but this worker embeds with %s; rebuild the index",
+                name, info["embedding"], embedding_version(),
+            )
+    _index_info[name] = info
+    return info
+
 
 def ensure_index(name: str, mapping: dict):
-    if not es.indices.exists(index=name):
-        es.indices.create(index=name, mappings=mapping)
+    # Checked once per process; indices are never dropped while the worker runs.
+    # Versioned names resolve through their alias instead.
+    if name in VERSIONED_INDICES:
+        resolve_index(name)
+        return
+    if name in _ensured_indices:
+        return
+    with _ensure_lock:
+        if name in _ensured_indices:
+            return
+        if not es.indices.exists(index=name):
+            create_index(name, mapping)
+        _ensured_indices.add(name)
+
+
+def _concrete(index: str) -> str:
+    return resolve_index(index)[0] if index in VERSIONED_INDICES else index
+
+
+def index_layout(index: str) -> str:
+    """"full" or "compact", as recorded in the mapping of the current write index."""
+    return describe_index(_concrete(index))["layout"]
+
+
+def index_dims(index: str) -> int:
+    """Vector dimensions of the current write index, which may predate EMBEDDING_DIMENSIONS."""
+    return describe_index(_concrete(index))["dims"]
+
+
+def write_targets(logical: str) -> List[str]:
+    """
+    Concrete indices a new vector document for `logical` goes to: the live generation
+    and the one being rebuilt, skipping any filled with a different embedding.
+    """
+    current, pending = resolve_index(logical)
+    targets = [name for name in (current, pending) if name]
+    return [name for name in targets if describe_index(name)["embedding"] == embedding_version()]
+
 
 def ensure_all_indices():
-    ensure_index(PDF_CHUNKS, PDF_CHUNKS_MAPPING)
-    ensure_index(CAPTIONS, CAPTIONS_MAPPING)
+    for index in (PDF_CHUNKS, CAPTIONS, PDF_DOCUMENTS):
+        ensure_index(index, _mapping_for(index))
+    for index in VERSIONED_INDICES:
+        for name in resolve_index(index):
+            if name:
+                describe_index(name)
+
 
 def _vector_dims_from_mapping(mapping: dict) -> int:
     try:
         return int(mapping["properties"]["vector"]["dims"])
     except Exception:
-        logger.warning("Couldn't read dims from mapping; defaulting to 1536")
-        return 1536
+        logger.warning("Couldn't read dims from mapping; defaulting to %s", embedding_dimensions())
+        return embedding_dimensions()
+
 
 def _coerce_pages(pages) -> List[int]:
     if pages is None:
@@ -83,9 +353,281 @@ def _coerce_pages(pages) -> List[int]:
     except Exception:
         return []
 
+
+def short_key(name: str) -> str:
+    """12-character url-safe key of a filename, used in compact ids."""
+    return base64.urlsafe_b64encode(hashlib.blake2b(name.encode("utf-8"), digest_size=9).digest()).decode()
+
+
+def _chunk_id(filename: str, size, position, compact: bool) -> str:
+    if compact:
+        return f"{short_key(filename)}-{size}-{position}"
+    return f"{filename}_{size}_{position}"
+
+
+def _caption_id(book_id, source_pdf: str, page_number, xref, compact: bool) -> str:
+    if compact:
+        return f"{short_key(source_pdf)}-{page_number}-{xref}"
+    return f"{book_id}_{page_number}_{xref}"
+
+
+def chunk_hash(chunk_size, text: str) -> str:
+    """Content hash of a chunk; equal hashes across document versions share a vector."""
+    return hashlib.sha256(f"{chunk_size}:{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_doc_id(filename: str, chunk, index: str = PDF_CHUNKS) -> str:
+    """
+    Stable ES id of a chunk: {filename}_{chunk_size}_{chunk_index}, or
+    {short_key(filename)}-{chunk_size}-{chunk_index} in a compact index.
+    """
+    if isinstance(chunk, dict):
+        size, position = chunk.get("chunk_size", "NA"), chunk.get("chunk_index", "NA")
+    else:
+        size, position = getattr(chunk, "chunk_size", "NA"), getattr(chunk, "chunk_index", "NA")
+    return _chunk_id(filename, size, position, index_layout(index) == "compact")
+
+
+def caption_doc_id(record, index: str = CAPTIONS) -> str:
+    """Stable ES id of a caption: {book_id}_{page_number}_{xref}, shortened in a compact index."""
+    compact = index_layout(index) == "compact"
+    return _caption_id(record.book_id, record.source_pdf, record.page_number, record.xref, compact)
+
+
+# --- Documents ---
+
+def chunk_action(index: str, text: str, vec: Sequence[float], fields: dict, *, op_type: str = "index") -> dict:
+    """
+    Bulk action for one chunk in the layout of the concrete `index`. `fields` holds
+    filename, chunk_size, chunk_index, pages, language, optionally dup_group, start,
+    end, section_index, prev_index and next_index, and the document-level book_id,
+    source_pdf, language_name and section_patterns. Neighbour indices become the ids
+    of those chunks in this index's layout.
+    """
+    compact = describe_index(index)["layout"] == "compact"
+    doc_id = _chunk_id(fields["filename"], fields["chunk_size"], fields["chunk_index"], compact)
+    metadata = {
+        "id": doc_id,
+        "filename": fields["filename"],
+        "language": fields.get("language"),
+        "chunk_size": int(fields["chunk_size"]),
+        "chunk_index": int(fields["chunk_index"]),
+        "pages": _coerce_pages(fields.get("pages")),
+        "chunk_hash": chunk_hash(fields["chunk_size"], text),
+        "embedding": embedding_version(),
+    }
+    # Only near-duplicates carry a group; search collapses on dup_group, else chunk_hash.
+    if fields.get("dup_group") and fields["dup_group"] != metadata["chunk_hash"]:
+        metadata["dup_group"] = fields["dup_group"]
+    for name, key in (("start", "start_offset"), ("end", "end_offset"), ("section_index", "section_index")):
+        if fields.get(name) is not None:
+            metadata[key] = int(fields[name])
+    for name, key in (("prev_index", "prev_id"), ("next_index", "next_id")):
+        if fields.get(name) is not None:
+            metadata[key] = _chunk_id(fields["filename"], fields["chunk_size"], fields[name], compact)
+    source_pdf = fields.get("source_pdf") or fields["filename"]
+    if compact:
+        if source_pdf != fields["filename"]:
+            metadata["source_pdf"] = source_pdf
+        source = {"text": text, "metadata": metadata, "vector": vec}
+    else:
+        metadata.update(
+            book_id=fields.get("book_id"),
+            source_pdf=source_pdf,
+            language_name=fields.get("language_name"),
+            section_patterns=fields.get("section_patterns"),
+        )
+        source = {**metadata, "text": text, "metadata": metadata, "vector": vec}
+    # "index" overwrites on retry; "create" leaves an existing document alone.
+    return {"_op_type": op_type, "_index": index, "_id": doc_id, "_source": source}
+
+
+def caption_action(index: str, text: str, vec: List[float], fields: dict, *, op_type: str = "index") -> dict:
+    """Bulk action for one caption; `fields` as for chunk_action with page_number and xref."""
+    compact = describe_index(index)["layout"] == "compact"
+    doc_id = _caption_id(fields.get("book_id"), fields["source_pdf"], fields["page_number"], fields["xref"], compact)
+    metadata = {
+        "id": doc_id,
+        "source_pdf": fields["source_pdf"],
+        "filename": fields.get("filename"),
+        "page_number": fields["page_number"],
+        "xref": fields["xref"],
+        "embedding": embedding_version(),
+    }
+    if compact:
+        source = {"text": text, "metadata": metadata, "vector": vec}
+    else:
+        metadata.update(
+            book_id=fields.get("book_id"),
+            language=fields.get("language"),
+            language_name=fields.get("language_name"),
+            section_patterns=fields.get("section_patterns"),
+        )
+        source = {**metadata, "text": text, "metadata": metadata, "vector": vec}
+    return {"_op_type": op_type, "_index": index, "_id": doc_id, "_source": source}
+
+
+# --- Bulk writing ---
+
+_ingest_lock = threading.Lock()
+_ingest_users: Counter = Counter()
+_ingest_saved: Dict[str, dict] = {}
+
+INGEST_SETTINGS = {"index.refresh_interval": "-1", "index.number_of_replicas": "0"}
+# Key in the index _meta holding the settings ingest mode replaced, until they are restored.
+INGEST_SAVED_META = "ingest_saved"
+
+
+def _index_meta(index: str) -> dict:
+    response = es.indices.get_mapping(index=index)
+    return next(iter(response.values()))["mappings"].get("_meta", {}) or {}
+
+
+def restorable_settings(index: str) -> dict:
+    """
+    The refresh_interval and number_of_replicas `index` should have outside ingest
+    mode. Values still at the ingest-mode ones (a worker died before restoring them)
+    come from the copy saved in the index _meta, else reset to the cluster default.
+    """
+    response = es.indices.get_settings(index=index, flat_settings=True)
+    current = next(iter(response.values()))["settings"]
+    saved = None
+    settings = {}
+    for name, relaxed in INGEST_SETTINGS.items():
+        value = current.get(name)
+        if value is not None and str(value) == relaxed:
+            if saved is None:
+                saved = _index_meta(index).get(INGEST_SAVED_META) or {}
+            value = saved.get(name)
+            logger.warning("%s still has %s=%s from ingest mode; restoring %s", index, name, relaxed, value)
+        settings[name] = value
+    return settings
+
+
+@contextmanager
+def ingest_mode(*indices: str, enabled: Optional[bool] = None):
+    """
+    While active, sets refresh_interval=-1 and number_of_replicas=0 on `indices`
+    and restores the previous values (then refreshes) when the last user in
+    this process leaves. Off unless ES_INGEST_MODE or `enabled` is set.
+    The previous values are also kept in the index _meta, so a run after a crash
+    restores them rather than the ingest-mode ones.
+    Replicas sharing an index should enable it on one ingest worker only.
+    """
+    enabled = ES_INGEST_MODE if enabled is None else enabled
+    if not enabled:
+        yield
+        return
+
+    entered = []
+    try:
+        for index in indices:
+            with _ingest_lock:
+                if _ingest_users[index] == 0:
+                    ensure_index(index, _mapping_for(index))
+                    saved = restorable_settings(index)
+                    _ingest_saved[index] = saved
+                    es.indices.put_mapping(index=index, meta={**_index_meta(index), INGEST_SAVED_META: saved})
+                    es.indices.put_settings(
+                        index=index,
+                        settings={"index.refresh_interval": "-1", "index.number_of_replicas": 0},
+                    )
+                    logger.info("Ingest mode on for %s", index)
+                _ingest_users[index] += 1
+            entered.append(index)
+        yield
+    finally:
+        for index in entered:
+            with _ingest_lock:
+                _ingest_users[index] -= 1
+                if _ingest_users[index] > 0:
+                    continue
+                saved = _ingest_saved.pop(index, {})
+                try:
+                    # None resets a setting that was not set explicitly.
+                    es.indices.put_settings(index=index, settings=saved)
+                    meta = _index_meta(index)
+                    meta.pop(INGEST_SAVED_META, None)
+                    es.indices.put_mapping(index=index, meta=meta)
+                    es.indices.refresh(index=index)
+                    logger.info("Ingest mode off for %s", index)
+                except Exception as exc:
+                    logger.error("Could not restore settings of %s: %s", index, exc)
+
+
+def bulk_index(
+    actions: Iterable[dict],
+    *,
+    document_of: Callable[[dict], str],
+    thread_count: int = ES_BULK_THREADS,
+    max_chunk_bytes: int = ES_BULK_MAX_BYTES,
+    request_timeout: int = 60,
+    ignore_status: Tuple[int, ...] = (),
+) -> dict:
+    """
+    Indexes `actions` with parallel_bulk in size-bounded requests and returns
+    {"items", "success", "fail", "errors_by_document", "errors"}, where
+    `document_of(action)` names the source document each failure is counted under.
+    Items answered with a status in `ignore_status` count as successes.
+    """
+    owners: Dict[str, str] = {}
+    total = 0
+
+    def _tracked() -> Iterator[dict]:
+        nonlocal total
+        for action in actions:
+            total += 1
+            owners[action["_id"]] = document_of(action)
+            yield action
+
+    successes = 0
+    errors_by_document: Counter = Counter()
+    errors: List[dict] = []
+    client = es.options(request_timeout=request_timeout)
+    for ok, info in helpers.parallel_bulk(
+        client,
+        _tracked(),
+        thread_count=max(1, thread_count),
+        chunk_size=10_000,  # bounded by max_chunk_bytes in practice
+        max_chunk_bytes=max_chunk_bytes,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        item = next(iter(info.values()), {}) if isinstance(info, dict) else {}
+        if ok or item.get("status") in ignore_status:
+            successes += 1
+            continue
+        errors_by_document[owners.get(item.get("_id"), "unknown")] += 1
+        if len(errors) < 20:
+            errors.append(item)
+
+    failures = sum(errors_by_document.values())
+    if failures:
+        logger.error("Bulk indexing: %s of %s actions failed: %s", failures, total, dict(errors_by_document))
+    return {
+        "items": total,
+        "success": successes,
+        "fail": failures,
+        "errors_by_document": dict(errors_by_document),
+        "errors": errors,
+    }
+
+
+def _valid_vector(vec, expected_dims: int, what: str) -> bool:
+    if isinstance(vec, list) and len(vec) == expected_dims:
+        return True
+    logger.error(
+        "Skipping %s: bad vector dims (got %s, expected %s)",
+        what,
+        None if vec is None else len(vec),
+        expected_dims,
+    )
+    return False
+
+
 def save_chunks_to_es(
     filename: str,
-    chunks: Iterable,
+    chunks: EmbeddedChunkBatch,
     *,
     book_id: Optional[str] = None,
     source_pdf: Optional[str] = None,
@@ -93,91 +635,172 @@ def save_chunks_to_es(
     language_name: Optional[str] = None,
     section_patterns: Optional[List[str]] = None,
     index: str = PDF_CHUNKS,
-    batch_size: int = 500,
     request_timeout: int = 60,
     refresh: bool = False,
 ) -> dict:
     """
     Idempotently bulk-index chunks into `index` (default: pdf_chunks).
 
-    - Stable doc_id: {filename}_{chunk_size}_{chunk_index}
-    - Writes id/book_id/source_pdf/text/vector/etc. into _source
-    - Validates vector length against the index mapping
+    - Stable doc_id, see chunk_doc_id
+    - Writes id/book_id/source_pdf/text/vector/etc. into _source; a compact
+      index gets text plus the chunk-level `metadata` only
+    - Validates vector length against the index mapping; vectors go out as
+      float32 rows of the batch matrix
+    - During a rebuild, also writes into the new generation
     """
-    mapping = _mapping_for(index)
-    ensure_index(index, mapping)
-
-    expected_dims = _vector_dims_from_mapping(mapping)
-    total = 0
-    successes = 0
-    failures = 0
+    targets = write_targets(index)
+    if not targets:
+        logger.error("No generation of %s accepts %s vectors; rebuild it first", index, embedding_version())
+        return {"items": 0, "success": 0, "fail": 1, "error": f"embedding mismatch on {index}"}
+    skipped: Counter = Counter()
+    dims = embedding_dimensions()
+    valid = chunks.valid_rows(dims)
 
     def _actions():
-        nonlocal total
-        for ch in chunks:
-            total += 1
-            vec = getattr(ch, "embedding", None)
-            if not isinstance(vec, list) or len(vec) != expected_dims:
-                # Counted later from returned errors; we also log here for visibility
+        for i in range(len(chunks)):
+            fields = chunks.row(i)
+            if not valid[i]:
                 logger.error(
-                    "Skipping chunk: bad vector dims (got %s, expected %s). chunk_index=%s chunk_size=%s filename=%s",
-                    None if vec is None else len(vec),
-                    expected_dims,
-                    getattr(ch, "chunk_index", "?"),
-                    getattr(ch, "chunk_size", "?"),
-                    filename,
+                    "Skipping chunk %s/%s of %s: bad vector (expected %s finite dims)",
+                    fields["chunk_size"], fields["chunk_index"], filename, dims,
                 )
+                skipped[filename] += 1
                 continue
 
-            doc_id = f"{filename}_{getattr(ch, 'chunk_size', 'NA')}_{getattr(ch, 'chunk_index', 'NA')}"
-            yield {
-                "_op_type": "index",      # overwrite-on-retry; use "create" to forbid overwrites
-                "_index": index,
-                "_id": doc_id,
-                "_source": {
-                    "id": doc_id,
-                    "book_id": book_id,
-                    "source_pdf": source_pdf or filename,
-                    "filename": filename,
-                    "language": language,
-                    "language_name": language_name,
-                    "section_patterns": section_patterns,
-                    "chunk_size": int(getattr(ch, "chunk_size", 0)),
-                    "chunk_index": int(getattr(ch, "chunk_index", 0)),
-                    "pages": _coerce_pages(getattr(ch, "pages", [])),
-                    "text": getattr(ch, "text", "") or "",
-                    "metadata": {
-                        "id": doc_id,
-                        "book_id": book_id,
-                        "source_pdf": source_pdf or filename,
-                        "filename": filename,
-                        "language": language,
-                        "language_name": language_name,
-                        "section_patterns": section_patterns,
-                        "chunk_size": int(getattr(ch, "chunk_size", 0)),
-                        "chunk_index": int(getattr(ch, "chunk_index", 0)),
-                        "pages": _coerce_pages(getattr(ch, "pages", [])),
-                    },
-                    "vector": vec,
-                },
+            # Chunks carry their own language on mixed-language documents.
+            chunk_language = fields.get("language") or language
+            fields.update(
+                filename=filename,
+                book_id=book_id,
+                source_pdf=source_pdf or filename,
+                language=chunk_language,
+                language_name=(
+                    language_name if chunk_language == language else LANGUAGE_NAMES.get(chunk_language, language_name)
+                ),
+                section_patterns=section_patterns,
+            )
+            text = fields.pop("text") or ""
+            for target in targets:
+                yield chunk_action(target, text, chunks.vectors[i], fields)
+
+    return _write(_actions(), index, filename, request_timeout, refresh, skipped)
+
+
+def save_captions_to_es(
+    records: Iterable,
+    vectors: Iterable[List[float]],
+    *,
+    language: Optional[str] = None,
+    language_name: Optional[str] = None,
+    section_patterns: Optional[List[str]] = None,
+    index: str = CAPTIONS,
+    request_timeout: int = 60,
+    refresh: bool = False,
+) -> dict:
+    """Bulk-index image captions into `index` (default: captions), shaped like chunk documents."""
+    targets = write_targets(index)
+    if not targets:
+        logger.error("No generation of %s accepts %s vectors; rebuild it first", index, embedding_version())
+        return {"items": 0, "success": 0, "fail": 1, "error": f"embedding mismatch on {index}"}
+    skipped: Counter = Counter()
+
+    def _actions():
+        for record, vec in zip(records, vectors):
+            if not _valid_vector(vec, embedding_dimensions(), f"caption on page {record.page_number} of {record.source_pdf}"):
+                skipped[record.source_pdf] += 1
+                continue
+            fields = {
+                "book_id": record.book_id,
+                "source_pdf": record.source_pdf,
+                "filename": record.filename,
+                "language": language,
+                "language_name": language_name,
+                "section_patterns": section_patterns,
+                "page_number": record.page_number,
+                "xref": record.xref,
             }
+            for target in targets:
+                yield caption_action(target, record.caption, vec, fields)
 
+    return _write(_actions(), index, None, request_timeout, refresh, skipped)
+
+
+def _write(
+    actions: Iterable[dict],
+    index: str,
+    filename: Optional[str],
+    request_timeout: int,
+    refresh: bool,
+    skipped: Counter,
+) -> dict:
     try:
-        success_count, errors = helpers.bulk(
-            es,
-            _actions(),
-            chunk_size=batch_size,
+        result = bulk_index(
+            actions,
+            document_of=lambda action: filename or action["_source"]["metadata"]["source_pdf"],
             request_timeout=request_timeout,
-            raise_on_error=False,
-            stats_only=False,
         )
-        successes = success_count
-        failures = len(errors) if isinstance(errors, list) else 0
+    except Exception as e:
+        logger.exception("Bulk indexing into %s failed: %s", index, e)
+        return {"items": 0, "success": 0, "fail": max(1, sum(skipped.values())), "error": str(e)}
 
-        if refresh:
-            es.indices.refresh(index=index)
+    # Actions dropped for bad vectors count as failures of their document too.
+    for document, count in skipped.items():
+        result["errors_by_document"][document] = result["errors_by_document"].get(document, 0) + count
+        result["fail"] += count
+        result["items"] += count
+    if refresh:
+        es.indices.refresh(index=index)
+    return result
 
-        return {"items": total, "success": successes, "fail": failures}
-    except Exception as e:
-        logger.exception("Bulk indexing failed for %s (%d chunks): %s", filename, total, e)
-        return {"items": total, "success": successes, "fail": max(failures, 1), "error": str(e)}
+
+def save_document_record(
+    filename: str,
+    *,
+    book_id: Optional[str] = None,
+    source_pdf: Optional[str] = None,
+    language: Optional[str] = None,
+    language_name: Optional[str] = None,
+    section_patterns: Optional[List[str]] = None,
+    chunks: Optional[int] = None,
+    captions: Optional[int] = None,
+) -> None:
+    """Upserts the pdf_documents record holding the attributes shared by a document's chunks."""
+    ensure_index(PDF_DOCUMENTS, PDF_DOCUMENTS_MAPPING)
+    es.index(
+        index=PDF_DOCUMENTS,
+        id=filename,
+        document={
+            "filename": filename,
+            "book_id": book_id,
+            "source_pdf": source_pdf or filename,
+            "language": language,
+            "language_name": language_name,
+            "section_patterns": section_patterns or [],
+            "layout": index_layout(PDF_CHUNKS),
+            "chunks": chunks,
+            "captions": captions,
+            "indexed_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+
+
+def delete_document(filename: str) -> dict:
+    """
+    Removes a document's chunks and captions from the live generation and any
+    generation being rebuilt, plus its pdf_documents record.
+    """
+    deleted = {}
+    for logical, field in ((PDF_CHUNKS, "filename"), (CAPTIONS, "source_pdf")):
+        targets = [name for name in resolve_index(logical) if name]
+        response = es.delete_by_query(
+            index=",".join(targets),
+            query={"term": {field: filename}},
+            conflicts="proceed",
+            refresh=True,
+        )
+        deleted[logical] = response.get("deleted", 0)
+    try:
+        es.delete(index=PDF_DOCUMENTS, id=filename)
+    except Exception:
+        pass
+    return deleted
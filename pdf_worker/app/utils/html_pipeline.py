@@ -1,14 +1,18 @@
 import logging
 import re
-from typing import List
+from typing import Optional
 
 from bs4 import BeautifulSoup
 
-from app.utils.embedding import embed_chunks_streaming
-from app.utils.es import save_chunks_to_es
-from app.utils.language import detect_language_from_pages
+from app.utils.checkpoints import checkpointed, clear_checkpoints
+from app.utils.dedupe import mark_duplicates
+from app.utils.embedding import encoding
+from app.utils.es import PDF_CHUNKS, ingest_mode, save_chunks_to_es, save_document_record
+from app.utils.language import detect_chunk_languages, detect_language_from_pages
+from app.utils.pdf_pipeline import ProgressFn, embed_pending_chunks, report_progress
 from app.utils.structure import detect_section_patterns_from_pages
-from app.utils.text_chunker import chunk_text
+from app.utils.versioning import carry_over_vectors, previous_version, retire_previous_version
+from app.utils.text_chunker import chunk_mode_options, chunk_text
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +43,15 @@ def _extract_main_text(html_text: str) -> str:
     return "\n".join(lines)
 
 
-def process_html(file_path: str, book_id: str, source_name: str) -> dict:
+def process_html(
+    file_path: str,
+    book_id: str,
+    source_name: str,
+    *,
+    progress: Optional[ProgressFn] = None,
+) -> dict:
     logger.info("Starting HTML processing for: %s", source_name)
+    report_progress(progress, "parsing", 5)
 
     raw = None
     with open(file_path, "rb") as handle:
@@ -52,35 +63,72 @@ def process_html(file_path: str, book_id: str, source_name: str) -> dict:
     extracted = _extract_main_text(html_text)
     pages = [extracted] if extracted else []
 
-    language_info = detect_language_from_pages(pages)
+    report_progress(progress, "language", 20)
+    language_info = checkpointed(
+        source_name,
+        "language",
+        lambda: detect_language_from_pages(pages),
+    )
     language_code = language_info.get("code")
     language_name = language_info.get("name")
 
-    section_patterns = detect_section_patterns_from_pages(
-        pages,
-        language_code=language_code,
+    report_progress(progress, "sections", 40)
+    section_patterns = checkpointed(
+        source_name,
+        "section_patterns",
+        lambda: detect_section_patterns_from_pages(
+            pages,
+            language_code=language_code,
+        ),
     )
 
+    report_progress(progress, "chunking", 45)
     chunks = chunk_text(
         pages,
-        chunk_sizes=[800, 1600],
+        **chunk_mode_options(),
         language_code=language_code,
         section_patterns=section_patterns,
+        encoding=encoding,
     )
+    detect_chunk_languages(chunks, default_code=language_code)
 
-    embed_chunks_streaming(
-        chunks,
-        save_fn=lambda batch: save_chunks_to_es(
+    # An amended upload only embeds the chunks that differ from its predecessor.
+    previous = previous_version(source_name)
+    reuse = carry_over_vectors(previous, chunks) if previous else {}
+    # Passages already in the corpus reuse its vectors and share its dup_group.
+    duplicates = mark_duplicates(source_name, chunks)
+
+    with ingest_mode(PDF_CHUNKS):
+        report_progress(progress, "embedding", 50)
+        embed_pending_chunks(
             source_name,
-            batch,
-            book_id=book_id,
-            source_pdf=source_name,
-            language=language_code,
-            language_name=language_name,
-            section_patterns=section_patterns,
-        ),
+            chunks,
+            progress=progress,
+            save_fn=lambda batch: save_chunks_to_es(
+                source_name,
+                batch,
+                book_id=book_id,
+                source_pdf=source_name,
+                language=language_code,
+                language_name=language_name,
+                section_patterns=section_patterns,
+            ),
+        )
+
+    save_document_record(
+        source_name,
+        book_id=book_id,
+        source_pdf=source_name,
+        language=language_code,
+        language_name=language_name,
+        section_patterns=section_patterns,
+        chunks=len(chunks),
+        captions=0,
     )
-
+    if previous:
+        # embed_pending_chunks has raised unless every chunk was indexed.
+        retire_previous_version(source_name, previous, expected_chunks=len(chunks))
+    clear_checkpoints(source_name)
     logger.info("Finished HTML processing: %s", source_name)
     return {
         "pages": len(pages),
@@ -89,5 +137,8 @@ def process_html(file_path: str, book_id: str, source_name: str) -> dict:
         "language": language_code,
         "language_name": language_name,
         "section_patterns": section_patterns,
+        "previous_version": previous,
+        "chunks_reused": reuse.get("reused", 0),
+        "chunks_duplicate": duplicates["duplicates"],
         "source_type": "html",
     }
@@ -1,14 +1,17 @@
 # import os
 import fitz  # PyMuPDF
-import io
+import hashlib
 import logging
 import re
 from itertools import chain
-from typing import List, Tuple, Dict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple, Dict, Union
 
-from PIL import Image
-from app.models import ImageMetadata
-from app.utils.minio_utils import upload_bytes_to_minio
+from app.models import ImageMetadata, ParsedDocument, ParsedPage
+from app.utils.minio_utils import MinioUploader, upload_bytes_to_minio
+from app.utils.parallel import get_render_pool, map_page_shards
+from app.utils.pdf_document import parse_pdf
+from app.utils.rendering import CONTENT_TYPES, RenderProfile, get_render_profile, render_clip
 
 BUCKET_NAME = "images"
 logger = logging.getLogger(__name__)
@@ -24,10 +27,10 @@ caption_regex = re.compile(
 )
 
 
-def extract_captions_with_bbox(page) -> List[Dict]:
-    """Extracts figure captions from the page with bounding boxes."""
+def extract_captions_with_bbox(blocks: List[tuple]) -> List[Dict]:
+    """Extracts figure captions from the page's text blocks with bounding boxes."""
     captions = []
-    for block in page.get_text("blocks"):
+    for block in blocks:
         text = block[4].strip()
         if caption_regex.match(text):
             captions.append({"text": text, "bbox": tuple(block[:4])})
@@ -68,47 +71,129 @@ def upload_image_to_minio(image_bytes: bytes, filename: str, content_type: str =
         raise
 
 
+def content_addressed_name(image_bytes: bytes, ext: str) -> str:
+    """Object name derived from the image content, identical across documents."""
+    return f"sha256-{hashlib.sha256(image_bytes).hexdigest()}.{ext}"
+
+
+def store_image(image_bytes: bytes, ext: str, uploader: MinioUploader, content_type: Optional[str] = None) -> str:
+    """
+    Hands the image to `uploader` under its content-addressed name and returns the
+    name. The uploader skips names it already has and objects already in MinIO.
+    """
+    filename = content_addressed_name(image_bytes, ext)
+    uploader.submit(filename, image_bytes, content_type=content_type or f"image/{ext}")
+    return filename
+
+
+def _store_screenshot(
+    meta: ImageMetadata,
+    encoded: Dict[str, bytes],
+    profile: RenderProfile,
+    uploader: MinioUploader,
+) -> None:
+    """Stores a rendered screenshot and its derivatives next to it (`<name>.<derivative>.<ext>`)."""
+    content_type = CONTENT_TYPES[profile.format]
+    meta.filename = store_image(encoded["original"], profile.format, uploader, content_type=content_type)
+    stem = meta.filename.rsplit(".", 1)[0]
+    for name, data in encoded.items():
+        if name == "original":
+            continue
+        derivative = f"{stem}.{name}.{profile.format}"
+        uploader.submit(derivative, data, content_type=content_type)
+        setattr(meta, "thumbnail" if name == "thumb" else name, derivative)
+
+
 def process_images_and_captions(
     pdf_path: str,
     page_range: List[int],
     book_id: str = "book",
     size_threshold: int = 200 * 200,
-    dpi: int = 300,
+    dpi: Optional[int] = None,
     padding: int = 20,
+    *,
+    document: Optional[ParsedDocument] = None,
+    render_profile: Optional[Union[str, RenderProfile]] = None,
 ) -> List[ImageMetadata]:
-    """Processes a range of PDF pages, saving matched images or screenshots and returning metadata."""
+    """
+    Processes a range of PDF pages, saving matched images or screenshots and returning metadata.
+    Pass an already parsed `document` to reuse its blocks, layout and image lists.
+    When the page process pool is enabled, page ranges are processed in parallel and
+    the results are merged in page order.
+    Screenshots follow `render_profile` (a RENDER_PROFILES name or a RenderProfile;
+    default SCREENSHOT_PROFILE), with `dpi` overriding its resolution, and are
+    stored with their thumbnail/preview derivatives.
+    """
+    if document is None:
+        document = parse_pdf(pdf_path, page_range)
+    profile = get_render_profile(render_profile, dpi=dpi)
+
+    metadata_list = map_page_shards(
+        _process_page_shard,
+        page_range,
+        pdf_path,
+        book_id,
+        size_threshold,
+        profile,
+        padding,
+        shard_args=lambda shard: ([document.page(i) for i in shard],),
+    )
+    if metadata_list is None:
+        metadata_list = _process_pages(
+            pdf_path, page_range, document, book_id, size_threshold, profile, padding
+        )
 
+    logger.info("All pages processed.")
+    return metadata_list
+
+
+def _process_page_shard(
+    page_range: List[int],
+    pdf_path: str,
+    book_id: str,
+    size_threshold: int,
+    profile: RenderProfile,
+    padding: int,
+    pages: List[ParsedPage],
+) -> List[ImageMetadata]:
+    """Process-pool entry point: handles one contiguous shard of pages."""
+    shard_document = ParsedDocument(
+        path=pdf_path,
+        page_count=len(pages),
+        metadata={},
+        pages=[p for p in pages if p is not None],
+    )
+    return _process_pages(pdf_path, page_range, shard_document, book_id, size_threshold, profile, padding)
+
+
+def _process_pages(
+    pdf_path: str,
+    page_range: List[int],
+    document: ParsedDocument,
+    book_id: str,
+    size_threshold: int,
+    profile: RenderProfile,
+    padding: int,
+) -> List[ImageMetadata]:
     metadata_list = []
+    # Screenshots render in the render pool while later pages are processed.
+    render_pool = get_render_pool()
+    renders: List[Tuple[ImageMetadata, object]] = []
+    # Object name of each xref extracted in this run.
+    xref_names: Dict[int, str] = {}
 
-    with fitz.open(pdf_path) as doc:
+    with MinioUploader(BUCKET_NAME, skip_existing=True) as uploader, fitz.open(pdf_path) as doc:
         for page_index in page_range:
-            page = doc[page_index]
-            layout = page.get_text("dict")
-            caption_paragraphs = extract_captions_with_bbox(page)
+            parsed = document.page(page_index)
+            if parsed is None:
+                continue
+            caption_paragraphs = extract_captions_with_bbox(parsed.blocks)
             caption_count = len(caption_paragraphs)
 
-            image_infos = []
-            image_boxes = [
-                block["bbox"] for block in layout["blocks"]
-                if block.get("type") == 1 and "image" in block
-            ]
-
-            for img in page.get_images(full=True):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                with Image.open(io.BytesIO(base_image["image"])) as image:
-                    area = image.width * image.height
-
-                image_infos.append(
-                    {
-                        "bytes": base_image["image"],
-                        "ext": base_image["ext"],
-                        "area": area,
-                        "xref": xref,
-                    }
-                )
-
-            image_count = len(image_infos)
+            image_boxes = list(parsed.image_boxes)
+            # get_images(full=True) entries: (xref, smask, width, height, ...). The declared
+            # size is enough for triage, so nothing is decoded before an image is kept.
+            image_count = len(parsed.images)
             page_label = f"page{page_index + 1}"
 
             if caption_count == 0:
@@ -117,31 +202,32 @@ def process_images_and_captions(
 
             if image_count == caption_count:
                 logger.info("Matched images and captions on %s, saving large images.", page_label)
-                for i, info in enumerate(image_infos):
-                    if info["area"] >= size_threshold:
-                        filename = f"{book_id}_page{page_index+1:03}_xref{info['xref']}.{info['ext']}"
+                for i, img in enumerate(parsed.images):
+                    xref, width, height = img[0], img[2], img[3]
+                    if width * height < size_threshold:
+                        continue
+                    filename = xref_names.get(xref)
+                    if filename is None:
                         try:
-                            upload_image_to_minio(
-                                image_bytes=info["bytes"],
-                                filename=filename,
-                                content_type=f"image/{info['ext']}",
-                            )
+                            base_image = doc.extract_image(xref)
+                            filename = store_image(base_image["image"], base_image["ext"], uploader)
                         except Exception as e:
                             logger.warning("Skipping image due to error: %s", e)
                             continue
+                        xref_names[xref] = filename
 
-                        caption_text = caption_paragraphs[i]["text"] if i < caption_count else ""
-                        metadata_list.append(
-                            ImageMetadata(
-                                book_id=book_id,
-                                source_pdf=pdf_path,
-                                page_number=page_index + 1,
-                                xref=info["xref"],
-                                filename=filename,
-                                caption=caption_text,
-                            )
+                    caption_text = caption_paragraphs[i]["text"] if i < caption_count else ""
+                    metadata_list.append(
+                        ImageMetadata(
+                            book_id=book_id,
+                            source_pdf=pdf_path,
+                            page_number=page_index + 1,
+                            xref=xref,
+                            filename=filename,
+                            caption=caption_text,
                         )
-                        logger.info("Saved: %s", filename)
+                    )
+                    logger.info("Saved: %s", filename)
 
             elif image_count > caption_count and image_boxes:
                 logger.info("More images than captions on %s, taking grouped screenshots.", page_label)
@@ -157,49 +243,60 @@ def process_images_and_captions(
                     map(tuple, all_boxes)
                 ), f"Box mismatch on {page_label}"
 
-                zoom = dpi / 72
-                mat = fitz.Matrix(zoom, zoom)
-
                 for i, group in enumerate(groups):
                     x0 = min(b[0] for b in group) - padding
                     y0 = min(b[1] for b in group) - padding
                     x1 = max(b[2] for b in group) + padding
                     y1 = max(b[3] for b in group) + padding
 
+                    page_x0, page_y0, page_x1, page_y1 = parsed.rect
                     rect = fitz.Rect(
-                        max(x0, page.rect.x0),
-                        max(y0, page.rect.y0),
-                        min(x1, page.rect.x1),
-                        min(y1, page.rect.y1),
+                        max(x0, page_x0),
+                        max(y0, page_y0),
+                        min(x1, page_x1),
+                        min(y1, page_y1),
                     )
 
-                    pix = page.get_pixmap(matrix=mat, clip=rect)
-                    img_bytes = pix.tobytes("png")
-                    filename = f"{book_id}_page{page_index+1:03}_group{i+1}.png"
-                    upload_image_to_minio(img_bytes, filename)
+                    clip = tuple(rect)
+                    if render_pool is not None:
+                        rendered = render_pool.submit(render_clip, pdf_path, page_index, clip, profile)
+                    else:
+                        rendered = render_clip(pdf_path, page_index, clip, profile)
 
                     closest_caption = find_closest_caption_to_group(
                         (x0, y0, x1, y1), caption_paragraphs
                     )
                     caption_text = closest_caption["text"] if closest_caption else ""
-                    metadata_list.append(
-                        ImageMetadata(
-                            book_id=book_id,
-                            source_pdf=pdf_path,
-                            page_number=page_index + 1,
-                            xref=-1,
-                            filename=filename,
-                            caption=caption_text,
-                        )
+                    meta = ImageMetadata(
+                        book_id=book_id,
+                        source_pdf=pdf_path,
+                        page_number=page_index + 1,
+                        xref=-1,
+                        filename="",
+                        caption=caption_text,
                     )
-
-                    logger.info("Saved screenshot: %s", filename)
+                    metadata_list.append(meta)
+                    renders.append((meta, rendered))
 
             else:
                 logger.warning("Unexpected case for %s, skipping.", page_label)
 
-    logger.info("All pages processed.")
-    return metadata_list
+        for meta, rendered in renders:
+            try:
+                encoded = rendered.result() if isinstance(rendered, Future) else rendered
+            except Exception as e:
+                logger.warning("Rendering a screenshot on page %s failed: %s", meta.page_number, e)
+                continue
+            _store_screenshot(meta, encoded, profile, uploader)
+            logger.info("Saved screenshot: %s", meta.filename)
+
+        # Uploads run while later pages are processed; wait for them before returning.
+        failed = {name for name, _ in uploader.flush()}
+
+    if failed:
+        logger.warning("Dropping image records whose upload failed: %s", sorted(failed))
+    # Screenshots that failed to render never got a filename.
+    return [meta for meta in metadata_list if meta.filename and meta.filename not in failed]
 
 
 
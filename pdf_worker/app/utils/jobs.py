@@ -0,0 +1,378 @@
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, or_
+
+from app.db.db import SessionLocal
+from app.db.models.ingest_job_orm import IngestJobORM, JobStatus
+from app.utils.html_pipeline import process_html
+from app.utils.minio_utils import download_from_minio, get_object_sha256
+from app.utils.pdf_pipeline import process_pdf
+from app.utils.versioning import link_previous_version
+
+logger = logging.getLogger(__name__)
+
+# Number of documents ingested concurrently by this replica.
+INGEST_JOB_CONCURRENCY = int(os.getenv("INGEST_JOB_CONCURRENCY", "1"))
+# Seconds a claimed job stays owned without a heartbeat before another replica may take it.
+INGEST_JOB_LEASE_SECONDS = int(os.getenv("INGEST_JOB_LEASE_SECONDS", "120"))
+# Seconds an idle worker waits before polling the queue again.
+INGEST_JOB_POLL_SECONDS = float(os.getenv("INGEST_JOB_POLL_SECONDS", "2"))
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATUSES = {JobStatus.DONE, JobStatus.FAILED}
+
+_stop_event = threading.Event()
+_workers: List[threading.Thread] = []
+
+
+def job_to_dict(job: IngestJobORM) -> Dict[str, object]:
+    return {
+        "job_id": str(job.id),
+        "filename": job.filename,
+        "status": job.status.value,
+        "stage": job.stage,
+        "percent": job.percent,
+        "stats": job.stats or {},
+        "error": job.error,
+        "attempts": job.attempts,
+        "worker_id": job.worker_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def get_job(job_id: str) -> Optional[Dict[str, object]]:
+    db = SessionLocal()
+    try:
+        job = db.get(IngestJobORM, UUID(job_id))
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def _find_reusable_job(db, filename: str, content_hash: Optional[str]) -> Optional[IngestJobORM]:
+    """A pending or finished job for the same object, or a finished one for the same content."""
+    same_file = (
+        db.query(IngestJobORM)
+        .filter(
+            IngestJobORM.filename == filename,
+            IngestJobORM.status != JobStatus.FAILED,
+        )
+        .order_by(IngestJobORM.created_at.desc())
+        .first()
+    )
+    if same_file is not None or not content_hash:
+        return same_file
+    return (
+        db.query(IngestJobORM)
+        .filter(
+            IngestJobORM.content_hash == content_hash,
+            IngestJobORM.status == JobStatus.DONE,
+        )
+        .order_by(IngestJobORM.finished_at.desc())
+        .first()
+    )
+
+
+def _is_ingested(db, filename: str) -> bool:
+    """Whether `filename` was ingested by a finished job of its own (not as a duplicate)."""
+    jobs = (
+        db.query(IngestJobORM)
+        .filter(IngestJobORM.filename == filename, IngestJobORM.status == JobStatus.DONE)
+        .all()
+    )
+    return any(not (job.stats or {}).get("duplicate_of") for job in jobs)
+
+
+def enqueue_job(filename: str, *, force: bool = False, previous: Optional[str] = None) -> Dict[str, object]:
+    """
+    Stores a queued job; any replica's worker may claim it.
+    Unless `force` is set, a document that is already queued, running or ingested
+    (by object name or by content hash) is not processed again.
+    With `previous`, the upload is ingested as an amended version of that document,
+    which it replaces once indexed; `previous` must be an ingested upload.
+    """
+    content_hash = get_object_sha256(filename)
+    db = SessionLocal()
+    try:
+        if previous:
+            if previous == filename:
+                raise ValueError("A document cannot replace itself")
+            if not _is_ingested(db, previous):
+                raise ValueError(f"'{previous}' is not an ingested document")
+            link_previous_version(filename, previous)
+        if not force:
+            existing = _find_reusable_job(db, filename, content_hash)
+            if existing is not None and existing.filename == filename:
+                logger.info("Reusing ingestion job %s for %s", existing.id, filename)
+                return {**job_to_dict(existing), "duplicate": True}
+            if existing is not None:
+                # Same content ingested under another object name: record a finished job.
+                now = datetime.utcnow()
+                job = IngestJobORM(
+                    filename=filename,
+                    content_hash=content_hash,
+                    status=JobStatus.DONE,
+                    stage="done",
+                    percent=100,
+                    stats={**(existing.stats or {}), "duplicate_of": existing.filename},
+                    attempts=0,
+                    max_attempts=INGEST_JOB_MAX_ATTEMPTS,
+                    created_at=now,
+                    updated_at=now,
+                    finished_at=now,
+                )
+                db.add(job)
+                db.commit()
+                db.refresh(job)
+                logger.info("%s has the same content as %s; skipping ingestion", filename, existing.filename)
+                return {**job_to_dict(job), "duplicate": True}
+
+        job = IngestJobORM(
+            filename=filename,
+            content_hash=content_hash,
+            status=JobStatus.QUEUED,
+            stage="queued",
+            percent=0,
+            attempts=0,
+            max_attempts=INGEST_JOB_MAX_ATTEMPTS,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        logger.info("Queued ingestion job %s for %s", job.id, filename)
+        return {**job_to_dict(job), "duplicate": False}
+    finally:
+        db.close()
+
+
+def claim_next_job(worker_id: str) -> Optional[IngestJobORM]:
+    """
+    Claims the oldest queued job, or a running job whose lease expired, with
+    SELECT ... FOR UPDATE SKIP LOCKED so concurrent replicas never claim the same row.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        job = (
+            db.query(IngestJobORM)
+            .filter(
+                or_(
+                    IngestJobORM.status == JobStatus.QUEUED,
+                    (IngestJobORM.status == JobStatus.RUNNING)
+                    & (IngestJobORM.lease_expires_at < now),
+                )
+            )
+            .order_by(IngestJobORM.created_at)
+            .with_for_update(skip_locked=True)
+            .limit(1)
+            .first()
+        )
+        if job is None:
+            db.rollback()
+            return None
+
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.error = job.error or f"Lease expired after {job.attempts} attempts"
+            job.worker_id = None
+            job.lease_expires_at = None
+            job.finished_at = now
+            job.updated_at = now
+            db.commit()
+            logger.warning("Ingestion job %s gave up after %s attempts", job.id, job.attempts)
+            return None
+
+        if job.status == JobStatus.RUNNING:
+            logger.warning("Reclaiming ingestion job %s from %s (lease expired)", job.id, job.worker_id)
+        job.status = JobStatus.RUNNING
+        job.stage = "claimed"
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.lease_expires_at = now + timedelta(seconds=INGEST_JOB_LEASE_SECONDS)
+        job.heartbeat_at = now
+        job.started_at = job.started_at or now
+        job.updated_at = now
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+def _update_owned_job(job_id: UUID, worker_id: str, **fields) -> bool:
+    """Updates the job only while `worker_id` still holds its lease; extends the lease."""
+    now = datetime.utcnow()
+    fields["updated_at"] = now
+    if "status" not in fields:
+        fields["heartbeat_at"] = now
+        fields["lease_expires_at"] = now + timedelta(seconds=INGEST_JOB_LEASE_SECONDS)
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(IngestJobORM)
+            .filter(IngestJobORM.id == job_id, IngestJobORM.worker_id == worker_id)
+            .update(fields, synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+    if not updated:
+        logger.warning("Worker %s lost the lease on ingestion job %s", worker_id, job_id)
+    return bool(updated)
+
+
+def _heartbeat_loop(job_id: UUID, worker_id: str, done: threading.Event) -> None:
+    interval = max(1.0, INGEST_JOB_LEASE_SECONDS / 3)
+    while not done.wait(interval):
+        try:
+            _update_owned_job(job_id, worker_id)
+        except Exception as exc:
+            logger.warning("Heartbeat for ingestion job %s failed: %s", job_id, exc)
+
+
+def run_job(job: IngestJobORM, worker_id: str) -> None:
+    job_id = job.id
+    filename = job.filename
+
+    def progress(stage: str, percent: int) -> None:
+        _update_owned_job(job_id, worker_id, stage=stage, percent=max(0, min(100, int(percent))))
+
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat_loop,
+        args=(job_id, worker_id, done),
+        name=f"heartbeat-{job_id}",
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        progress("download", 0)
+        local_path = download_from_minio(filename)
+        book_id = filename.split("_")[0]
+        if filename.lower().endswith((".html", ".htm")):
+            stats = process_html(local_path, book_id, filename, progress=progress) or {}
+        else:
+            stats = process_pdf(local_path, book_id, filename, progress=progress) or {}
+    except Exception as e:
+        logger.exception("Ingestion job %s failed for %s: %s", job_id, filename, e)
+        retry = job.attempts < job.max_attempts
+        _update_owned_job(
+            job_id,
+            worker_id,
+            status=JobStatus.QUEUED if retry else JobStatus.FAILED,
+            stage="retrying" if retry else "failed",
+            error=str(e),
+            worker_id=None,
+            lease_expires_at=None,
+            finished_at=None if retry else datetime.utcnow(),
+        )
+        return
+    finally:
+        done.set()
+        heartbeat.join()
+
+    _update_owned_job(
+        job_id,
+        worker_id,
+        status=JobStatus.DONE,
+        stage="done",
+        percent=100,
+        stats=stats,
+        error=None,
+        lease_expires_at=None,
+        finished_at=datetime.utcnow(),
+    )
+    logger.info("Ingestion job %s finished for %s", job_id, filename)
+
+
+def _worker_loop(worker_id: str) -> None:
+    logger.info("Ingestion worker %s started", worker_id)
+    while not _stop_event.is_set():
+        try:
+            job = claim_next_job(worker_id)
+        except Exception as exc:
+            logger.warning("Worker %s could not poll the job queue: %s", worker_id, exc)
+            job = None
+        if job is None:
+            _stop_event.wait(INGEST_JOB_POLL_SECONDS)
+            continue
+        run_job(job, worker_id)
+    logger.info("Ingestion worker %s stopped", worker_id)
+
+
+def start_workers() -> None:
+    """Starts INGEST_JOB_CONCURRENCY worker threads that drain the shared Postgres queue."""
+    if _workers:
+        return
+    _stop_event.clear()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(max(1, INGEST_JOB_CONCURRENCY)):
+        worker = threading.Thread(
+            target=_worker_loop,
+            args=(f"{prefix}:{i}",),
+            name=f"ingest-{i}",
+            daemon=True,
+        )
+        worker.start()
+        _workers.append(worker)
+
+
+def shutdown_jobs() -> None:
+    # Running jobs are not interrupted; their leases expire and another replica retries them.
+    _stop_event.set()
+    _workers.clear()
+
+
+def queue_metrics() -> Dict[str, object]:
+    """Queue depth and age figures for dashboards and autoscaling."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        counts = dict(
+            db.query(IngestJobORM.status, func.count(IngestJobORM.id))
+            .group_by(IngestJobORM.status)
+            .all()
+        )
+        oldest_queued = (
+            db.query(func.min(IngestJobORM.created_at))
+            .filter(IngestJobORM.status == JobStatus.QUEUED)
+            .scalar()
+        )
+        expired_leases = (
+            db.query(func.count(IngestJobORM.id))
+            .filter(
+                IngestJobORM.status == JobStatus.RUNNING,
+                IngestJobORM.lease_expires_at < now,
+            )
+            .scalar()
+        )
+        active_workers = (
+            db.query(func.count(func.distinct(IngestJobORM.worker_id)))
+            .filter(
+                IngestJobORM.status == JobStatus.RUNNING,
+                IngestJobORM.lease_expires_at >= now,
+            )
+            .scalar()
+        )
+    finally:
+        db.close()
+
+    return {
+        "queued": counts.get(JobStatus.QUEUED, 0),
+        "running": counts.get(JobStatus.RUNNING, 0),
+        "failed": counts.get(JobStatus.FAILED, 0),
+        "done": counts.get(JobStatus.DONE, 0),
+        "expired_leases": expired_leases or 0,
+        "active_workers": active_workers or 0,
+        "oldest_queued_age_seconds": (now - oldest_queued).total_seconds() if oldest_queued else 0.0,
+    }
@@ -0,0 +1,90 @@
+# Reference text for the character n-gram language profiles in language.py.
+# Each sample mixes general prose with the legal register of the documents we ingest.
+
+LANGUAGE_NAMES = {
+    "nl": "Dutch",
+    "fr": "French",
+    "en": "English",
+    "de": "German",
+}
+
+LANGUAGE_SAMPLES = {
+    "nl": (
+        "Artikel 1. Deze wet regelt een aangelegenheid als bedoeld in artikel 74 van de Grondwet. "
+        "Voor de toepassing van deze wet wordt verstaan onder de minister: de minister bevoegd voor "
+        "justitie. De bepalingen van dit hoofdstuk zijn van toepassing op alle overeenkomsten die "
+        "worden gesloten tussen een onderneming en een consument. Het Belgisch Staatsblad maakt de "
+        "wetten en besluiten bekend die door de federale overheid worden uitgevaardigd. Het hof van "
+        "beroep heeft geoordeeld dat de verweerder niet aansprakelijk is voor de schade die de eiser "
+        "heeft geleden. De rechter kan de partijen horen en kan alle maatregelen van onderzoek "
+        "bevelen die hij nodig acht. Wanneer de termijn verstreken is, wordt het verzoek niet meer "
+        "ontvankelijk verklaard. De gemeente is verplicht om de nodige inlichtingen te verstrekken "
+        "aan de bevoegde diensten. Een natuurlijke persoon of een rechtspersoon kan een klacht "
+        "indienen bij de toezichthoudende autoriteit. De vennootschap wordt vertegenwoordigd door "
+        "haar bestuurders, die samen of afzonderlijk handelen volgens de statuten. Dit besluit treedt "
+        "in werking op de dag waarop het in het Belgisch Staatsblad wordt bekendgemaakt. In het "
+        "voorjaar gaan veel mensen met de fiets naar het werk, omdat het weer dan beter wordt en de "
+        "dagen langer zijn. Wij hebben gisteren met onze buren over de nieuwe school in het dorp "
+        "gesproken. Zij vinden dat de kinderen er veel beter kunnen leren dan vroeger. Het is "
+        "belangrijk dat iedereen zijn verantwoordelijkheid neemt en dat de regels duidelijk zijn. "
+        "De werkgever moet de werknemer schriftelijk op de hoogte brengen van de beslissing."
+    ),
+    "fr": (
+        "Article 1er. La présente loi règle une matière visée à l'article 74 de la Constitution. "
+        "Pour l'application de la présente loi, on entend par le ministre : le ministre qui a la "
+        "justice dans ses attributions. Les dispositions du présent chapitre s'appliquent à tous les "
+        "contrats conclus entre une entreprise et un consommateur. Le Moniteur belge publie les lois "
+        "et les arrêtés pris par l'autorité fédérale. La cour d'appel a jugé que le défendeur n'est "
+        "pas responsable du dommage subi par le demandeur. Le juge peut entendre les parties et peut "
+        "ordonner toutes les mesures d'instruction qu'il estime nécessaires. Lorsque le délai est "
+        "expiré, la demande n'est plus déclarée recevable. La commune est tenue de fournir les "
+        "renseignements nécessaires aux services compétents. Une personne physique ou une personne "
+        "morale peut introduire une plainte auprès de l'autorité de contrôle. La société est "
+        "représentée par ses administrateurs, qui agissent conjointement ou séparément selon les "
+        "statuts. Le présent arrêté entre en vigueur le jour de sa publication au Moniteur belge. Au "
+        "printemps, beaucoup de gens vont au travail à vélo, parce que le temps devient plus beau et "
+        "que les journées sont plus longues. Nous avons parlé hier avec nos voisins de la nouvelle "
+        "école du village. Ils pensent que les enfants peuvent y apprendre beaucoup mieux qu'avant. "
+        "Il est important que chacun prenne ses responsabilités et que les règles soient claires. "
+        "L'employeur doit informer le travailleur par écrit de la décision qui a été prise."
+    ),
+    "en": (
+        "Article 1. This Act regulates a matter referred to in Article 74 of the Constitution. For "
+        "the purposes of this Act, the minister means the minister responsible for justice. The "
+        "provisions of this chapter shall apply to all contracts concluded between a business and a "
+        "consumer. The Official Gazette publishes the laws and decrees issued by the federal "
+        "government. The court of appeal held that the defendant was not liable for the damage "
+        "suffered by the claimant. The judge may hear the parties and may order any measures of "
+        "inquiry which he considers necessary. Where the time limit has expired, the application "
+        "shall no longer be declared admissible. The municipality is required to provide the "
+        "necessary information to the competent services. A natural person or a legal person may "
+        "lodge a complaint with the supervisory authority. The company is represented by its "
+        "directors, who act jointly or separately in accordance with the articles of association. "
+        "This decree shall enter into force on the day of its publication in the Official Gazette. "
+        "In the spring, many people cycle to work because the weather gets better and the days are "
+        "longer. Yesterday we talked with our neighbours about the new school in the village. They "
+        "think that the children can learn much better there than before. It is important that "
+        "everyone takes responsibility and that the rules are clear. The employer must inform the "
+        "employee in writing of the decision that has been taken."
+    ),
+    "de": (
+        "Artikel 1. Dieses Gesetz regelt eine in Artikel 74 der Verfassung erwähnte Angelegenheit. "
+        "Für die Anwendung des vorliegenden Gesetzes versteht man unter dem Minister: den für die "
+        "Justiz zuständigen Minister. Die Bestimmungen dieses Kapitels finden Anwendung auf alle "
+        "Verträge, die zwischen einem Unternehmen und einem Verbraucher geschlossen werden. Das "
+        "Belgische Staatsblatt veröffentlicht die Gesetze und Erlasse der föderalen Behörde. Der "
+        "Appellationshof hat geurteilt, dass der Beklagte nicht für den Schaden haftet, den der "
+        "Kläger erlitten hat. Der Richter kann die Parteien anhören und alle Untersuchungsmaßnahmen "
+        "anordnen, die er für notwendig hält. Wenn die Frist abgelaufen ist, wird der Antrag nicht "
+        "mehr für zulässig erklärt. Die Gemeinde ist verpflichtet, den zuständigen Diensten die "
+        "erforderlichen Auskünfte zu erteilen. Eine natürliche oder juristische Person kann bei der "
+        "Aufsichtsbehörde eine Beschwerde einreichen. Die Gesellschaft wird durch ihre "
+        "Verwaltungsratsmitglieder vertreten, die gemäß der Satzung gemeinsam oder einzeln handeln. "
+        "Der vorliegende Erlass tritt am Tag seiner Veröffentlichung im Belgischen Staatsblatt in "
+        "Kraft. Im Frühling fahren viele Menschen mit dem Fahrrad zur Arbeit, weil das Wetter besser "
+        "wird und die Tage länger sind. Wir haben gestern mit unseren Nachbarn über die neue Schule "
+        "im Dorf gesprochen. Sie finden, dass die Kinder dort viel besser lernen können als früher. "
+        "Es ist wichtig, dass jeder seine Verantwortung übernimmt und dass die Regeln klar sind. Der "
+        "Arbeitgeber muss den Arbeitnehmer schriftlich über die Entscheidung informieren."
+    ),
+}
@@ -1,35 +1,235 @@
+import hashlib
 import logging
 import os
+import re
+from html import unescape
+from typing import Dict, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 from dotenv import load_dotenv
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from pydantic import create_model
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.models import DocumentMetadata
+from app.db.db import SessionLocal
+from app.db.models.document_metadata_orm import DocumentMetadataORM
+from app.models import DocumentMetadata, ParsedDocument, TopicCategory, TypeCategory
+from app.utils.openai_scheduler import Priority, ScheduledChatOpenAI, estimate_tokens
+from app.utils.pdf_document import parse_pdf
 
 logger = logging.getLogger(__name__)
 
+# Token budget of the text excerpt sent to the LLM for unresolved fields.
+METADATA_EXCERPT_TOKENS = int(os.getenv("METADATA_EXCERPT_TOKENS", "3000"))
+REQUIRED_FIELDS = ("title", "year", "type", "topic")
+# Identifiers are only trusted from the PDF itself; the LLM is never asked to invent them.
+LLM_FIELDS = ("title", "year", "type", "topic", "authors", "publisher")
 
-def get_doc_info(file_path: str):
-    with fitz.open(file_path) as doc:
-        num_pages = len(doc)
-        n_pages = 10
-        page_indices = list(range(min(n_pages, num_pages))) + list(
-            range(max(num_pages - n_pages, 0), num_pages)
+
+class IncompleteMetadataError(ValueError):
+    """Raised by get_doc_info when required fields stay unresolved."""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(f"Could not resolve required metadata fields: {', '.join(missing)}")
+        self.missing = missing
+
+
+_ISBN = re.compile(r"\bISBN(?:-1[03])?[:\s]*((?:97[89][\s\-]?)?(?:\d[\s\-]?){9}[\dXx])")
+_DOI = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", flags=re.IGNORECASE)
+_NUMAC = re.compile(r"\bNUMAC\s*[:.]?\s*(\d{10})\b", flags=re.IGNORECASE)
+_ELI = re.compile(r"\b(?:https?://[^\s/]+/)?(eli/[a-z]+/\d{4}/\d{2}/\d{2}/[0-9A-Za-z/_\-]+)", flags=re.IGNORECASE)
+_COPYRIGHT_YEAR = re.compile(r"(?:©|\(c\)|copyright)\s*(?:\w+\s+)?((?:19|20)\d{2})", flags=re.IGNORECASE)
+_YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+_PUBLISHED_BY = re.compile(
+    r"(?:published by|uitgegeven door|uitgeverij|éditions|editions|verlag)\s*:?\s*([A-Z][^\n,.;]{2,60})",
+    flags=re.IGNORECASE,
+)
+_GAZETTES = {
+    "belgisch staatsblad": "Belgisch Staatsblad",
+    "moniteur belge": "Moniteur belge",
+    "belgisches staatsblatt": "Belgisches Staatsblatt",
+}
+_PLACEHOLDER_TITLE = re.compile(r"^(untitled|microsoft word|document\d*)\b|\.(docx?|pdf|tex|rtf|odt)$", flags=re.IGNORECASE)
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cached_metadata(content_hash: str) -> Optional[DocumentMetadata]:
+    db = SessionLocal()
+    try:
+        row = db.get(DocumentMetadataORM, content_hash)
+        return DocumentMetadata(**row.payload) if row is not None else None
+    finally:
+        db.close()
+
+
+def store_cached_metadata(content_hash: str, metadata: DocumentMetadata, sources: Dict[str, str]) -> None:
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(DocumentMetadataORM.__table__).values(
+            content_hash=content_hash,
+            payload=metadata.model_dump(mode="json"),
+            sources=sources,
         )
+        stmt = stmt.on_conflict_do_nothing(index_elements=["content_hash"])
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _isbn_valid(digits: str) -> bool:
+    if len(digits) == 10:
+        total = sum((10 - i) * (10 if ch in "Xx" else int(ch)) for i, ch in enumerate(digits))
+        return total % 11 == 0
+    if len(digits) == 13 and digits.isdigit():
+        total = sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(digits))
+        return total % 10 == 0
+    return False
+
+
+def _xmp_values(xmp: str, tag: str) -> List[str]:
+    """Text values of an XMP property, whether given as a plain element or an rdf list."""
+    values = []
+    for match in re.finditer(rf"<{tag}[^>]*>(.*?)</{tag}>", xmp, flags=re.DOTALL):
+        inner = match.group(1)
+        items = re.findall(r"<rdf:li[^>]*>(.*?)</rdf:li>", inner, flags=re.DOTALL) or [inner]
+        values.extend(unescape(item).strip() for item in items if item.strip())
+    return values
+
+
+def _split_authors(value: str) -> List[str]:
+    parts = re.split(r"\s*(?:;|&|\band\b|\ben\b|\bet\b|\bund\b)\s*", value)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _from_embedded(doc: fitz.Document) -> Tuple[Dict[str, object], Dict[str, str]]:
+    """Fields from the document info dictionary and XMP packet."""
+    fields: Dict[str, object] = {}
+    sources: Dict[str, str] = {}
+    info = doc.metadata or {}
 
-        candidate_pages = []
-        for i in page_indices:
-            candidate_pages.append(doc[i].get_text())
-    combined_text = "\n---\n".join(candidate_pages)
+    title = (info.get("title") or "").strip()
+    if len(title) > 3 and not _PLACEHOLDER_TITLE.search(title):
+        fields["title"], sources["title"] = title, "pdf"
+    author = (info.get("author") or "").strip()
+    if author:
+        fields["authors"], sources["authors"] = _split_authors(author), "pdf"
 
+    try:
+        xmp = doc.get_xml_metadata() or ""
+    except Exception:
+        xmp = ""
+    if not xmp:
+        return fields, sources
+
+    if "title" not in fields:
+        titles = [t for t in _xmp_values(xmp, "dc:title") if not _PLACEHOLDER_TITLE.search(t)]
+        if titles:
+            fields["title"], sources["title"] = titles[0], "xmp"
+    if "authors" not in fields:
+        creators = _xmp_values(xmp, "dc:creator")
+        if creators:
+            fields["authors"], sources["authors"] = creators, "xmp"
+    publishers = _xmp_values(xmp, "dc:publisher")
+    if publishers:
+        fields["publisher"], sources["publisher"] = publishers[0], "xmp"
+    for date in _xmp_values(xmp, "dc:date") + _xmp_values(xmp, "prism:publicationDate"):
+        year = _YEAR.search(date)
+        if year:
+            fields["year"], sources["year"] = int(year.group(1)), "xmp"
+            break
+    for value in _xmp_values(xmp, "prism:doi") + _xmp_values(xmp, "dc:identifier"):
+        doi = _DOI.search(value)
+        if doi:
+            fields["doi"], sources["doi"] = doi.group(1).rstrip(".,;)"), "xmp"
+            break
+    return fields, sources
+
+
+def _from_text(text: str) -> Tuple[Dict[str, object], Dict[str, str]]:
+    """Identifiers and publication facts that regexes can read off the first and last pages."""
+    fields: Dict[str, object] = {}
+
+    for match in _ISBN.finditer(text):
+        digits = re.sub(r"[\s\-]", "", match.group(1))
+        if _isbn_valid(digits):
+            fields["isbn"] = digits.upper()
+            fields["type"] = TypeCategory.book
+            break
+
+    doi = _DOI.search(text)
+    if doi:
+        fields["doi"] = doi.group(1).rstrip(".,;)")
+        fields.setdefault("type", TypeCategory.article)
+
+    lowered = text.lower()
+    gazette = next((name for key, name in _GAZETTES.items() if key in lowered), None)
+    numac = _NUMAC.search(text)
+    eli = _ELI.search(text)
+    if gazette or numac or eli:
+        # Official journal publications: legislation, always law.
+        fields["topic"] = TopicCategory.law
+        if gazette:
+            fields["publisher"] = gazette
+    if numac:
+        fields["numac"] = numac.group(1)
+        # NUMAC identifiers start with the year of publication.
+        fields["year"] = int(numac.group(1)[:4])
+    if eli:
+        fields["eli"] = eli.group(1)
+        fields.setdefault("year", int(eli.group(1).split("/")[2]))
+
+    if "publisher" not in fields:
+        published = _PUBLISHED_BY.search(text)
+        if published:
+            fields["publisher"] = published.group(1).strip()
+
+    if "year" not in fields:
+        copyright_year = _COPYRIGHT_YEAR.search(text)
+        if copyright_year:
+            fields["year"] = int(copyright_year.group(1))
+
+    return fields, {name: "text" for name in fields}
+
+
+def _excerpt(pages: List[str], budget_tokens: int) -> str:
+    """Leading pages first (title, imprint), then the last pages, within the token budget."""
+    if not pages:
+        return ""
+    order = pages[:3] + pages[-2:][::-1] + pages[3:-2]
+    parts: List[str] = []
+    used = 0
+    for page in order:
+        page = page.strip()
+        if not page or page in parts:
+            continue
+        remaining = budget_tokens - used
+        if remaining <= 0:
+            break
+        fragment = page[: remaining * 4] if estimate_tokens(page) > remaining else page
+        parts.append(fragment)
+        used += estimate_tokens(fragment)
+    return "\n---\n".join(parts)
+
+
+def _ask_llm(fields: List[str], text: str) -> Dict[str, object]:
+    schema = create_model(
+        "PartialDocumentMetadata",
+        **{name: (DocumentMetadata.model_fields[name].annotation, DocumentMetadata.model_fields[name]) for name in fields},
+    )
     load_dotenv()
     openai_api_key = os.getenv("OPENAI_API_KEY")
 
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, openai_api_key=openai_api_key)
-    parser = PydanticOutputParser(pydantic_object=DocumentMetadata)
+    llm = ScheduledChatOpenAI(model="gpt-4o-mini", temperature=0, openai_api_key=openai_api_key, priority=Priority.INTERACTIVE)
+    parser = PydanticOutputParser(pydantic_object=schema)
     prompt = PromptTemplate(
         template="Extract the metadata from this text:\n\n{text}\n\n{format_instructions}",
         input_variables=["text"],
@@ -37,13 +237,72 @@ def get_doc_info(file_path: str):
     )
 
     chain = prompt | llm | parser
+    return chain.invoke({"text": text}).model_dump()
+
 
+def get_doc_info(
+    file_path: str,
+    *,
+    document: Optional[ParsedDocument] = None,
+    content_hash: Optional[str] = None,
+) -> DocumentMetadata:
+    """
+    Tiered metadata extraction: cached result for the content hash, then the
+    PDF info dictionary and XMP packet, then regexes over the first and last
+    pages (ISBN, DOI, NUMAC/ELI, year, publisher). Only fields still unresolved
+    are asked from the LLM, on a token-budgeted excerpt. Raises
+    IncompleteMetadataError when a required field is still missing.
+    """
+    content_hash = content_hash or file_sha256(file_path)
     try:
-        return chain.invoke({"text": combined_text})
-    except Exception as e:
-        logger.exception("Metadata parsing failed: %s", e)
-        return None
+        cached = load_cached_metadata(content_hash)
+    except Exception as exc:
+        logger.warning("Metadata cache unavailable: %s", exc)
+        cached = None
+    if cached is not None:
+        return cached
 
+    n_pages = 10
+    with fitz.open(file_path) as doc:
+        num_pages = len(doc)
+        fields, sources = _from_embedded(doc)
+    page_indices = list(range(min(n_pages, num_pages))) + list(
+        range(max(num_pages - n_pages, 0), num_pages)
+    )
+    if document is None:
+        document = parse_pdf(file_path, sorted(set(page_indices)))
+
+    candidate_pages = []
+    for i in dict.fromkeys(page_indices):
+        parsed = document.page(i)
+        if parsed is not None:
+            candidate_pages.append(parsed.text)
 
+    text_fields, text_sources = _from_text("\n".join(candidate_pages))
+    for name, value in text_fields.items():
+        if name not in fields:
+            fields[name], sources[name] = value, text_sources[name]
 
+    unresolved = [name for name in LLM_FIELDS if fields.get(name) in (None, [], "")]
+    if unresolved:
+        logger.info("Asking the LLM for metadata fields: %s", unresolved)
+        try:
+            answered = _ask_llm(unresolved, _excerpt(candidate_pages, METADATA_EXCERPT_TOKENS))
+        except Exception as e:
+            logger.exception("Metadata parsing failed: %s", e)
+            answered = {}
+        for name, value in answered.items():
+            if value not in (None, [], ""):
+                fields[name], sources[name] = value, "llm"
 
+    missing = [name for name in REQUIRED_FIELDS if fields.get(name) is None]
+    if missing:
+        logger.warning("Metadata incomplete for %s: %s", file_path, fields)
+        raise IncompleteMetadataError(missing)
+
+    metadata = DocumentMetadata(**{k: v for k, v in fields.items() if k in DocumentMetadata.model_fields})
+    try:
+        store_cached_metadata(content_hash, metadata, sources)
+    except Exception as exc:
+        logger.warning("Could not cache metadata for %s: %s", file_path, exc)
+    return metadata
@@ -1,14 +1,48 @@
 import io
+import logging
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import urllib3
 from minio import Minio
 
+logger = logging.getLogger(__name__)
+
+# Connections kept open by the per-process client; should cover the upload concurrency.
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "16"))
+MINIO_UPLOAD_CONCURRENCY = int(os.getenv("MINIO_UPLOAD_CONCURRENCY", "8"))
+
+_client: Optional[Minio] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
 
 def get_minio_client() -> Minio:
-    endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
-    access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-    secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
-    secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
-    return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+    """Shared client for this process; its urllib3 pool is reused by every call and thread."""
+    global _client, _client_pid
+    with _client_lock:
+        # Connection pools must not cross a fork.
+        if _client is None or _client_pid != os.getpid():
+            endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
+            access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+            secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
+            secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
+            http_client = urllib3.PoolManager(
+                maxsize=MINIO_POOL_SIZE,
+                timeout=urllib3.Timeout(connect=30, read=300),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            )
+            _client = Minio(
+                endpoint,
+                access_key=access_key,
+                secret_key=secret_key,
+                secure=secure,
+                http_client=http_client,
+            )
+            _client_pid = os.getpid()
+        return _client
 
 
 def download_from_minio(filename: str, bucket: str = "uploads") -> str:
@@ -18,6 +52,28 @@ def download_from_minio(filename: str, bucket: str = "uploads") -> str:
     return local_path
 
 
+def get_object_sha256(filename: str, bucket: str = "uploads") -> Optional[str]:
+    """Returns the content hash the backend stored as object metadata, if any."""
+    client = get_minio_client()
+    try:
+        stat = client.stat_object(bucket, filename)
+    except Exception:
+        return None
+    metadata = stat.metadata or {}
+    for key, value in metadata.items():
+        if key.lower() == "x-amz-meta-sha256":
+            return value
+    return None
+
+
+def object_exists(bucket: str, object_name: str) -> bool:
+    try:
+        get_minio_client().stat_object(bucket, object_name)
+    except Exception:
+        return False
+    return True
+
+
 def upload_bytes_to_minio(
     bucket: str,
     object_name: str,
@@ -34,3 +90,67 @@ def upload_bytes_to_minio(
         length=len(data),
         content_type=content_type,
     )
+
+
+class MinioUploader:
+    """
+    Bounded concurrent uploader. `submit` blocks once `max_pending` objects are
+    queued; `flush` waits for everything submitted and returns the per-object
+    failures as (object_name, error) pairs. Objects that already exist are
+    skipped when `skip_existing` is set.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        *,
+        concurrency: int = MINIO_UPLOAD_CONCURRENCY,
+        max_pending: Optional[int] = None,
+        skip_existing: bool = False,
+    ):
+        self.bucket = bucket
+        self.skip_existing = skip_existing
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="minio-upload")
+        self._slots = threading.BoundedSemaphore(max_pending or max(1, concurrency) * 2)
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _put(self, object_name: str, data: bytes, content_type: str) -> bool:
+        try:
+            if self.skip_existing and object_exists(self.bucket, object_name):
+                logger.info("Already in MinIO: %s/%s", self.bucket, object_name)
+                return False
+            upload_bytes_to_minio(self.bucket, object_name, data, content_type=content_type)
+            logger.info("Uploaded to MinIO: %s/%s", self.bucket, object_name)
+            return True
+        finally:
+            self._slots.release()
+
+    def submit(self, object_name: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        with self._lock:
+            if object_name in self._futures:
+                return
+        self._slots.acquire()
+        future = self._executor.submit(self._put, object_name, data, content_type)
+        with self._lock:
+            self._futures[object_name] = future
+
+    def flush(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            futures = dict(self._futures)
+        failures = []
+        for object_name, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                logger.error("Upload of %s/%s failed: %s", self.bucket, object_name, error)
+                failures.append((object_name, str(error)))
+        return failures
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "MinioUploader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,112 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 0 or 1 keeps every stage in the calling process.
+PDF_WORKER_PROCESSES = int(os.getenv("PDF_WORKER_PROCESSES", "0"))
+# Shards smaller than this are not worth the pickling/IPC overhead.
+MIN_PAGES_PER_SHARD = int(os.getenv("PDF_MIN_PAGES_PER_SHARD", "20"))
+# Processes rendering figure screenshots; 0 renders in the calling process.
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", "2"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_render_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def parallel_enabled() -> bool:
+    return PDF_WORKER_PROCESSES > 1
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared process pool, or None when page sharding is disabled."""
+    global _pool
+    if not parallel_enabled():
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs threads, forking it is not safe.
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info("Started page process pool with %s workers", PDF_WORKER_PROCESSES)
+        return _pool
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the shared rendering pool, or None when rendering stays in-process
+    (disabled, or already running inside a pool worker).
+    """
+    global _render_pool
+    if PDF_RENDER_PROCESSES < 1 or multiprocessing.parent_process() is not None:
+        return None
+    with _pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info("Started render process pool with %s workers", PDF_RENDER_PROCESSES)
+        return _render_pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool, _render_pool
+    with _pool_lock:
+        for pool in (_pool, _render_pool):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _render_pool = None
+
+
+def shard_pages(page_indices: Sequence[int], max_shards: int) -> List[List[int]]:
+    """Splits page indices into contiguous, ordered shards."""
+    pages = list(page_indices)
+    if not pages:
+        return []
+    shard_count = max(1, min(max_shards, math.ceil(len(pages) / MIN_PAGES_PER_SHARD)))
+    size = math.ceil(len(pages) / shard_count)
+    return [pages[i : i + size] for i in range(0, len(pages), size)]
+
+
+def map_page_shards(
+    fn: Callable[..., list],
+    page_indices: Sequence[int],
+    *args,
+    shard_args: Optional[Callable[[List[int]], tuple]] = None,
+    **kwargs,
+) -> Optional[list]:
+    """
+    Runs `fn(shard, *args, **kwargs)` for each page shard on the process pool and
+    concatenates the returned lists in page order.
+    `shard_args` can supply extra per-shard positional arguments (appended after `args`).
+    Returns None when sharding is disabled or not worthwhile, so callers fall back
+    to their sequential path.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return None
+
+    shards = shard_pages(page_indices, PDF_WORKER_PROCESSES * 2)
+    if len(shards) <= 1:
+        return None
+
+    futures = []
+    for shard in shards:
+        extra = shard_args(shard) if shard_args else ()
+        futures.append(pool.submit(fn, shard, *args, *extra, **kwargs))
+
+    merged: list = []
+    for future in futures:
+        merged.extend(future.result())
+    logger.info("Processed %s pages in %s shards", len(page_indices), len(shards))
+    return merged
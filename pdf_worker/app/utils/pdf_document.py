@@ -0,0 +1,70 @@
+import logging
+from typing import Iterable, List, Optional
+
+import fitz  # PyMuPDF
+
+from app.models import ParsedDocument, ParsedPage
+from app.utils.parallel import map_page_shards
+
+logger = logging.getLogger(__name__)
+
+
+def parse_page(page) -> ParsedPage:
+    """
+    Parses a single page once. The text page is built a single time (with image
+    blocks preserved) and reused for the plain text, blocks and layout dict views.
+    """
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_DICT)
+
+    lines = page.get_text("text", textpage=textpage).splitlines()
+    blocks = [
+        block for block in page.get_text("blocks", textpage=textpage)
+        if block[6] == 0
+    ]
+    layout = page.get_text("dict", textpage=textpage)
+
+    image_boxes = []
+    for block in layout["blocks"]:
+        if block.get("type") == 1 and "image" in block:
+            image_boxes.append(tuple(block["bbox"]))
+            # Keep the layout small: the raw image payload is never needed downstream.
+            block["image"] = None
+
+    rect = page.rect
+    return ParsedPage(
+        index=page.number,
+        rect=(rect.x0, rect.y0, rect.x1, rect.y1),
+        lines=lines,
+        blocks=blocks,
+        layout=layout,
+        images=page.get_images(full=True),
+        image_boxes=image_boxes,
+    )
+
+
+def _parse_page_shard(page_indices: List[int], pdf_path: str) -> List[ParsedPage]:
+    with fitz.open(pdf_path) as doc:
+        return [parse_page(doc[i]) for i in page_indices]
+
+
+def parse_pdf(pdf_path: str, page_range: Optional[Iterable[int]] = None) -> ParsedDocument:
+    """
+    Parses the PDF (or the given page indices) in a single traversal.
+    Large documents are sharded across the page process pool when it is enabled.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+        metadata = dict(doc.metadata or {})
+        indices = list(range(page_count)) if page_range is None else list(page_range)
+
+        pages = map_page_shards(_parse_page_shard, indices, pdf_path)
+        if pages is None:
+            pages = [parse_page(doc[i]) for i in indices]
+
+    logger.info("Parsed %s/%s pages of %s", len(pages), page_count, pdf_path)
+    return ParsedDocument(
+        path=pdf_path,
+        page_count=page_count,
+        metadata=metadata,
+        pages=pages,
+    )
@@ -1,38 +1,139 @@
 import logging
-from typing import List
+from typing import Callable, List, Optional
 
-import fitz  # PyMuPDF
-
-from app.models import ImageMetadata
+from app.models import EmbeddedChunkBatch, ImageMetadata
+from app.utils.checkpoints import checkpointed, clear_checkpoints, embedded_chunk_ids, mark_chunks_embedded
 from app.utils.cleaning.clean_text_pipeline import clean_document_text
+from app.utils.dedupe import mark_duplicates
 from app.utils.embed_captions import embed_and_store_captions
-from app.utils.embedding import embed_chunks_streaming
-from app.utils.es import save_chunks_to_es
+from app.utils.embedding import embed_chunks_streaming, encoding
+from app.utils.es import CAPTIONS, PDF_CHUNKS, chunk_doc_id, ingest_mode, save_chunks_to_es, save_document_record
 from app.utils.image_extraction import process_images_and_captions
-from app.utils.language import detect_language_from_pages
-from app.utils.text_chunker import chunk_text
-from app.utils.structure import detect_section_patterns_from_pages
+from app.utils.language import detect_chunk_languages, detect_language_from_pages
+from app.utils.pdf_document import parse_pdf
+from app.utils.text_chunker import chunk_mode_options, chunk_text
+from app.utils.versioning import carry_over_vectors, previous_version, retire_previous_version
+from app.utils.structure import detect_section_patterns_from_pages, source_fingerprint
 
 logger = logging.getLogger(__name__)
 
 
-def process_pdf(file_path: str, book_id: str, source_pdf: str) -> dict:
+ProgressFn = Callable[[str, int], None]
+
+
+def report_progress(progress: Optional[ProgressFn], stage: str, percent: int) -> None:
+    if progress is not None:
+        progress(stage, percent)
+
+
+def embed_pending_chunks(
+    document_id: str,
+    chunks: List[dict],
+    save_fn: Callable[[EmbeddedChunkBatch], dict],
+    progress: Optional[ProgressFn] = None,
+) -> None:
+    """
+    Embeds and saves only the chunks not yet recorded as indexed for `document_id`.
+    A batch is recorded once its bulk write reports no failures; a batch with failures
+    raises, so the job fails and a re-run embeds only the chunks still missing.
+    Returns normally only when every chunk is recorded as indexed.
+    """
+    chunk_ids = [chunk_doc_id(document_id, c) for c in chunks]
+    done_ids = embedded_chunk_ids(document_id)
+    pending = [c for c, chunk_id in zip(chunks, chunk_ids) if chunk_id not in done_ids]
+    if done_ids:
+        logger.info(
+            "Resuming embeddings for %s: %s/%s chunks already indexed",
+            document_id,
+            len(chunks) - len(pending),
+            len(chunks),
+        )
+
+    def _save_and_mark(batch) -> dict:
+        result = save_fn(batch) or {}
+        if result.get("fail"):
+            raise RuntimeError(
+                f"Indexing {result['fail']} of {len(batch)} chunks of {document_id} failed: "
+                f"{result.get('error') or result.get('errors')}"
+            )
+        mark_chunks_embedded(document_id, [chunk_doc_id(document_id, c) for c in batch.rows()])
+        return result
+
+    already = len(chunks) - len(pending)
+    embed_chunks_streaming(
+        pending,
+        progress=lambda done, total: report_progress(
+            progress, "embedding", 50 + (45 * (already + done)) // max(len(chunks), 1)
+        ),
+        save_fn=_save_and_mark,
+    )
+
+    missing = set(chunk_ids) - embedded_chunk_ids(document_id)
+    if missing:
+        raise RuntimeError(f"{len(missing)} chunks of {document_id} were not indexed")
+
+
+def _image_records_dump(records: List[ImageMetadata]) -> list:
+    return [r.model_dump() for r in records]
+
+
+def _image_records_load(payload: list) -> List[ImageMetadata]:
+    return [ImageMetadata(**r) for r in payload]
+
+
+def process_pdf(
+    file_path: str,
+    book_id: str,
+    source_pdf: str,
+    *,
+    progress: Optional[ProgressFn] = None,
+) -> dict:
+    """
+    Runs the full ingestion. Every stage's output is checkpointed under `source_pdf`,
+    so a re-run after a failure skips completed stages and embeds only missing chunks.
+    """
     logger.info("Starting full processing for: %s", source_pdf)
 
-    cleaned_pages = clean_document_text(file_path)
-    language_info = detect_language_from_pages(cleaned_pages)
+    parsed = {}
+
+    def _document():
+        if "document" not in parsed:
+            parsed["document"] = parse_pdf(file_path)
+        return parsed["document"]
+
+    report_progress(progress, "parsing", 5)
+    cleaned_pages = checkpointed(
+        source_pdf,
+        "cleaned_pages",
+        lambda: clean_document_text(file_path, document=_document()),
+    )
+    report_progress(progress, "language", 20)
+    language_info = checkpointed(
+        source_pdf,
+        "language",
+        lambda: detect_language_from_pages(cleaned_pages),
+    )
     language_code = language_info.get("code")
     language_name = language_info.get("name")
 
-    with fitz.open(file_path) as doc:
-        page_range = list(range(len(doc)))
-
-    image_records: List[ImageMetadata] = process_images_and_captions(
-        pdf_path=file_path,
-        page_range=page_range,
-        book_id=book_id,
+    report_progress(progress, "images", 25)
+    image_records: List[ImageMetadata] = checkpointed(
+        source_pdf,
+        "images",
+        lambda: process_images_and_captions(
+            pdf_path=file_path,
+            page_range=list(range(_document().page_count)),
+            book_id=book_id,
+            document=_document(),
+        ),
+        dump=_image_records_dump,
+        load=_image_records_load,
     )
+    # Taken while the parsed document is still in memory; section detection runs later.
+    fingerprint = checkpointed(source_pdf, "source_fingerprint", lambda: source_fingerprint(_document()))
+    parsed.clear()
 
+    cleaned_pages = list(cleaned_pages)
     for img in image_records:
         if img.caption and img.caption.strip():
             page_idx = img.page_number - 1
@@ -43,44 +144,88 @@ def process_pdf(file_path: str, book_id: str, source_pdf: str) -> dict:
                     if img.caption.strip() not in line.strip()
                 )
 
-    section_patterns = detect_section_patterns_from_pages(
-        cleaned_pages,
-        language_code=language_code,
+    report_progress(progress, "sections", 40)
+    section_patterns = checkpointed(
+        source_pdf,
+        "section_patterns",
+        lambda: detect_section_patterns_from_pages(
+            cleaned_pages,
+            language_code=language_code,
+            fingerprint=fingerprint,
+        ),
     )
     if section_patterns:
         logger.info("Detected section patterns for %s: %s", source_pdf, section_patterns)
     else:
         logger.info("No section patterns detected for %s", source_pdf)
-    chunks = chunk_text(
-        cleaned_pages,
-        chunk_sizes=[800, 1600],
-        language_code=language_code,
-        section_patterns=section_patterns,
+    report_progress(progress, "chunking", 45)
+    chunks = checkpointed(
+        source_pdf,
+        "chunks",
+        lambda: detect_chunk_languages(
+            chunk_text(
+                cleaned_pages,
+                **chunk_mode_options(),
+                language_code=language_code,
+                section_patterns=section_patterns,
+                encoding=encoding,
+            ),
+            default_code=language_code,
+        ),
     )
     logger.info("Total chunks created: %s", len(chunks))
 
-    embed_chunks_streaming(
-        chunks,
-        save_fn=lambda batch: save_chunks_to_es(
+    # An amended upload only embeds the chunks that differ from its predecessor.
+    previous = previous_version(source_pdf)
+    reuse = carry_over_vectors(previous, chunks) if previous else {}
+    # Passages already in the corpus share its dup_group; exact repeats reuse its vectors.
+    duplicates = mark_duplicates(source_pdf, chunks, previous=previous)
+
+    with ingest_mode(PDF_CHUNKS, CAPTIONS):
+        report_progress(progress, "embedding", 50)
+        embed_pending_chunks(
             source_pdf,
-            batch,
-            book_id=book_id,
-            source_pdf=source_pdf,
-            language=language_code,
-            language_name=language_name,
-            section_patterns=section_patterns,
-        ),
-    )
+            chunks,
+            progress=progress,
+            save_fn=lambda batch: save_chunks_to_es(
+                source_pdf,
+                batch,
+                book_id=book_id,
+                source_pdf=source_pdf,
+                language=language_code,
+                language_name=language_name,
+                section_patterns=section_patterns,
+            ),
+        )
 
-    embed_and_store_captions(
-        image_records,
+        report_progress(progress, "captions", 95)
+        checkpointed(
+            source_pdf,
+            "captions",
+            lambda: embed_and_store_captions(
+                image_records,
+                language=language_code,
+                language_name=language_name,
+                section_patterns=section_patterns,
+            ),
+        )
+
+    chunks_count = len(chunks)
+    captions_indexed = len([r for r in image_records if r.caption and r.caption.strip()])
+    save_document_record(
+        source_pdf,
+        book_id=book_id,
+        source_pdf=source_pdf,
         language=language_code,
         language_name=language_name,
         section_patterns=section_patterns,
+        chunks=chunks_count,
+        captions=captions_indexed,
     )
-
-    chunks_count = len(chunks)
-    captions_indexed = len([r for r in image_records if r.caption and r.caption.strip()])
+    if previous:
+        # embed_pending_chunks has raised unless every chunk was indexed.
+        retire_previous_version(source_pdf, previous, expected_chunks=len(chunks))
+    clear_checkpoints(source_pdf)
     logger.info("Finished processing: %s", source_pdf)
 
     return {
@@ -90,4 +235,7 @@ def process_pdf(file_path: str, book_id: str, source_pdf: str) -> dict:
         "language": language_code,
         "language_name": language_name,
         "section_patterns": section_patterns,
+        "previous_version": previous,
+        "chunks_reused": reuse.get("reused", 0),
+        "chunks_duplicate": duplicates["duplicates"],
     }
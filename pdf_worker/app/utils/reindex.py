@@ -0,0 +1,244 @@
+"""
+Rebuilds pdf_chunks or captions into a new generation and swaps the alias.
+
+    python -m app.utils.reindex rebuild pdf_chunks [--no-swap] [--delete-old]
+    python -m app.utils.reindex swap pdf_chunks [--delete-old]
+
+A rebuild creates {name}_v{N+1} with the current mapping settings (ES_DOC_LAYOUT,
+EMBEDDING_DIMENSIONS, ES_VECTOR_INDEX_TYPE) and exposes it as {name}_next, which
+ingestion writes to as well. Every document of the live generation is then copied,
+reusing its stored vector when the embedding is unchanged; other vectors come from
+the embedding cache or are embedded again. Queries keep hitting the live generation
+until the alias is swapped in one atomic request.
+
+To change chunking, run `rebuild --no-swap`, re-ingest the documents with force
+(they land in the new generation too), then `swap`.
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Iterator, List, Optional
+
+from elasticsearch import helpers
+
+from app.utils.es import (
+    ALIAS_CACHE_SECONDS,
+    CAPTIONS,
+    PDF_CHUNKS,
+    PDF_DOCUMENTS,
+    VERSIONED_INDICES,
+    _mapping_for,
+    alias_target,
+    bulk_index,
+    caption_action,
+    chunk_action,
+    create_index,
+    describe_index,
+    embedding_version,
+    es,
+    generation_name,
+    generations,
+    next_alias,
+    resolve_index,
+    restorable_settings,
+)
+from app.utils.language_profiles import LANGUAGE_NAMES
+
+logger = logging.getLogger(__name__)
+
+REINDEX_BATCH_SIZE = 500
+CHUNK_FIELDS = (
+    "filename", "source_pdf", "language", "chunk_size", "chunk_index", "pages", "dup_group", "section_index",
+)
+CAPTION_FIELDS = ("source_pdf", "filename", "page_number", "xref", "language")
+DOCUMENT_FIELDS = ("book_id", "source_pdf", "language", "language_name", "section_patterns")
+
+
+def start_generation(logical: str) -> str:
+    """Creates the next generation of `logical` and points {logical}_next at it."""
+    pending = alias_target(next_alias(logical))
+    if pending:
+        logger.info("Resuming the rebuild of %s into %s", logical, pending)
+        return pending
+    existing = generations(logical)
+    name = generation_name(logical, existing[-1][0] + 1 if existing else 1)
+    # Built without replicas or refreshes; promote_generation restores both.
+    create_index(
+        name,
+        _mapping_for(logical),
+        settings={"index.refresh_interval": "-1", "index.number_of_replicas": 0},
+        aliases={next_alias(logical): {}},
+    )
+    logger.info("Created %s as %s", name, next_alias(logical))
+    return name
+
+
+class _DocumentRecords:
+    """Document-level attributes from pdf_documents, for sources in the compact layout."""
+
+    def __init__(self):
+        self._records: Dict[str, dict] = {}
+
+    def get(self, filename: str) -> dict:
+        if filename not in self._records:
+            try:
+                found = es.get(index=PDF_DOCUMENTS, id=filename, source_includes=list(DOCUMENT_FIELDS))
+                self._records[filename] = found.get("_source", {}) or {}
+            except Exception:
+                self._records[filename] = {}
+        return self._records[filename]
+
+
+def _fields(logical: str, hit: dict, compact: bool, records: _DocumentRecords) -> dict:
+    src = hit.get("_source", {}) or {}
+    # Full-layout sources repeat everything at the top level; compact ones only under metadata.
+    flat = (src.get("metadata") or {}) if compact else src
+    names = CHUNK_FIELDS if logical == PDF_CHUNKS else CAPTION_FIELDS
+    fields = {name: flat.get(name) for name in names}
+    if compact:
+        # Chunk-level values (e.g. a chunk's own language) win over the document's.
+        record = records.get(fields.get("source_pdf") or fields.get("filename") or "")
+        for name, value in record.items():
+            if fields.get(name) is None:
+                fields[name] = value
+        if fields.get("language") != record.get("language"):
+            fields["language_name"] = LANGUAGE_NAMES.get(fields.get("language"), record.get("language_name"))
+    else:
+        fields.update({name: flat.get(name) for name in DOCUMENT_FIELDS if name not in fields})
+    fields["source_pdf"] = fields.get("source_pdf") or fields.get("filename")
+    if logical == PDF_CHUNKS:
+        # Offsets and neighbour links are written back as chunk_action expects them.
+        meta = src.get("metadata") or {}
+        fields["start"], fields["end"] = meta.get("start_offset"), meta.get("end_offset")
+        position = fields.get("chunk_index")
+        fields["prev_index"] = position - 1 if meta.get("prev_id") and position is not None else None
+        fields["next_index"] = position + 1 if meta.get("next_id") and position is not None else None
+    return fields
+
+
+def _batches(source: str, size: int, with_vectors: bool) -> Iterator[List[dict]]:
+    query = {"query": {"match_all": {}}}
+    if not with_vectors:
+        query["_source"] = {"excludes": ["vector"]}
+    batch: List[dict] = []
+    for hit in helpers.scan(es, index=source, query=query, size=size):
+        batch.append(hit)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def copy_generation(logical: str, source: str, target: str, batch_size: int = REINDEX_BATCH_SIZE) -> dict:
+    """
+    Copies every document of `source` into `target`. Stored vectors are reused when
+    both hold the same embedding; the rest go through the cached embedder.
+    Documents ingestion already wrote into `target` are left as they are.
+    """
+    from app.utils.embedding import embedding_model
+
+    source_info = describe_index(source)
+    reuse = source_info["embedding"] == describe_index(target)["embedding"] == embedding_version()
+    compact = source_info["layout"] == "compact"
+    build = chunk_action if logical == PDF_CHUNKS else caption_action
+    records = _DocumentRecords()
+    totals = {"items": 0, "success": 0, "fail": 0, "reused": 0, "embedded": 0}
+
+    for batch in _batches(source, batch_size, with_vectors=reuse and not compact):
+        texts = [(hit.get("_source", {}) or {}).get("text") or "" for hit in batch]
+        vectors: List[Optional[list]] = [
+            (hit.get("_source", {}) or {}).get("vector") if reuse else None for hit in batch
+        ]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            for i, vec in zip(missing, embedding_model.embed_documents([texts[i] for i in missing])):
+                vectors[i] = vec
+        totals["reused"] += len(batch) - len(missing)
+        totals["embedded"] += len(missing)
+
+        actions = [
+            build(target, text, vec, _fields(logical, hit, compact, records), op_type="create")
+            for hit, text, vec in zip(batch, texts, vectors)
+        ]
+        result = bulk_index(
+            actions,
+            document_of=lambda action: action["_source"]["metadata"].get("source_pdf")
+            or action["_source"]["metadata"].get("filename"),
+            ignore_status=(409,),
+        )
+        for key in ("items", "success", "fail"):
+            totals[key] += result[key]
+        logger.info("Copied %s/%s documents into %s", totals["success"], totals["items"], target)
+    return totals
+
+
+def promote_generation(logical: str, *, delete_old: bool = False) -> str:
+    """
+    Atomically points `logical` at the generation behind {logical}_next. A pre-alias
+    index of the same name is deleted in the same request, since an alias cannot
+    share its name; older generations are kept unless `delete_old` is set.
+    """
+    pending = alias_target(next_alias(logical))
+    if pending is None:
+        raise RuntimeError(f"No generation of {logical} is being rebuilt")
+    current, _ = resolve_index(logical, refresh=True)
+
+    # Not the ingest-mode values, should the live generation be in ingest mode.
+    es.indices.put_settings(index=pending, settings=restorable_settings(current))
+    es.indices.refresh(index=pending)
+
+    actions = [
+        {"add": {"index": pending, "alias": logical, "is_write_index": True}},
+        {"remove": {"index": pending, "alias": next_alias(logical)}},
+    ]
+    if current == logical or delete_old:
+        actions.append({"remove_index": {"index": current}})
+    else:
+        actions.append({"remove": {"index": current, "alias": logical}})
+    es.indices.update_aliases(actions=actions)
+    resolve_index(logical, refresh=True)
+    logger.info("%s now serves from %s (was %s)", logical, pending, current)
+    return pending
+
+
+def rebuild(logical: str, *, swap: bool = True, delete_old: bool = False) -> dict:
+    if logical not in VERSIONED_INDICES:
+        raise ValueError(f"{logical} is not a versioned index")
+    source, _ = resolve_index(logical, refresh=True)
+    target = start_generation(logical)
+    # Workers notice {logical}_next within ALIAS_CACHE_SECONDS; after that nothing
+    # they write can be missing from the copy, once it is visible to the scroll
+    # (the source may not refresh on its own, e.g. in ingest mode).
+    time.sleep(ALIAS_CACHE_SECONDS)
+    es.indices.refresh(index=source)
+
+    started = time.monotonic()
+    totals = copy_generation(logical, source, target)
+    totals.update(source=source, target=target, seconds=round(time.monotonic() - started, 1))
+    if totals["fail"]:
+        logger.error("Rebuild of %s left %s documents behind; not swapping", logical, totals["fail"])
+        return totals
+    if swap:
+        promote_generation(logical, delete_old=delete_old)
+        totals["swapped"] = True
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("rebuild", "swap"))
+    parser.add_argument("index", choices=(PDF_CHUNKS, CAPTIONS))
+    parser.add_argument("--no-swap", action="store_true", help="leave the new generation as {index}_next")
+    parser.add_argument("--delete-old", action="store_true", help="drop the replaced generation")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild":
+        print(rebuild(args.index, swap=not args.no_swap, delete_old=args.delete_old))
+    else:
+        print(promote_generation(args.index, delete_old=args.delete_old))
+
+
+if __name__ == "__main__":
+    main()
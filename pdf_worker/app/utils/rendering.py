@@ -0,0 +1,86 @@
+import io
+import logging
+import math
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    dpi: int = 200
+    format: str = "webp"  # webp | jpeg | png
+    quality: int = 85  # ignored for png
+    max_pixels: int = 6_000_000  # the render is scaled down to stay within this budget
+    # Longest side of each derivative; derivatives share the format and quality.
+    derivatives: Tuple[Tuple[str, int], ...] = (("thumb", 256), ("preview", 1024))
+
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    "default": RenderProfile(),
+    "compact": RenderProfile(dpi=150, format="webp", quality=75, max_pixels=2_000_000),
+    "archive": RenderProfile(dpi=300, format="png", max_pixels=40_000_000),
+}
+SCREENSHOT_PROFILE = os.getenv("SCREENSHOT_PROFILE", "default")
+
+
+def get_render_profile(profile=None, *, dpi: Optional[int] = None) -> RenderProfile:
+    """Resolves a profile name or instance (default: SCREENSHOT_PROFILE); `dpi` overrides its dpi."""
+    if profile is None:
+        profile = SCREENSHOT_PROFILE
+    if isinstance(profile, str):
+        if profile not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile '{profile}'")
+        profile = RENDER_PROFILES[profile]
+    if profile.format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported render format '{profile.format}'")
+    return replace(profile, dpi=dpi) if dpi else profile
+
+
+def encode_image(image: Image.Image, profile: RenderProfile) -> bytes:
+    buf = io.BytesIO()
+    if profile.format == "png":
+        image.save(buf, "PNG", optimize=True)
+    elif profile.format == "jpeg":
+        image.convert("RGB").save(buf, "JPEG", quality=profile.quality, optimize=True, progressive=True)
+    else:
+        image.save(buf, "WEBP", quality=profile.quality, method=4)
+    return buf.getvalue()
+
+
+def render_clip(
+    pdf_path: str,
+    page_index: int,
+    clip: Tuple[float, float, float, float],
+    profile: RenderProfile,
+) -> Dict[str, bytes]:
+    """
+    Renders `clip` of a page at the profile's dpi (scaled down to its pixel budget)
+    and encodes the original plus its derivatives. Returns {"original": bytes, name: bytes}.
+    Top-level so it can run in a worker process.
+    """
+    rect = fitz.Rect(clip)
+    zoom = profile.dpi / 72
+    area = rect.width * rect.height * zoom * zoom
+    if profile.max_pixels and area > profile.max_pixels:
+        zoom *= math.sqrt(profile.max_pixels / area)
+
+    with fitz.open(pdf_path) as doc:
+        pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rect, alpha=False)
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    encoded = {"original": encode_image(image, profile)}
+    for name, longest_side in profile.derivatives:
+        if max(image.size) <= longest_side:
+            continue
+        derivative = image.copy()
+        derivative.thumbnail((longest_side, longest_side), Image.LANCZOS)
+        encoded[name] = encode_image(derivative, profile)
+    return encoded
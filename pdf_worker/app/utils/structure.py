@@ -1,12 +1,47 @@
+import hashlib
 import json
 import logging
 import os
-from typing import Dict, List, Optional
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
 
-from langchain_openai import ChatOpenAI
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.db import SessionLocal
+from app.db.models.section_pattern_orm import SectionPatternORM
+from app.models import ParsedDocument
+from app.utils.openai_scheduler import Priority, ScheduledChatOpenAI
+from app.utils.text_chunker import SECTION_PATTERNS, _normalize_section_patterns
 
 logger = logging.getLogger(__name__)
 
+# Heading shapes tried besides SECTION_PATTERNS (matched case-insensitively at line start).
+LEGAL_HEADING_SHAPES = [
+    r"Art\.\s*\d+(?:er)?[A-Za-z0-9\-\.]*",
+    r"Article\s+\d+(?:er)?[A-Za-z0-9\-\.]*",
+    r"Artikel\s+\d+[A-Za-z0-9\-\.]*",
+    r"CHAPITRE\s+[IVXLC0-9]+",
+    r"TITRE\s+[IVXLC0-9]+",
+    r"LIVRE\s+[IVXLC0-9]+",
+    r"BOEK\s+[IVXLC0-9]+",
+    r"ONDERAFDELING\s+[IVXLC0-9]+",
+    r"Kapitel\s+[IVXLC0-9]+",
+    r"Abschnitt\s+[IVXLC0-9]+",
+    r"\d+(?:\.\d+)+\.?\s+(?=[A-Z])",
+]
+# A candidate needs this confidence to be used without asking the LLM.
+SECTION_MIN_CONFIDENCE = float(os.getenv("SECTION_MIN_CONFIDENCE", "0.5"))
+# Matches needed for full support; fewer scale the confidence down.
+SECTION_FULL_SUPPORT = 8
+SECTION_MIN_MATCHES = 3
+# More headings than this per 1,000 characters means the pattern matches body text.
+SECTION_MAX_DENSITY = 10.0
+
+_NUMBER = re.compile(r"\d+|\b[IVXLC]+\b", flags=re.IGNORECASE)
+_ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+
 
 def _parse_json(content: str) -> Dict[str, object]:
     start = content.find("{")
@@ -33,7 +68,7 @@ def detect_section_patterns(
         logger.warning("OPENAI_API_KEY not set; section detection skipped.")
         return []
 
-    llm = ChatOpenAI(model=model, temperature=0, max_tokens=180)
+    llm = ScheduledChatOpenAI(model=model, temperature=0, max_tokens=180, priority=Priority.BULK)
     language_hint = f"Language code: {language_code}." if language_code else "Language code: unknown."
     prompt = (
         "You are analyzing a legal document sample. Identify how section headings are written.\n"
@@ -52,11 +87,196 @@ def detect_section_patterns(
     return [p for p in patterns if isinstance(p, str) and p.strip()]
 
 
+def _heading_number(heading: str) -> Optional[int]:
+    match = _NUMBER.search(heading)
+    if not match:
+        return None
+    token = match.group(0).lower()
+    if token.isdigit():
+        return int(token)
+    values = [_ROMAN[ch] for ch in token]
+    return sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values))
+
+
+def _ordering(numbers: List[Optional[int]]) -> float:
+    """Share of consecutive headings that continue (n+1), repeat (bis/ter) or restart at 1."""
+    numbers = [n for n in numbers if n is not None]
+    if len(numbers) < 2:
+        return 0.0
+    steps = sum(1 for a, b in zip(numbers, numbers[1:]) if b in (a, a + 1) or b == 1)
+    return steps / (len(numbers) - 1)
+
+
+def score_section_patterns(
+    pages: List[str],
+    *,
+    language_code: Optional[str] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Scores the built-in section patterns and common legal heading shapes against
+    the document by match count, density and numbering order. Returns
+    (pattern, confidence) pairs, best first, without patterns whose headings
+    are all already matched by a better one.
+    """
+    text = "\n\n".join(page for page in pages if page)
+    if not text.strip():
+        return []
+
+    preferred = SECTION_PATTERNS.get(language_code or "", [])
+    candidates = list(dict.fromkeys(
+        preferred + [p for patterns in SECTION_PATTERNS.values() for p in patterns] + LEGAL_HEADING_SHAPES
+    ))
+
+    scored: List[Tuple[str, float, Set[int]]] = []
+    for pattern in candidates:
+        anchored = _normalize_section_patterns([pattern])[0]
+        matches = list(re.finditer(anchored, text, flags=re.IGNORECASE))
+        if len(matches) < SECTION_MIN_MATCHES:
+            continue
+        density = len(matches) / max(1.0, len(text) / 1000)
+        if density > SECTION_MAX_DENSITY:
+            continue
+        order = _ordering([_heading_number(m.group(0)) for m in matches])
+        support = min(1.0, len(matches) / SECTION_FULL_SUPPORT)
+        confidence = support * order
+        if pattern in preferred:
+            confidence = min(1.0, confidence * 1.1)
+        scored.append((pattern, confidence, {m.end() for m in matches}))
+
+    scored.sort(key=lambda item: item[1], reverse=True)
+    kept: List[Tuple[str, float]] = []
+    covered: Set[int] = set()
+    for pattern, confidence, positions in scored:
+        if positions <= covered:
+            continue
+        covered |= positions
+        kept.append((pattern, confidence))
+    return kept
+
+
+def source_fingerprint(document: ParsedDocument, max_pages: int = 50, min_share: float = 0.3) -> Optional[str]:
+    """
+    Identifies the publisher/series of a PDF by its running headers and footers
+    (digits masked), refined by its author/creator metadata. None without running
+    headers: creator strings alone ("microsoft word") are shared by unrelated sources.
+    """
+    pages = document.pages[:max_pages]
+    counts: Counter = Counter()
+    for page in pages:
+        lines = [line.strip().lower() for line in page.lines if line.strip()]
+        edge = set(lines[:2] + lines[-2:])
+        counts.update(re.sub(r"\d+", "#", line) for line in edge)
+    running = sorted(line for line, n in counts.items() if len(pages) > 1 and n >= min_share * len(pages))
+    if not running:
+        return None
+
+    metadata = document.metadata or {}
+    owners = [str(metadata.get(key) or "").strip().lower() for key in ("author", "creator")]
+    key = json.dumps({"running": running, "owners": owners}, ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_cached_patterns(fingerprint: str) -> Optional[List[str]]:
+    db = SessionLocal()
+    try:
+        row = db.get(SectionPatternORM, fingerprint)
+        return list(row.patterns) if row is not None else None
+    finally:
+        db.close()
+
+
+def store_cached_patterns(fingerprint: str, patterns: List[str], confidence: Optional[float]) -> None:
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(SectionPatternORM.__table__).values(
+            fingerprint=fingerprint,
+            patterns=patterns,
+            confidence=confidence,
+            documents=1,
+            updated_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["fingerprint"],
+            set_={
+                "patterns": stmt.excluded.patterns,
+                "confidence": stmt.excluded.confidence,
+                "documents": SectionPatternORM.__table__.c.documents + 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _touch_cached_patterns(fingerprint: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(SectionPatternORM).filter(SectionPatternORM.fingerprint == fingerprint).update(
+            {"documents": SectionPatternORM.documents + 1, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _count_matches(text: str, patterns: List[str]) -> int:
+    return sum(
+        len(re.findall(pattern, text, flags=re.IGNORECASE)) for pattern in _normalize_section_patterns(patterns)
+    )
+
+
 def detect_section_patterns_from_pages(
     pages: List[str],
     *,
     language_code: Optional[str] = None,
     max_chars: int = 6000,
+    fingerprint: Optional[str] = None,
+) -> List[str]:
+    """
+    Section heading patterns for the document: the patterns cached for its
+    source `fingerprint` if they still match, else the locally scored candidates
+    above SECTION_MIN_CONFIDENCE, else the LLM's answer on a text sample.
+    """
+    if fingerprint:
+        try:
+            cached = load_cached_patterns(fingerprint)
+        except Exception as exc:
+            logger.warning("Section pattern cache unavailable: %s", exc)
+            cached, fingerprint = None, None
+        if cached and _count_matches("\n\n".join(pages), cached) >= 2:
+            logger.info("Using cached section patterns for source %s: %s", fingerprint[:12], cached)
+            try:
+                _touch_cached_patterns(fingerprint)
+            except Exception as exc:
+                logger.warning("Section pattern cache unavailable: %s", exc)
+            return cached
+
+    scored = score_section_patterns(pages, language_code=language_code)
+    confident = [(pattern, conf) for pattern, conf in scored if conf >= SECTION_MIN_CONFIDENCE]
+    if confident:
+        patterns = [pattern for pattern, _ in confident]
+        confidence = min(conf for _, conf in confident)
+        logger.info("Section patterns detected locally: %s", confident)
+    else:
+        patterns = _detect_section_patterns_with_llm(pages, language_code=language_code, max_chars=max_chars)
+        confidence = None
+
+    if fingerprint and patterns:
+        try:
+            store_cached_patterns(fingerprint, patterns, confidence)
+        except Exception as exc:
+            logger.warning("Section pattern cache unavailable: %s", exc)
+    return patterns
+
+
+def _detect_section_patterns_with_llm(
+    pages: List[str],
+    *,
+    language_code: Optional[str] = None,
+    max_chars: int = 6000,
 ) -> List[str]:
     sample = ""
     for page in pages:
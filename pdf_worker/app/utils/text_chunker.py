@@ -1,8 +1,15 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Dict, Optional
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Optional, Tuple
+import os
 import re
 
 
+# "multi" embeds every passage at both sizes. "small_to_big" embeds the small chunks
+# only and links each to its neighbours, which search expands hits with.
+CHUNK_MODES = {"multi": [800, 1600], "small_to_big": [800]}
+CHUNK_MODE = os.getenv("CHUNK_MODE", "multi")
+
+
 SECTION_PATTERNS = {
     "en": [
         r"Article\s+\d+[A-Za-z0-9\-\.]*",
@@ -28,6 +35,14 @@ NOISE_LINE_PATTERNS = [
 ]
 
 
+def chunk_mode_options(mode: Optional[str] = None) -> Dict:
+    """chunk_text keyword arguments for a CHUNK_MODES name (default: CHUNK_MODE)."""
+    mode = mode or CHUNK_MODE
+    if mode not in CHUNK_MODES:
+        raise ValueError(f"Unknown chunk mode '{mode}'")
+    return {"chunk_sizes": list(CHUNK_MODES[mode]), "link_neighbours": mode == "small_to_big"}
+
+
 def normalize_page_text(page: str) -> str:
     """
     Converts line-based page text to normalized paragraph text.
@@ -103,7 +118,11 @@ def _split_into_sections(full_text: str, patterns: List[str]) -> List[Dict]:
     return sections
 
 
-def _group_short_sections(sections: List[Dict], min_chars: int = 200) -> List[Dict]:
+def _group_short_sections(full_text: str, sections: List[Dict], min_chars: int = 200) -> List[Dict]:
+    """
+    Merges runs of short sections into their neighbours. Sections are contiguous,
+    so a merged section is still a plain slice of `full_text`.
+    """
     if not sections:
         return sections
     grouped: List[Dict] = []
@@ -122,14 +141,10 @@ def _group_short_sections(sections: List[Dict], min_chars: int = 200) -> List[Di
             continue
 
         if buffer is None:
-            buffer = {
-                "start": section["start"],
-                "end": section["end"],
-                "text": text,
-            }
+            buffer = {"start": section["start"], "end": section["end"]}
         else:
-            buffer["text"] = f"{buffer['text']}\n\n{text}"
             buffer["end"] = section["end"]
+        buffer["text"] = full_text[buffer["start"]:buffer["end"]]
 
     if buffer:
         grouped.append(buffer)
@@ -158,7 +173,89 @@ def map_chunk_to_pages(start: int, end: int, page_offsets: List[Dict]) -> List[i
     """
     Returns a list of pages overlapped by the chunk.
     """
-    return [p["page"] for p in page_offsets if p["end"] >= start and p["start"] <= end]
+    # Offsets are ascending, so the overlapped pages form one contiguous run.
+    first = bisect_left(page_offsets, start, key=lambda p: p["end"])
+    last = bisect_right(page_offsets, end, key=lambda p: p["start"])
+    return [p["page"] for p in page_offsets[first:last]]
+
+
+# Break levels in order of preference; each maps a match to the offset a chunk may end at.
+_BREAK_LEVELS = [
+    (re.compile(r"\n[ \t]*\n"), "start"),  # paragraph
+    (re.compile(r"[.!?](?=\s)"), "end"),  # sentence
+    (re.compile(r"\n"), "start"),  # line
+    (re.compile(r"\s+"), "start"),  # word
+]
+_WORD_START = re.compile(r"(?<=\s)\S")
+
+
+def _break_offsets(full_text: str) -> List[List[int]]:
+    """Candidate chunk end offsets per break level, found in one scan of the text each."""
+    return [
+        [m.start() if side == "start" else m.end() for m in pattern.finditer(full_text)]
+        for pattern, side in _BREAK_LEVELS
+    ]
+
+
+def _chunk_spans(
+    full_text: str,
+    start: int,
+    end: int,
+    size: int,
+    overlap: int,
+    breaks: List[List[int]],
+    word_starts: List[int],
+) -> List[Tuple[int, int]]:
+    """
+    Greedy split of full_text[start:end] into spans of at most `size` characters,
+    ending at the most preferred break available and starting the next span
+    `overlap` characters back, on a word boundary.
+    """
+    spans: List[Tuple[int, int]] = []
+    min_len = size // 4
+    pos = _skip_space(full_text, start, end)
+    while pos < end:
+        if end - pos <= size:
+            cut = end
+        else:
+            limit = pos + size
+            cut = limit
+            for offsets in breaks:
+                i = bisect_right(offsets, limit) - 1
+                if i >= 0 and offsets[i] > pos + min_len:
+                    cut = offsets[i]
+                    break
+
+        stop = cut
+        while stop > pos and full_text[stop - 1].isspace():
+            stop -= 1
+        if stop > pos:
+            spans.append((pos, stop))
+        if cut >= end:
+            break
+
+        following = cut
+        if overlap:
+            i = bisect_left(word_starts, cut - overlap)
+            if i < len(word_starts) and pos < word_starts[i] < cut:
+                following = word_starts[i]
+        pos = _skip_space(full_text, following, end)
+    return spans
+
+
+def _skip_space(text: str, pos: int, end: int) -> int:
+    while pos < end and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _token_offsets(text: str, encoding) -> Optional[List[int]]:
+    """Start offset of every token in `text`; encodes the text once."""
+    if encoding is None:
+        return None
+    tokens = encoding.encode(text, disallowed_special=())
+    _, offsets = encoding.decode_with_offsets(tokens)
+    return offsets
 
 
 def chunk_text(
@@ -167,9 +264,17 @@ def chunk_text(
     *,
     language_code: Optional[str] = None,
     section_patterns: Optional[List[str]] = None,
+    encoding=None,
+    link_neighbours: bool = False,
 ) -> List[Dict]:
     """
     Splits cleaned PDF text into multi-size overlapping chunks with page tracking.
+
+    Every chunk carries its (start, end) offsets in the normalized document text
+    and the `section_index` it was cut from. When a tiktoken `encoding` is given,
+    each section is encoded once and every chunk also gets its `token_count`.
+    With `link_neighbours`, chunks also get `prev_index` / `next_index`: the
+    adjacent chunk_index of the same size and section, or None at a boundary.
     """
     # Step 1: Normalize
     normalized_pages = [normalize_page_text(page) for page in cleaned_pages]
@@ -180,57 +285,50 @@ def chunk_text(
         if _count_section_matches(full_text, section_patterns) < 2:
             patterns = _select_section_patterns(language_code)
     sections = _split_into_sections(full_text, patterns)
-    sections = _group_short_sections(sections, min_chars=200)
+    sections = _group_short_sections(full_text, sections, min_chars=200)
 
-    all_chunks = []
+    breaks = _break_offsets(full_text)
+    word_starts = [m.start() for m in _WORD_START.finditer(full_text)]
 
+    spans_by_size: Dict[int, List[Tuple[int, int, Optional[int], int]]] = {size: [] for size in chunk_sizes}
+    for section_index, section in enumerate(sections):
+        section_start, section_end = section["start"], section["end"]
+        if not full_text[section_start:section_end].strip():
+            continue
+        token_offsets = _token_offsets(full_text[section_start:section_end], encoding)
+
+        for size in chunk_sizes:
+            spans = _chunk_spans(
+                full_text, section_start, section_end, size, int(size * 0.2), breaks, word_starts
+            )
+            for start, end in spans:
+                token_count = None
+                if token_offsets is not None:
+                    token_count = bisect_left(token_offsets, end - section_start) - bisect_left(
+                        token_offsets, start - section_start
+                    )
+                spans_by_size[size].append((start, end, token_count, section_index))
+
+    all_chunks = []
     for size in chunk_sizes:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=size,
-            chunk_overlap=int(size * 0.2),
-            separators=["\n\n", ".", "!", "?", "\n", " ", ""]
-        )
-        chunk_index = 0
-
-        for section in sections:
-            section_text = section["text"]
-            if not section_text or not section_text.strip():
-                continue
-
-            if len(section_text) <= size:
-                start = section["start"]
-                end = section["end"]
-                pages = map_chunk_to_pages(start, end, page_offsets)
-                all_chunks.append({
-                    "chunk_size": size,
-                    "chunk_index": chunk_index,
-                    "text": section_text,
-                    "pages": pages
-                })
-                chunk_index += 1
-                continue
-
-            docs = splitter.create_documents([section_text])
-            cursor = 0  # tracks last match within section
-            for doc in docs:
-                content = doc.page_content
-                start_in_section = section_text.find(content, cursor)
-                if start_in_section == -1:
-                    # fallback to brute match
-                    start_in_section = section_text.index(content)
-                end_in_section = start_in_section + len(content)
-                cursor = end_in_section
-
-                start = section["start"] + start_in_section
-                end = section["start"] + end_in_section
-                pages = map_chunk_to_pages(start, end, page_offsets)
-
-                all_chunks.append({
-                    "chunk_size": size,
-                    "chunk_index": chunk_index,
-                    "text": content,
-                    "pages": pages
-                })
-                chunk_index += 1
+        spans = spans_by_size[size]
+        for chunk_index, (start, end, token_count, section_index) in enumerate(spans):
+            chunk = {
+                "chunk_size": size,
+                "chunk_index": chunk_index,
+                "text": full_text[start:end],
+                "pages": map_chunk_to_pages(start, end, page_offsets),
+                "start": start,
+                "end": end,
+                "section_index": section_index,
+            }
+            if token_count is not None:
+                chunk["token_count"] = token_count
+            if link_neighbours:
+                linked_prev = chunk_index > 0 and spans[chunk_index - 1][3] == section_index
+                linked_next = chunk_index + 1 < len(spans) and spans[chunk_index + 1][3] == section_index
+                chunk["prev_index"] = chunk_index - 1 if linked_prev else None
+                chunk["next_index"] = chunk_index + 1 if linked_next else None
+            all_chunks.append(chunk)
 
     return all_chunks
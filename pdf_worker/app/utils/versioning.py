@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from elasticsearch import helpers
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.db import SessionLocal
+from app.db.models.document_version_orm import DocumentVersionORM
+from app.utils.embedding_cache import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, cache_key, get_embedding_cache
+from app.utils.es import (
+    PDF_CHUNKS,
+    chunk_hash,
+    delete_document,
+    describe_index,
+    embedding_version,
+    es,
+    resolve_index,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def link_previous_version(filename: str, previous: str) -> None:
+    """Records that `filename` is an amended upload of `previous`."""
+    if previous == filename:
+        raise ValueError("A document cannot replace itself")
+    db = SessionLocal()
+    try:
+        stmt = pg_insert(DocumentVersionORM.__table__).values(filename=filename, previous=previous)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["filename"],
+            set_={"previous": previous, "linked_at": datetime.utcnow(), "retired_at": None},
+        )
+        db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def previous_version(filename: str) -> Optional[str]:
+    """The predecessor of `filename` that is still indexed, if any."""
+    db = SessionLocal()
+    try:
+        row = db.get(DocumentVersionORM, filename)
+        return row.previous if row is not None and row.retired_at is None else None
+    finally:
+        db.close()
+
+
+def _previous_vectors(previous: str) -> Dict[str, List[float]]:
+    """chunk_hash -> vector for the chunks of `previous` in the live generation."""
+    current, _ = resolve_index(PDF_CHUNKS)
+    if describe_index(current)["embedding"] != embedding_version():
+        return {}
+
+    texts: Dict[str, str] = {}
+    vectors: Dict[str, List[float]] = {}
+    for hit in helpers.scan(
+        es,
+        index=current,
+        query={"query": {"term": {"filename": previous}}},
+        size=500,
+    ):
+        src = hit.get("_source", {}) or {}
+        meta = src.get("metadata") or {}
+        text = src.get("text") or ""
+        key = chunk_hash(src.get("chunk_size", meta.get("chunk_size")), text)
+        if src.get("vector"):
+            vectors[key] = src["vector"]
+        else:
+            texts[key] = text
+
+    # Compact indices keep no vectors in _source; the embedding cache usually still has them.
+    cache = get_embedding_cache() if texts else None
+    if cache is not None:
+        keys = {key: cache_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text) for key, text in texts.items()}
+        cached = cache.get_many(list(keys.values()))
+        for key, cached_key in keys.items():
+            if cached_key in cached:
+                vectors[key] = cached[cached_key]
+    return vectors
+
+
+def carry_over_vectors(previous: str, chunks: List[dict]) -> Dict[str, int]:
+    """
+    Sets `embedding` on every chunk whose content hash matches a chunk of `previous`,
+    so only new or changed chunks are sent to the embedding model.
+    """
+    try:
+        vectors = _previous_vectors(previous)
+    except Exception as exc:
+        logger.warning("Could not read the chunks of %s; embedding everything: %s", previous, exc)
+        return {"reused": 0, "changed": len(chunks)}
+
+    reused = 0
+    for chunk in chunks:
+        vector = vectors.get(chunk_hash(chunk["chunk_size"], chunk["text"]))
+        if vector is not None:
+            chunk["embedding"] = vector
+            reused += 1
+    logger.info(
+        "Versioned re-ingestion against %s: %s of %s chunks unchanged", previous, reused, len(chunks)
+    )
+    return {"reused": reused, "changed": len(chunks) - reused}
+
+
+def retire_previous_version(filename: str, previous: str, expected_chunks: int) -> Dict[str, int]:
+    """
+    Deletes everything indexed for `previous` once `filename` has replaced it.
+    Refuses while fewer than `expected_chunks` chunks of `filename` are searchable.
+    """
+    es.indices.refresh(index=PDF_CHUNKS)
+    indexed = es.count(index=PDF_CHUNKS, query={"term": {"filename": filename}})["count"]
+    if indexed < expected_chunks:
+        raise RuntimeError(
+            f"Only {indexed} of {expected_chunks} chunks of {filename} are indexed; keeping {previous}"
+        )
+    deleted = delete_document(previous)
+    db = SessionLocal()
+    try:
+        row = db.get(DocumentVersionORM, filename)
+        if row is not None:
+            row.retired_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+    logger.info("Retired %s (replaced by %s): %s", previous, filename, deleted)
+    return deleted
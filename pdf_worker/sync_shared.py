@@ -0,0 +1,29 @@
+"""
+Copies the utils the backend shares with the worker into backend/app/utils.
+
+The two services are built from separate Docker contexts, so the backend keeps a
+generated copy of each module in SHARED_MODULES. Edit the worker's module, then run
+`python pdf_worker/sync_shared.py`; tests/test_shared_modules.py fails on drift.
+"""
+from pathlib import Path
+
+SHARED_MODULES = ("embedding_cache.py", "openai_scheduler.py", "language_profiles.py")
+
+SOURCE_DIR = Path(__file__).resolve().parent / "app" / "utils"
+TARGET_DIR = Path(__file__).resolve().parent.parent / "backend" / "app" / "utils"
+
+HEADER = "# Generated from pdf_worker/app/utils/{name} by pdf_worker/sync_shared.py; do not edit.\n\n"
+
+
+def render(name: str) -> str:
+    return HEADER.format(name=name) + (SOURCE_DIR / name).read_text(encoding="utf-8")
+
+
+def sync() -> None:
+    for name in SHARED_MODULES:
+        (TARGET_DIR / name).write_text(render(name), encoding="utf-8")
+        print(f"{SOURCE_DIR / name} -> {TARGET_DIR / name}")
+
+
+if __name__ == "__main__":
+    sync()
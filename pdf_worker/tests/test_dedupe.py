@@ -0,0 +1,78 @@
+import random
+
+from app.utils import dedupe
+from app.utils.embedding_cache import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, digest_key, text_digest
+
+
+class _Cache:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def get_many(self, keys):
+        return {key: self.vectors[key] for key in keys if key in self.vectors}
+
+
+class _Session:
+    def execute(self, stmt):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Row:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _stored(filename, text):
+    fp = dedupe._fingerprint({"chunk_size": 800, "text": text})
+    return _Row(
+        chunk_hash=fp["chunk_hash"], chunk_size=800, text_digest=fp["text_digest"],
+        simhash=dedupe._signed(fp["simhash"]), dup_group=fp["chunk_hash"], filename=filename,
+    )
+
+
+def _setup(monkeypatch, rows, vectors):
+    monkeypatch.setattr(dedupe, "_known", lambda fingerprints, previous=None: [
+        row for row in rows if row.filename != previous
+    ])
+    monkeypatch.setattr(dedupe, "get_embedding_cache", lambda: _Cache(vectors))
+    monkeypatch.setattr(dedupe, "SessionLocal", _Session)
+
+
+def _article(amount):
+    words = random.Random(7).choices(["the", "tenant", "shall", "pay", "rent", "on", "each", "month"], k=130)
+    words[60] = amount
+    return " ".join(words)
+
+
+def test_only_exact_repeats_reuse_the_vector(monkeypatch):
+    original = _article("4000")
+    amended = _article("5000")
+    vector = [0.5] * 3
+    _setup(monkeypatch, [_stored("a.pdf", original)], {
+        digest_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text_digest(original)): vector,
+    })
+    exact = {"chunk_size": 800, "chunk_index": 0, "text": original}
+    near = {"chunk_size": 800, "chunk_index": 1, "text": amended}
+    dedupe.mark_duplicates("b.pdf", [exact, near])
+
+    assert near["dup_group"] == exact["dup_group"]
+    assert exact["embedding"] == vector
+    assert "embedding" not in near
+
+
+def test_previous_version_fingerprints_are_ignored(monkeypatch):
+    original = _article("4000")
+    _setup(monkeypatch, [_stored("a.pdf", original)], {
+        digest_key(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text_digest(original)): [0.5] * 3,
+    })
+    chunk = {"chunk_size": 800, "chunk_index": 0, "text": original}
+    stats = dedupe.mark_duplicates("b.pdf", [chunk], previous="a.pdf")
+
+    assert stats == {"duplicates": 0, "reused": 0}
+    assert "embedding" not in chunk
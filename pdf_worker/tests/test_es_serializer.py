@@ -0,0 +1,31 @@
+import numpy as np
+import orjson
+from elasticsearch import helpers
+
+from app.utils.es import OrjsonSerializer, es
+
+
+def _bulk_lines(actions):
+    serializer = es.transport.serializers.get_serializer("application/json")
+    chunks = list(helpers._chunk_actions(map(helpers.expand_action, actions), 500, 10 * 1024 * 1024, serializer))
+    return [line for _, chunk in chunks for line in chunk]
+
+
+def test_numpy_rows_are_serialized_natively():
+    vector = np.array([0.5, 0.25, 1.0], dtype=np.float32)
+    lines = _bulk_lines([{"_index": "pdf_chunks", "_id": "a", "_source": {"text": "plain", "vector": vector}}])
+    assert orjson.loads(lines[1]) == {"text": "plain", "vector": [0.5, 0.25, 1.0]}
+
+
+def test_lone_surrogate_falls_back_with_numpy_rows():
+    vector = np.array([0.5, 0.25, 1.0], dtype=np.float32)
+    source = {"text": "broken \ud800 text", "vector": vector, "chunk_size": np.int32(800)}
+    lines = _bulk_lines([{"_index": "pdf_chunks", "_id": "a", "_source": source}])
+    assert b'"vector":[0.5,0.25,1.0]' in lines[1]
+    assert b'"chunk_size":800' in lines[1]
+
+
+def test_default_converts_numpy_scalars():
+    serializer = OrjsonSerializer()
+    assert serializer.default(np.float32(0.5)) == 0.5
+    assert serializer.default(np.arange(2)) == [0, 1]
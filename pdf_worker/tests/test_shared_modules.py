@@ -0,0 +1,13 @@
+import pytest
+
+from sync_shared import SHARED_MODULES, TARGET_DIR, render
+
+
+@pytest.mark.parametrize("name", SHARED_MODULES)
+def test_backend_copy_matches_worker(name):
+    target = TARGET_DIR / name
+    if not TARGET_DIR.is_dir():
+        pytest.skip("backend sources are not available")
+    assert target.read_text(encoding="utf-8") == render(name), (
+        f"backend/app/utils/{name} drifted from the worker's copy; run `python pdf_worker/sync_shared.py`"
+    )
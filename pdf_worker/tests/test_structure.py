@@ -0,0 +1,41 @@
+from app.models import ParsedDocument, ParsedPage
+from app.utils.structure import source_fingerprint
+
+BODIES = ["The tenant shall pay the rent.", "Repairs fall to the owner.", "Notice is given in writing.",
+          "Disputes go to court."]
+
+
+def _document(page_lines, creator="Microsoft Word"):
+    pages = [
+        ParsedPage(index=i, rect=(0, 0, 595, 842), lines=lines, blocks=[], layout={})
+        for i, lines in enumerate(page_lines)
+    ]
+    return ParsedDocument(path="a.pdf", page_count=len(pages), metadata={"creator": creator}, pages=pages)
+
+
+def test_creator_alone_is_no_fingerprint():
+    assert source_fingerprint(_document([[body] for body in BODIES])) is None
+
+
+def test_running_headers_fingerprint_the_source():
+    pages = [["Official Gazette No. 12", body, "Page 1"] for body in BODIES]
+    other = [["Official Gazette No. 13", body.upper(), "Page 2"] for body in reversed(BODIES)]
+    assert source_fingerprint(_document(pages)) == source_fingerprint(_document(other))
+    assert source_fingerprint(_document(pages)) != source_fingerprint(_document(pages, creator="Adobe InDesign"))
+
+
+def test_cache_write_errors_do_not_fail_detection(monkeypatch):
+    from app.utils import structure
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("postgres is down")
+
+    monkeypatch.setattr(structure, "load_cached_patterns", lambda fingerprint: [r"Article \d+"])
+    monkeypatch.setattr(structure, "_touch_cached_patterns", unavailable)
+    pages = ["Article 1\nText.", "Article 2\nMore text."]
+    assert structure.detect_section_patterns_from_pages(pages, fingerprint="f") == [r"Article \d+"]
+
+    monkeypatch.setattr(structure, "load_cached_patterns", lambda fingerprint: None)
+    monkeypatch.setattr(structure, "store_cached_patterns", unavailable)
+    monkeypatch.setattr(structure, "score_section_patterns", lambda pages, language_code=None: [(r"Article \d+", 1.0)])
+    assert structure.detect_section_patterns_from_pages(pages, fingerprint="f") == [r"Article \d+"]